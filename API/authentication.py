@@ -0,0 +1,108 @@
+import copy
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.authentication import TokenAuthentication
+
+class LocalTTLCache:
+    """Least recently used cache, in process, whose entries expire `ttl` seconds after being set"""
+
+    def __init__(self, maxsize, ttl, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= self.clock():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (self.clock() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+class TokenUserCache:
+    """Cache of the (user, token) pair authenticated by each token key
+
+    When the API_TOKEN_CACHE setting names a Django cache, entries are kept in that cache only,
+    so an invalidation in one process reaches every other process on their next request.
+    Shared cache keys are hashes of the token keys, tokens are never stored as cache keys.
+    Without a shared cache entries are kept in a LocalTTLCache, and other processes keep
+    authenticating a deleted token or a deactivated user for up to API_TOKEN_CACHE_TTL seconds.
+    """
+
+    def __init__(self, maxsize, ttl, cache_alias=None):
+        self.local = LocalTTLCache(maxsize, ttl)
+        self.ttl = ttl
+        self.cache_alias = cache_alias
+
+    def _shared_key(self, key):
+        return 'api-token:' + hashlib.sha256(key.encode()).hexdigest()
+
+    def _shared_cache(self):
+        return caches[self.cache_alias] if self.cache_alias else None
+
+    def get(self, key):
+        shared_cache = self._shared_cache()
+        if shared_cache is not None:
+            return shared_cache.get(self._shared_key(key))
+        return self.local.get(key)
+
+    def set(self, key, value):
+        shared_cache = self._shared_cache()
+        if shared_cache is not None:
+            shared_cache.set(self._shared_key(key), value, self.ttl)
+        else:
+            self.local.set(key, value)
+
+    def delete(self, key):
+        self.local.delete(key)
+        shared_cache = self._shared_cache()
+        if shared_cache is not None:
+            shared_cache.delete(self._shared_key(key))
+
+token_user_cache = TokenUserCache(
+    maxsize=settings.API_TOKEN_CACHE_SIZE,
+    ttl=settings.API_TOKEN_CACHE_TTL,
+    cache_alias=settings.API_TOKEN_CACHE,
+)
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """TokenAuthentication remembering the user of each token, so known tokens cost no query
+
+    Entries are dropped when their Token is deleted (which is how tokens are regenerated)
+    and when their user is saved, e.g. deactivated. See API.signals.
+    """
+
+    def authenticate_credentials(self, key):
+        cached = token_user_cache.get(key)
+        if cached is None:
+            cached = super().authenticate_credentials(key)
+            token_user_cache.set(key, cached)
+        user, token = cached
+        # Each request gets its own user, changes made while handling a request stay there
+        return (copy.copy(user), token)
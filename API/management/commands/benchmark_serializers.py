@@ -0,0 +1,62 @@
+import timeit
+
+from django.contrib import auth
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.authtoken.models import Token
+from rest_framework.renderers import JSONRenderer
+
+from keys.models import Key
+from API.serializers import KeySerializer, UserSerializer, TokenSerializer
+from API.serializers import fast_serialize, values_fields
+
+
+def sample_rows(count):
+    """Build unsaved instances and the matching values() rows for each serializer"""
+    user_model = auth.get_user_model()
+    users = [user_model(id=i, username=f"{i}@mailinator.com") for i in range(count)]
+    keys = [
+        Key(token=f"token_{i}", refresh_token=f"refresh_{i}", strava_id=str(i), service=Key.STRAVA)
+        for i in range(count)
+    ]
+    tokens = [Token(key=f"{i:040d}", user_id=i) for i in range(count)]
+    samples = {}
+    for serializer_class, instances in (
+        (KeySerializer, keys),
+        (UserSerializer, users),
+        (TokenSerializer, tokens),
+    ):
+        fields = values_fields(serializer_class)
+        rows = [{field: getattr(instance, field) for field in fields} for instance in instances]
+        samples[serializer_class] = (instances, rows)
+    return samples
+
+
+class Command(BaseCommand):
+    help = "Compare the time per row of DRF serializers with their fast path"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=10000)
+        parser.add_argument("--repeat", type=int, default=5)
+
+    def handle(self, *args, **options):
+        rows_count = options["rows"]
+        renderer = JSONRenderer()
+        for serializer_class, (instances, rows) in sample_rows(rows_count).items():
+            expected = renderer.render(serializer_class(instances, many=True).data)
+            if renderer.render(fast_serialize(serializer_class, rows)) != expected:
+                raise CommandError(f"{serializer_class.__name__} fast path output differs")
+
+            drf = min(timeit.repeat(
+                lambda: serializer_class(instances, many=True).data,
+                number=1, repeat=options["repeat"],
+            ))
+            fast = min(timeit.repeat(
+                lambda: fast_serialize(serializer_class, rows),
+                number=1, repeat=options["repeat"],
+            ))
+            self.stdout.write(
+                f"{serializer_class.__name__}: "
+                f"DRF {drf / rows_count * 1e6:.2f} us/row, "
+                f"fast path {fast / rows_count * 1e6:.2f} us/row, "
+                f"{drf / fast:.1f}x faster"
+            )
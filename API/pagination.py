@@ -0,0 +1,20 @@
+from django.conf import settings
+from rest_framework.pagination import CursorPagination
+
+class KeysetPagination(CursorPagination):
+    """Paginate on a unique column, with an opaque cursor pointing after the last row sent
+
+    Each page is one indexed range query, whatever the size of the table. The page size
+    defaults to the API_PAGE_SIZE setting and can be changed with the page_size parameter.
+    """
+    ordering = 'pk'
+    page_size = settings.API_PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+
+class UserPagination(KeysetPagination):
+    ordering = 'id'
+
+class TokenPagination(KeysetPagination):
+    # Token primary keys are random keys, users own a single token
+    ordering = 'user_id'
@@ -1,11 +1,25 @@
 from django.conf import settings
 from django.contrib import auth
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 
 from rest_framework.authtoken.models import Token
 
+from .authentication import token_user_cache
+
 @receiver(post_save, sender=settings.AUTH_USER_MODEL)
 def create_auth_token(sender, instance=None, created=False, **kwargs):
     if created:
         Token.objects.create(user=instance)
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def forget_user_tokens(sender, instance=None, created=False, update_fields=None, **kwargs):
+    """Drop cached authentications of a user changed, e.g. deactivated or no longer staff"""
+    if created or update_fields == frozenset({'last_login'}):
+        return
+    for key in Token.objects.filter(user=instance).values_list('key', flat=True):
+        token_user_cache.delete(key)
+
+@receiver(post_delete, sender=Token)
+def forget_token(sender, instance=None, **kwargs):
+    token_user_cache.delete(instance.key)
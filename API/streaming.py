@@ -0,0 +1,53 @@
+import json
+
+from django.http import StreamingHttpResponse
+from rest_framework.renderers import JSONRenderer
+
+from .serializers import compile_serializer, values_fields
+
+STREAM_CHUNK_SIZE = 2000
+# Values of the ?stream query parameter that ask for a streamed list
+STREAM_TRUE_VALUES = ('1', 'true')
+
+def _encode(data):
+    """Encode data like the JSONRenderer of DRF does"""
+    renderer = JSONRenderer
+    return json.dumps(
+        data,
+        cls=renderer.encoder_class,
+        ensure_ascii=renderer.ensure_ascii,
+        allow_nan=not renderer.strict,
+        separators=(',', ':') if renderer.compact else (', ', ': '),
+    )
+
+def stream_requested(request):
+    """Return True when the request asks for a streamed list with ?stream=1 or ?stream=true"""
+    return request.query_params.get('stream', '').lower() in STREAM_TRUE_VALUES
+
+def iter_json_list(name, queryset, serializer_class, chunk_size=STREAM_CHUNK_SIZE):
+    """Yield the JSON object {name: [serialized rows]} a chunk of rows at a time
+
+    Rows are read with a server side cursor (where the database has one) so neither the
+    queryset nor the serialized list is ever held in memory. Only the serialized columns
+    are read, and serialized with the fast path of the serializer.
+    """
+    serialize = compile_serializer(serializer_class)
+    rows = queryset.values(*values_fields(serializer_class))
+    yield '{' + _encode(name) + ':['
+    separator = ''
+    chunk = []
+    for row in rows.iterator(chunk_size=chunk_size):
+        chunk.append(_encode(serialize(row)))
+        if len(chunk) == chunk_size:
+            yield separator + ','.join(chunk)
+            separator = ','
+            chunk = []
+    if chunk:
+        yield separator + ','.join(chunk)
+    yield ']}'
+
+def streaming_json_list_response(name, queryset, serializer_class, chunk_size=STREAM_CHUNK_SIZE):
+    return StreamingHttpResponse(
+        iter_json_list(name, queryset, serializer_class, chunk_size),
+        content_type='application/json',
+    )
@@ -3,6 +3,8 @@ import json
 
 from django.test import TestCase
 from django.contrib import auth
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from rest_framework.authtoken.models import Token
 
 from keys.models import Key
@@ -19,7 +21,7 @@ class KeyDetailTest(TestCase):
         )
 
     def setUp(self):
-        """Create 2 users with 2 keys each in the database"""
+        """Create 2 users with a Strava and a Spotify key each in the database"""
         self.existing_users = []
         self.existing_user_tokens = []
         self.keys = {}
@@ -30,13 +32,13 @@ class KeyDetailTest(TestCase):
             token, created = Token.objects.get_or_create(user=self.existing_users[i])
             self.existing_user_tokens.append(token)
             keys = []
-            for j in range(2):
+            for j, service in enumerate((Key.SPOTIFY, Key.STRAVA)):
                 key = Key(
                     user = self.existing_users[i],
                     token = f'token_{i}_{j}',
                     refresh_token = f'refresh_token_{i}_{j}',
                     strava_id = f'strava_id_{i}_{j}',
-                    service = Key.STRAVA
+                    service = service
                 )
                 key.save()
                 keys.append(key)
@@ -149,7 +151,6 @@ class UserListTest(TestCase):
         response = self.client.get("/API/user/", HTTP_AUTHORIZATION = f'Token {self.root_user_token}')
         received = response.content.decode("utf-8")
         data_received = json.loads(received)
-        assert len(data_received.keys()) == 1
         assert 'users' in data_received.keys()
         list_received = data_received['users']
         # Total users will be list of regular users and the root user
@@ -158,6 +159,61 @@ class UserListTest(TestCase):
             self.assertEqual(list_received[i].get('id'),user.id)
             self.assertEqual(list_received[i].get('username'),user.username)
 
+    def test_GET_pages_through_users(self):
+        """Test API.views.UserList sends pages of users linked by the next cursor"""
+        received_ids = []
+        url = "/API/user/?page_size=3"
+        while url:
+            response = self.client.get(url, HTTP_AUTHORIZATION = f'Token {self.root_user_token}')
+            data_received = json.loads(response.content.decode("utf-8"))
+            self.assertLessEqual(len(data_received['users']), 3)
+            received_ids += [user['id'] for user in data_received['users']]
+            url = data_received['next']
+        expected_ids = [user.id for user in self.existing_users] + [self.root_user.id]
+        self.assertEqual(received_ids, expected_ids)
+
+    def test_GET_returns_no_next_cursor_on_last_page(self):
+        """Test API.views.UserList returns null as next cursor when all users were sent"""
+        response = self.client.get("/API/user/", HTTP_AUTHORIZATION = f'Token {self.root_user_token}')
+        data_received = json.loads(response.content.decode("utf-8"))
+        self.assertIsNone(data_received['next'])
+
+    def test_GET_only_fetches_serialized_columns(self):
+        """Test API.views.UserList does not read the columns it does not send"""
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get("/API/user/", HTTP_AUTHORIZATION = f'Token {self.root_user_token}')
+        user_queries = [query['sql'] for query in queries if 'FROM "auth_user" ORDER BY' in query['sql']]
+        self.assertEqual(len(user_queries), 1)
+        self.assertNotIn('password', user_queries[0])
+
+    def test_GET_streams_all_users_when_asked(self):
+        """Test API.views.UserList streams the whole list of users with ?stream=1"""
+        response = self.client.get("/API/user/?stream=1&page_size=1", HTTP_AUTHORIZATION = f'Token {self.root_user_token}')
+        self.assertTrue(response.streaming)
+        data_received = json.loads(b''.join(response.streaming_content).decode("utf-8"))
+        expected_users = [
+            {'id': user.id, 'username': user.username}
+            for user in self.existing_users + [self.root_user]
+        ]
+        self.assertEqual(data_received, {'users': expected_users})
+
+    def test_GET_pages_users_when_stream_is_off(self):
+        """Test API.views.UserList sends a page of users with ?stream=0 or ?stream=false"""
+        for value in ("0", "false", "False", ""):
+            response = self.client.get(f"/API/user/?stream={value}&page_size=1", HTTP_AUTHORIZATION = f'Token {self.root_user_token}')
+            self.assertFalse(response.streaming)
+            self.assertEqual(len(response.json()['users']), 1)
+
+    def test_GET_streams_users_with_stream_true(self):
+        """Test API.views.UserList streams the whole list of users with ?stream=true"""
+        response = self.client.get("/API/user/?stream=true", HTTP_AUTHORIZATION = f'Token {self.root_user_token}')
+        self.assertTrue(response.streaming)
+
+    def test_GET_stream_needs_root_token(self):
+        """Test API.views.UserList does not stream users for a token with no root permissions"""
+        response = self.client.get("/API/user/?stream=1", HTTP_AUTHORIZATION = f'Token {self.existing_users_tokens[0]}')
+        self.assertEqual(response.status_code, 403)
+
     def test_GET_returns_error_when_wrong_token(self):
         """Test API.views.UserList returns error for wrong token"""
         response = self.client.get("/API/user/", HTTP_AUTHORIZATION = f'Token wrongtoken1234')
@@ -231,7 +287,6 @@ class TokenListTest(TestCase):
         response = self.client.get("/API/token/", HTTP_AUTHORIZATION = f'Token {self.root_user_token}')
         received = response.content.decode("utf-8")
         data_received = json.loads(received)
-        assert len(data_received.keys()) == 1
         assert 'tokens' in data_received.keys()
         list_received = data_received['tokens']
         # Total users will be list of regular users and the root user
@@ -243,6 +298,36 @@ class TokenListTest(TestCase):
                 self.existing_users_tokens[i].key
             )
     
+    def test_GET_pages_through_tokens(self):
+        """Test API.views.TokenList sends pages of tokens linked by the next cursor"""
+        received_keys = []
+        url = "/API/token/?page_size=2"
+        while url:
+            response = self.client.get(url, HTTP_AUTHORIZATION = f'Token {self.root_user_token}')
+            data_received = json.loads(response.content.decode("utf-8"))
+            self.assertLessEqual(len(data_received['tokens']), 2)
+            received_keys += [token['key'] for token in data_received['tokens']]
+            url = data_received['next']
+        expected_keys = [token.key for token in self.existing_users_tokens] + [self.root_user_token.key]
+        self.assertEqual(received_keys, expected_keys)
+
+    def test_GET_streams_all_tokens_when_asked(self):
+        """Test API.views.TokenList streams the whole list of tokens with ?stream=1"""
+        response = self.client.get("/API/token/?stream=1", HTTP_AUTHORIZATION = f'Token {self.root_user_token}')
+        self.assertTrue(response.streaming)
+        data_received = json.loads(b''.join(response.streaming_content).decode("utf-8"))
+        expected_tokens = [
+            {'user_id': token.user_id, 'key': token.key}
+            for token in self.existing_users_tokens + [self.root_user_token]
+        ]
+        self.assertEqual(data_received, {'tokens': expected_tokens})
+
+    def test_GET_pages_tokens_when_stream_is_off(self):
+        """Test API.views.TokenList sends a page of tokens with ?stream=false"""
+        response = self.client.get("/API/token/?stream=false", HTTP_AUTHORIZATION = f'Token {self.root_user_token}')
+        self.assertFalse(response.streaming)
+        self.assertIn('next', response.json())
+
     def test_GET_returns_error_when_wrong_token(self):
         """Test API.views.TokenList returns error for wrong token"""
         response = self.client.get("/API/token/", HTTP_AUTHORIZATION = f'Token wrongtoken1234')
@@ -0,0 +1,120 @@
+"""Unit tests for API authentication"""
+from django.test import TestCase
+from django.contrib import auth
+from rest_framework.authtoken.models import Token
+
+from API.authentication import LocalTTLCache, TokenUserCache, CachedTokenAuthentication, token_user_cache
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+class LocalTTLCacheTest(TestCase):
+
+    """Tests for API.authentication.LocalTTLCache"""
+
+    def setUp(self):
+        """Create a cache of two entries with a fake clock"""
+        self.clock = FakeClock()
+        self.cache = LocalTTLCache(maxsize=2, ttl=60, clock=self.clock)
+
+    def test_returns_value_set(self):
+        """Test LocalTTLCache returns the value set for a key and None for unknown keys"""
+        self.cache.set("a", 1)
+        self.assertEqual(self.cache.get("a"), 1)
+        self.assertIsNone(self.cache.get("b"))
+
+    def test_expires_entries(self):
+        """Test LocalTTLCache forgets entries older than the ttl"""
+        self.cache.set("a", 1)
+        self.clock.now = 60
+        self.assertIsNone(self.cache.get("a"))
+
+    def test_evicts_least_recently_used(self):
+        """Test LocalTTLCache drops the least recently used entry when full"""
+        self.cache.set("a", 1)
+        self.cache.set("b", 2)
+        self.cache.get("a")
+        self.cache.set("c", 3)
+        self.assertEqual(self.cache.get("a"), 1)
+        self.assertIsNone(self.cache.get("b"))
+
+class CachedTokenAuthenticationTest(TestCase):
+
+    """Tests for API.authentication.CachedTokenAuthentication"""
+
+    def setUp(self):
+        """Create a user with a token and start with an empty cache"""
+        token_user_cache.local.clear()
+        user_model = auth.get_user_model()
+        self.existing_user = user_model.objects.create_user(
+            username="edith@mailinator.com", email="edith@mailinator.com", password="epwd"
+        )
+        self.token = Token.objects.get(user=self.existing_user)
+        self.authentication = CachedTokenAuthentication()
+
+    def get_key_detail(self, key):
+        return self.client.get("/API/key/", HTTP_AUTHORIZATION = f'Token {key}')
+
+    def test_authenticates_known_token_without_queries(self):
+        """Test CachedTokenAuthentication does not query the database for a token already seen"""
+        self.authentication.authenticate_credentials(self.token.key)
+        with self.assertNumQueries(0):
+            user, token = self.authentication.authenticate_credentials(self.token.key)
+        self.assertEqual(user.pk, self.existing_user.pk)
+        self.assertEqual(token.key, self.token.key)
+
+    def test_deleted_token_is_rejected(self):
+        """Test CachedTokenAuthentication forgets tokens deleted"""
+        self.assertEqual(self.get_key_detail(self.token.key).status_code, 200)
+        self.token.delete()
+        self.assertEqual(self.get_key_detail(self.token.key).status_code, 401)
+
+    def test_regenerated_token_replaces_old_one(self):
+        """Test CachedTokenAuthentication rejects the old token and accepts the new one after regeneration"""
+        self.get_key_detail(self.token.key)
+        self.token.delete()
+        new_token = Token.objects.create(user=self.existing_user)
+        self.assertEqual(self.get_key_detail(self.token.key).status_code, 401)
+        self.assertEqual(self.get_key_detail(new_token.key).status_code, 200)
+
+    def test_deactivated_user_is_rejected(self):
+        """Test CachedTokenAuthentication forgets users deactivated"""
+        self.assertEqual(self.get_key_detail(self.token.key).status_code, 200)
+        self.existing_user.is_active = False
+        self.existing_user.save()
+        self.assertEqual(self.get_key_detail(self.token.key).status_code, 401)
+
+    def test_each_request_gets_own_user(self):
+        """Test CachedTokenAuthentication does not share the user object between requests"""
+        first_user, _ = self.authentication.authenticate_credentials(self.token.key)
+        second_user, _ = self.authentication.authenticate_credentials(self.token.key)
+        self.assertIsNot(first_user, second_user)
+
+class TokenUserCacheTest(TestCase):
+
+    """Tests for API.authentication.TokenUserCache"""
+
+    def test_invalidation_reaches_other_processes(self):
+        """Test TokenUserCache entries deleted by a process are gone for processes sharing the Django cache"""
+        first_process = TokenUserCache(maxsize=10, ttl=60, cache_alias="default")
+        second_process = TokenUserCache(maxsize=10, ttl=60, cache_alias="default")
+        first_process.set("1234", ("user", "token"))
+        self.assertEqual(second_process.get("1234"), ("user", "token"))
+        self.assertEqual(first_process.get("1234"), ("user", "token"))
+
+        second_process.delete("1234")
+        self.assertIsNone(first_process.get("1234"))
+        self.assertIsNone(second_process.get("1234"))
+
+    def test_local_cache_without_shared_cache(self):
+        """Test TokenUserCache keeps entries in the process without a Django cache"""
+        cache = TokenUserCache(maxsize=10, ttl=60)
+        cache.set("1234", ("user", "token"))
+        self.assertEqual(cache.local.get("1234"), ("user", "token"))
+        cache.delete("1234")
+        self.assertIsNone(cache.get("1234"))
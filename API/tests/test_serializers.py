@@ -1,11 +1,16 @@
 """Unit tests for API serializers"""
+from io import StringIO
+
 from django.test import TestCase
 from django.contrib import auth
+from django.core.management import call_command
 from rest_framework.utils.serializer_helpers import ReturnList
 from rest_framework.authtoken.models import Token
+from rest_framework.renderers import JSONRenderer
 
 from keys.models import Key
 from API.serializers import KeySerializer, UserSerializer, TokenSerializer
+from API.serializers import fast_serialize, values_fields
 
 class KeySerializerTest(TestCase):
 
@@ -128,3 +133,63 @@ class TokenSerializerTest(TestCase):
             len(self.existing_users_tokens)
         )
         self.assertIs(type(serializer.data),ReturnList)
+
+class FastSerializeTest(TestCase):
+
+    """Tests for the read only fast path of API serializers"""
+
+    def create_user(self, email, password):
+        """Helper function to create a user"""
+        user_model = auth.get_user_model()
+        return user_model.objects.create_user(
+            username=email, email=email, password=password
+        )
+
+    def setUp(self):
+        """Create users with tokens and keys in the database"""
+        for i in range(3):
+            user = self.create_user(f"{i}@mailinator.com", f"{i}pwd")
+            Token.objects.get_or_create(user=user)
+            Key.objects.create(
+                user=user,
+                token=f'token_{i}',
+                refresh_token=f'refresh_token_{i}',
+                strava_id=f'strava_id_{i}',
+                service=Key.STRAVA
+            )
+
+    def assertRendersLikeSerializer(self, serializer_class, queryset):
+        """Helper function to compare the JSON of the fast path with the JSON of the serializer"""
+        renderer = JSONRenderer()
+        expected = renderer.render(serializer_class(queryset, many=True).data)
+        from_values = fast_serialize(serializer_class, queryset.values(*values_fields(serializer_class)))
+        from_instances = fast_serialize(serializer_class, queryset, from_values=False)
+        self.assertEqual(renderer.render(from_values), expected)
+        self.assertEqual(renderer.render(from_instances), expected)
+
+    def test_key_serializer_output_is_identical(self):
+        """Test API.serializers.fast_serialize renders Keys byte for byte like KeySerializer"""
+        self.assertRendersLikeSerializer(KeySerializer, Key.objects.order_by('pk'))
+
+    def test_user_serializer_output_is_identical(self):
+        """Test API.serializers.fast_serialize renders Users byte for byte like UserSerializer"""
+        user_model = auth.get_user_model()
+        self.assertRendersLikeSerializer(UserSerializer, user_model.objects.order_by('pk'))
+
+    def test_token_serializer_output_is_identical(self):
+        """Test API.serializers.fast_serialize renders Tokens byte for byte like TokenSerializer"""
+        self.assertRendersLikeSerializer(TokenSerializer, Token.objects.order_by('user_id'))
+
+    def test_keeps_none_values(self):
+        """Test API.serializers.fast_serialize sends None like the serializer does"""
+        row = {'token': None, 'refresh_token': '', 'strava_id': 10, 'service': 'STR'}
+        self.assertEqual(
+            fast_serialize(KeySerializer, [row]),
+            [{'token': None, 'refresh_token': '', 'strava_id': '10', 'service': 'STR'}]
+        )
+
+    def test_benchmark_command_checks_output(self):
+        """Test benchmark_serializers management command runs and reports the time per row"""
+        output = StringIO()
+        call_command("benchmark_serializers", "--rows", "10", "--repeat", "1", stdout=output)
+        self.assertIn("TokenSerializer", output.getvalue())
@@ -0,0 +1,38 @@
+"""Unit tests for streamed JSON lists"""
+import json
+
+from django.test import TestCase
+from django.contrib import auth
+
+from API.serializers import UserSerializer
+from API.streaming import iter_json_list
+
+class IterJsonListTest(TestCase):
+
+    """Tests for API.streaming.iter_json_list"""
+
+    def setUp(self):
+        """Create five users in the database"""
+        user_model = auth.get_user_model()
+        self.existing_users = [
+            user_model.objects.create_user(username=f"{i}@mailinator.com", email=f"{i}@mailinator.com")
+            for i in range(5)
+        ]
+        self.users = user_model.objects.order_by("id")
+
+    def test_yields_valid_json_object_with_list(self):
+        """Test API.streaming.iter_json_list writes every row serialized in a JSON list"""
+        received = json.loads(''.join(iter_json_list("users", self.users, UserSerializer)))
+        self.assertEqual(received, {"users": UserSerializer(self.users, many=True).data})
+
+    def test_yields_one_part_per_chunk(self):
+        """Test API.streaming.iter_json_list writes rows a chunk at a time"""
+        parts = list(iter_json_list("users", self.users, UserSerializer, chunk_size=2))
+        # Opening, three chunks of rows (2, 2, 1) and closing
+        self.assertEqual(len(parts), 5)
+        self.assertEqual(len(json.loads(''.join(parts))["users"]), 5)
+
+    def test_yields_empty_list_without_rows(self):
+        """Test API.streaming.iter_json_list writes an empty list when there are no rows"""
+        received = ''.join(iter_json_list("users", self.users.none(), UserSerializer))
+        self.assertEqual(received, '{"users":[]}')
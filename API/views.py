@@ -6,32 +6,43 @@ from rest_framework.authtoken.models import Token
 
 from keys.models import Key
 from .serializers import KeySerializer, UserSerializer, TokenSerializer
+from .serializers import fast_serialize, values_fields
+from .pagination import UserPagination, TokenPagination
+from .streaming import streaming_json_list_response, stream_requested
 
 class KeyDetail(APIView):
     """Retrieve a Key instance"""
 
     def get(self,request):
-        keys = Key.objects.filter(user__pk=request.user.pk)
-        serializer = KeySerializer(keys,many=True)
-        return Response(serializer.data)
+        keys = Key.objects.filter(user=request.user).order_by('service')
+        keys = keys.values(*values_fields(KeySerializer))
+        return Response(fast_serialize(KeySerializer, keys))
 
 class UserList(APIView):
-    """Retrieve the list of justletic users"""
+    """Retrieve the list of justletic users, a page at a time or all of them with ?stream=1"""
 
     permission_classes = (IsAdminUser,)
 
     def get(self,request):
         user_model = auth.get_user_model()
-        users = user_model.objects.all()
-        serializer = UserSerializer(users,many=True)
-        return Response({"users": serializer.data})
+        users = user_model.objects.only("id", "username")
+        if stream_requested(request):
+            return streaming_json_list_response("users", users.order_by("id"), UserSerializer)
+        paginator = UserPagination()
+        page = paginator.paginate_queryset(users, request, view=self)
+        users_data = fast_serialize(UserSerializer, page, from_values=False)
+        return Response({"users": users_data, "next": paginator.get_next_link()})
 
 class TokenList(APIView):
-    """Retrieve the list of API tokens"""
+    """Retrieve the list of API tokens, a page at a time or all of them with ?stream=1"""
     
     permission_classes = (IsAdminUser,)
 
     def get(self, request):
-        tokens = Token.objects.all()
-        serializer = TokenSerializer(tokens,many=True)
-        return Response({"tokens": serializer.data})
+        tokens = Token.objects.only("key", "user_id")
+        if stream_requested(request):
+            return streaming_json_list_response("tokens", tokens.order_by("user_id"), TokenSerializer)
+        paginator = TokenPagination()
+        page = paginator.paginate_queryset(tokens, request, view=self)
+        tokens_data = fast_serialize(TokenSerializer, page, from_values=False)
+        return Response({"tokens": tokens_data, "next": paginator.get_next_link()})
@@ -1,24 +1,43 @@
 """Justletic authentication backend"""
-from django.shortcuts import get_object_or_404
+from django.contrib.auth import get_user_model
+from django.db.models.functions import Upper
 
-from .models import User
+# Accounts read at most when several share an email ignoring case
+MAX_USERS_PER_EMAIL = 10
 
 class JustleticAuthenticationBackend(object):
 
-    """Justletic authentication backend"""
+    """Justletic authentication backend
 
-    @staticmethod
-    def authenticate(email, password):
+    Users are found by email, ignoring case, through the index on UPPER(email) created by
+    migration accounts 0003. An active account with the exact email typed wins over the others,
+    and the login is refused when several accounts still match, so a password is only ever
+    checked against one account.
+    """
+
+    def authenticate(self, request, email=None, password=None, username=None, **kwargs):
         """Check that user exists in the database and the password is correct"""
-        try:
-            user = User.objects.get(email=email)
-            if user.check_password(password):
-                return user
+        email = email or username
+        if email is None or password is None:
             return None
-        except User.DoesNotExist:
+        user_model = get_user_model()
+        candidates = list(
+            user_model.objects.annotate(email_upper=Upper('email'))
+            .filter(email_upper=email.upper(), is_active=True)
+            .order_by('pk')[:MAX_USERS_PER_EMAIL]
+        )
+        matches = [user for user in candidates if user.email == email] or candidates
+        if len(matches) != 1:
             return None
+        user = matches[0]
+        if user.check_password(password):
+            return user
+        return None
 
-    @staticmethod
-    def get_user(user_id):
-        """Return a user given its primary key (if the user exists)"""
-        return get_object_or_404(User, pk=user_id)
+    def get_user(self, user_id):
+        """Return a user given its primary key (None if the user does not exist)"""
+        user_model = get_user_model()
+        try:
+            return user_model.objects.get(pk=user_id)
+        except user_model.DoesNotExist:
+            return None
@@ -0,0 +1,19 @@
+# Generated by Django 2.0.1 on 2026-10-18 11:20
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    """Index users on UPPER(email) for the case insensitive lookups of JustleticAuthenticationBackend"""
+
+    dependencies = [
+        ('auth', '0009_alter_user_last_name_max_length'),
+        ('accounts', '0002_auto_20180602_2031'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            'CREATE INDEX auth_user_email_upper_idx ON auth_user (UPPER(email));',
+            'DROP INDEX auth_user_email_upper_idx;',
+        ),
+    ]
@@ -0,0 +1,74 @@
+"""Unit tests for Justletic authentication backend"""
+from django.test import TestCase
+from django.contrib import auth
+
+from ..authentication import JustleticAuthenticationBackend
+
+class JustleticAuthenticationBackendTest(TestCase):
+
+    """Tests for accounts.authentication.JustleticAuthenticationBackend"""
+
+    def setUp(self):
+        """Create a user in the database before runinng each test"""
+        user_model = auth.get_user_model()
+        self.existing_user = user_model.objects.create_user(
+            "edith@mailinator.com", "edith@mailinator.com", "epwd"
+        )
+        self.backend = JustleticAuthenticationBackend()
+
+    def test_authenticates_email_and_password(self):
+        """Test JustleticAuthenticationBackend.authenticate returns the user for right email and password"""
+        user = self.backend.authenticate(None, email="edith@mailinator.com", password="epwd")
+        self.assertEqual(user, self.existing_user)
+
+    def test_ignores_case_of_email(self):
+        """Test JustleticAuthenticationBackend.authenticate finds users whatever the case of the email"""
+        user = self.backend.authenticate(None, email="Edith@Mailinator.COM", password="epwd")
+        self.assertEqual(user, self.existing_user)
+
+    def test_returns_none_for_wrong_password(self):
+        """Test JustleticAuthenticationBackend.authenticate returns None for a wrong password"""
+        self.assertIsNone(self.backend.authenticate(None, email="edith@mailinator.com", password="wrong"))
+
+    def test_returns_none_for_unknown_email(self):
+        """Test JustleticAuthenticationBackend.authenticate returns None for an unknown email"""
+        self.assertIsNone(self.backend.authenticate(None, email="joe@mailinator.com", password="epwd"))
+
+    def test_prefers_exact_email_when_emails_are_duplicated(self):
+        """Test JustleticAuthenticationBackend.authenticate checks the account with the exact email typed first"""
+        user_model = auth.get_user_model()
+        duplicate = user_model.objects.create_user("edith", "EDITH@mailinator.com", "other")
+        self.assertEqual(self.backend.authenticate(None, email="EDITH@mailinator.com", password="other"), duplicate)
+        self.assertIsNone(self.backend.authenticate(None, email="edith@mailinator.com", password="other"))
+
+    def test_refuses_ambiguous_duplicate_emails(self):
+        """Test JustleticAuthenticationBackend.authenticate returns None when several accounts match the email"""
+        user_model = auth.get_user_model()
+        user_model.objects.create_user("edith", "EDITH@mailinator.com", "other")
+        self.assertIsNone(self.backend.authenticate(None, email="Edith@mailinator.com", password="epwd"))
+
+    def test_ignores_inactive_duplicates(self):
+        """Test JustleticAuthenticationBackend.authenticate leaves inactive accounts out of the match"""
+        user_model = auth.get_user_model()
+        user_model.objects.create_user("edith", "EDITH@mailinator.com", "other", is_active=False)
+        user = self.backend.authenticate(None, email="Edith@mailinator.com", password="epwd")
+        self.assertEqual(user, self.existing_user)
+
+    def test_returns_none_for_inactive_user(self):
+        """Test JustleticAuthenticationBackend.authenticate returns None for an inactive account"""
+        self.existing_user.is_active = False
+        self.existing_user.save()
+        self.assertIsNone(self.backend.authenticate(None, email="edith@mailinator.com", password="epwd"))
+
+    def test_login_with_email_in_other_case(self):
+        """Test accounts.views.login logs in a user typing the email with another case"""
+        self.client.post("/accounts/login", data={"email": "EDITH@mailinator.com", "password": "epwd"})
+        self.assertEqual(int(self.client.session[auth.SESSION_KEY]), self.existing_user.pk)
+
+    def test_get_user_returns_none_for_unknown_user(self):
+        """Test JustleticAuthenticationBackend.get_user returns None instead of raising for unknown ids"""
+        self.assertIsNone(self.backend.get_user(self.existing_user.pk + 1))
+
+    def test_get_user_returns_user(self):
+        """Test JustleticAuthenticationBackend.get_user returns the user with the primary key received"""
+        self.assertEqual(self.backend.get_user(self.existing_user.pk), self.existing_user)
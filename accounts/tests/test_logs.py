@@ -1,10 +1,18 @@
 """Unit tests for logs for accounts app views"""
 import os
-from unittest.mock import patch, call, Mock
+from unittest.mock import patch, call
 
 from django.test import TestCase
 from django.contrib import auth
 
+from utils.request_context import get_log_context
+
+def record_log_context(mock_logger):
+    """Helper function to keep the log context in use at each call of logger info"""
+    contexts = []
+    mock_logger.info.side_effect = lambda *args, **kwargs: contexts.append(get_log_context())
+    return contexts
+
 class LoginViewTest(TestCase):
 
     """Tests for logs in Login view"""
@@ -16,42 +24,44 @@ class LoginViewTest(TestCase):
             "edith@mailinator.com", "edith@mailinator.com", "epwd"
         )
 
-    @patch("accounts.views.logger.new")
-    def test_correct_password_calls_logger(self,mock_logger_new):
+    @patch("accounts.views.logger")
+    def test_correct_password_calls_logger(self,mock_logger):
         """Test accounts.views.login calls logger info when receives correct password"""
-        new_logger = Mock()
-        bound_logger = Mock()
-        new_logger.bind.return_value=bound_logger
-        mock_logger_new.return_value=new_logger
         self.client.post(
             "/accounts/login",
             data={"email": "edith@mailinator.com", "password": "epwd"},
         )
-        self.assertEqual(bound_logger.info.called,True)
-        message_used = bound_logger.info.call_args
+        self.assertEqual(mock_logger.info.called,True)
+        message_used = mock_logger.info.call_args
         self.assertEqual(call("Successful login"),message_used)
 
-    @patch("accounts.views.logger.new")
-    def test_correct_password_binds_user_name(self,mock_logger_new):
-        """Test accounts.views.login binds username when receives correct password"""
-        new_logger = Mock()
-        mock_logger_new.return_value=new_logger
+    @patch("accounts.views.logger")
+    def test_correct_password_binds_user_name(self,mock_logger):
+        """Test accounts.views.login binds username to the log context when receives correct password"""
+        contexts = record_log_context(mock_logger)
         self.client.post(
             "/accounts/login",
             data={"email": "edith@mailinator.com", "password": "epwd"},
         )
-        self.assertEqual(new_logger.bind.called,True)
-        data_added = new_logger.bind.call_args
-        self.assertEqual(call(user="edith@mailinator.com"),data_added)
+        self.assertEqual(contexts[0]["user"],"edith@mailinator.com")
 
-    @patch("accounts.views.logger.new")
-    def test_correct_password_creates_a_new_logger(self,mock_logger_new):
-        """Test accounts.views.login creates a new logger when receives correct password"""
+    @patch("accounts.views.logger")
+    def test_wrong_password_does_not_log_password(self,mock_logger):
+        """Test accounts.views.login logs the email but not the password of a failed login"""
+        self.client.post(
+            "/accounts/login",
+            data={"email": "edith@mailinator.com", "password": "wrong"},
+        )
+        message_used = mock_logger.info.call_args
+        self.assertEqual(call("Failed login attempt", email="edith@mailinator.com"),message_used)
+
+    def test_user_is_not_kept_in_log_context_after_request(self):
+        """Test accounts.views.login leaves no user bound to the log context once the response is sent"""
         self.client.post(
             "/accounts/login",
             data={"email": "edith@mailinator.com", "password": "epwd"},
         )
-        self.assertEqual(mock_logger_new.called,True)
+        self.assertNotIn("user", get_log_context())
 
 #    def test_wrong_password_XXX(self):
 
@@ -84,22 +94,22 @@ class LogoutViewTest(TestCase):
 class CreateNewStravaUserTest(TestCase):
 
     """Tests for logs in Create New Strava User view"""
-    @patch("accounts.views.logger.bind")
-    def test_user_does_not_exist_calls_logger(self,mock_logger_bind):
+    @patch("accounts.views.logger")
+    def test_user_does_not_exist_calls_logger(self,mock_logger):
         """Test accounts.views.CreateNewStravaUser calls logger when called for user that does not exist"""
-        bound_logger = Mock()
-        mock_logger_bind.return_value=bound_logger
+        contexts = record_log_context(mock_logger)
         response = self.client.post(
             "/accounts/new/strava", data={"email": "edith@mailinator.com"}
         )
-        self.assertEqual(len(bound_logger.info.mock_calls),2)
+        self.assertEqual(contexts[0]["user"],"edith@mailinator.com")
+        self.assertEqual(len(mock_logger.info.mock_calls),2)
         self.assertEqual(
             call("User created"),
-            bound_logger.info.mock_calls[0]
+            mock_logger.info.mock_calls[0]
         )
         self.assertEqual(
             call("Successful login"),
-            bound_logger.info.mock_calls[1]
+            mock_logger.info.mock_calls[1]
         )
             
 #    def test_redirects_to_login_page_if_user_exists(self):
@@ -116,28 +126,25 @@ class ChangePasswordViewTest(TestCase):
             "edith@mailinator.com", "edith@mailinator.com", "epwd"
         )
 
-    @patch("accounts.views.logger.bind")
-    def test_post_calls_logger_if_user_logged_in(self,mock_logger_bind):
+    @patch("accounts.views.logger")
+    def test_post_calls_logger_if_user_logged_in(self,mock_logger):
         """Test accounts.views.change_password calls logger.info (usr logged in)"""
-        bound_logger = Mock()
-        mock_logger_bind.return_value=bound_logger
         self.client.login(username=self.existing_user.email, password="epwd")
         response = self.client.post(
             "/accounts/change-password",
             data={"password": "newpwd","next": "home"},
         )
-        self.assertEqual(bound_logger.info.called,True)
-        message_used = bound_logger.info.call_args
+        self.assertEqual(mock_logger.info.called,True)
+        message_used = mock_logger.info.call_args
         self.assertEqual(call("Password changed"),message_used)
 
-    @patch("accounts.views.logger.bind")
-    def test_post_binds_username(self,mock_logger_bind):
-        """Test accounts.views.change_password binds username (user logged in)"""
+    @patch("accounts.views.logger")
+    def test_post_binds_username(self,mock_logger):
+        """Test accounts.views.change_password binds username to the log context (user logged in)"""
+        contexts = record_log_context(mock_logger)
         self.client.login(username=self.existing_user.email, password="epwd")
         response = self.client.post(
             "/accounts/change-password",
             data={"password": "newpwd","next": "home"},
         )
-        self.assertEqual(mock_logger_bind.called,True)
-        data_added = mock_logger_bind.call_args
-        self.assertEqual(call(user="edith@mailinator.com"),data_added)
+        self.assertEqual(contexts[0]["user"],"edith@mailinator.com")
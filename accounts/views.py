@@ -17,6 +17,7 @@ from .forms import LoginForm, ChangePasswordForm
 from keys.forms import HeroForm
 from utils.strava_utils import strava_oauth_code_request_url
 from utils.spotify_utils import spotify_oauth_code_request_url
+from utils.request_context import bind_log_context
 
 
 LOGIN_ERROR = "Ooops, wrong user or password"
@@ -33,22 +34,18 @@ def login(request):
             {"login_form": login_form},
         )
     
-    global logger
     login_form = LoginForm(request.POST)
     if login_form.is_valid():
         email = login_form.cleaned_data.get("email")
         password = login_form.cleaned_data.get("password")
         user = authenticate(username=email, password=password)
         if user is not None:
-            logger = logger.new()
-            logger = logger.bind(user=user.email)
+            bind_log_context(user=user.email)
             logger.info("Successful login")
             auth_login(request, user)
             return render(request, "home.html")
         else:
-            logger = logger.bind(email=email)
-            logger = logger.bind(password=password)
-            logger.info("Failed login attempt")
+            logger.info("Failed login attempt", email=email)
             messages.add_message(request, messages.ERROR, LOGIN_ERROR)
     return render(request, 
         "login.html",
@@ -57,14 +54,12 @@ def login(request):
 
 def logout(request):
     """Log out user currently logged in"""
-    global logger
     auth_logout(request)
     logger.info("Logout")
     return redirect(reverse("home"))
 
 
 def create_new_strava_user(request):
-    global logger
     hero_form = HeroForm(request.POST)
     login_form = LoginForm()
     if hero_form.is_valid():
@@ -72,7 +67,7 @@ def create_new_strava_user(request):
         user_model = django.contrib.auth.get_user_model()
         try:
             user = user_model.objects.create_user(username=email, email=email)
-            logger = logger.bind(user=user.email)
+            bind_log_context(user=user.email)
             logger.info("User created")
         except Exception:
             #user = user_model.objects.filter(username=email)[0]
@@ -82,7 +77,7 @@ def create_new_strava_user(request):
                 "login.html", 
                 {"login_form": login_form}
             )
-        auth_login(request, user)
+        auth_login(request, user, backend="django.contrib.auth.backends.ModelBackend")
         logger.info("Successful login")
     else:
         return render(
@@ -95,9 +90,7 @@ def create_new_strava_user(request):
 
 def change_password(request):
     """Change password for logged in user"""
-    global logger
     logged_in_user = request.user
-    logger = logger.bind(user=logged_in_user.email)
     change_password_form = ChangePasswordForm(request.POST)
     if change_password_form.is_valid():
         password = change_password_form.cleaned_data.get("password")
@@ -0,0 +1,82 @@
+""" Fitness lost during breaks in training and how fast it comes back
+
+Answers the questions of analysis.md: after some days without training, how far back does
+fitness (CTL) go, and does it take less time to get it back than it took to build it?
+"""
+from collections import namedtuple
+
+import numpy as np
+
+from .fitness import update_fitness_series
+
+MIN_GAP_DAYS = 7
+
+Gap = namedtuple('Gap', [
+    'start',              # first day without activities
+    'end',                # last day without activities
+    'days',
+    'fitness_before',     # CTL on the last day with activities before the gap
+    'fitness_after',      # CTL on the last day of the gap
+    'loss',
+    'loss_per_day',
+    'build_days',         # days it took before the gap to go from fitness_after to fitness_before
+    'build_per_day',
+    'recovery_days',      # days it took after the gap to get back to fitness_before
+    'recovery_per_day',
+])
+
+
+def find_gaps(activities, min_gap_days=MIN_GAP_DAYS):
+    """Return (first, last) day indexes of the runs of at least min_gap_days days without activities
+
+    Only breaks between two days with activities are gaps.
+    """
+    active_days = np.flatnonzero(np.asarray(activities) > 0)
+    rest_days = np.diff(active_days) - 1
+    breaks = np.flatnonzero(rest_days >= min_gap_days)
+    return list(zip(active_days[breaks] + 1, active_days[breaks + 1] - 1))
+
+
+def _rate(amount, days):
+    return amount / days if days else None
+
+
+def analyse_gap(ctl, start, end):
+    """Return the Gap of the break from day index start to end in a fitness (CTL) series"""
+    fitness_before = ctl[start - 1]
+    fitness_after = ctl[end]
+    loss = fitness_before - fitness_after
+
+    # Last day before the gap with fitness at or below the level fitness dropped to
+    below = np.flatnonzero(ctl[:start] <= fitness_after)
+    build_days = int(start - 1 - below[-1]) if len(below) else None
+
+    # First day after the gap with fitness back to its level before the gap
+    recovered = np.flatnonzero(ctl[end + 1:] >= fitness_before)
+    recovery_days = int(recovered[0] + 1) if len(recovered) else None
+
+    return Gap(
+        start=int(start),
+        end=int(end),
+        days=int(end - start + 1),
+        fitness_before=float(fitness_before),
+        fitness_after=float(fitness_after),
+        loss=float(loss),
+        loss_per_day=float(loss / (end - start + 1)),
+        build_days=build_days,
+        build_per_day=_rate(float(loss), build_days),
+        recovery_days=recovery_days,
+        recovery_per_day=_rate(float(loss), recovery_days),
+    )
+
+
+def detraining_report(user, min_gap_days=MIN_GAP_DAYS, today=None):
+    """Return the Gap of every break of a user, with days as dates, from the user fitness series"""
+    series = update_fitness_series(user, today)
+    ctl = series.ctl
+    days = series.days
+    report = []
+    for start, end in find_gaps(series.activities, min_gap_days):
+        gap = analyse_gap(ctl, start, end)
+        report.append(gap._replace(start=days[gap.start].astype(object), end=days[gap.end].astype(object)))
+    return report
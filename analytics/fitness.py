@@ -0,0 +1,89 @@
+""" Per user daily fitness series, kept up to date incrementally as activities arrive """
+from datetime import datetime, time, timezone as dt_timezone
+
+import numpy as np
+from django.db.models import Min, Max
+from django.utils import timezone
+
+from keys.models import Activity
+from .models import FitnessSeries
+from .training_load import (
+    activity_arrays,
+    daily_totals,
+    ewma,
+    trimp,
+    CTL_TIME_CONSTANT,
+    ATL_TIME_CONSTANT,
+)
+
+
+def _day_number(value):
+    if isinstance(value, datetime):
+        value = value.replace(tzinfo=None)
+    return int(np.datetime64(value, 'D').astype(np.int64))
+
+
+def _day_start(day_number):
+    day = np.datetime64(int(day_number), 'D').astype(object)
+    return datetime.combine(day, time.min).replace(tzinfo=dt_timezone.utc)
+
+
+def _compute_days(user, first_day, last_day, ctl_before=0.0, atl_before=0.0):
+    """Return load, activity counts, CTL and ATL of a user from first_day to last_day (day numbers)"""
+    n_days = last_day - first_day + 1
+    rows = (
+        Activity.objects.filter(user=user, start_date_local__gte=_day_start(first_day))
+        .values_list('user_id', 'start_date_local', 'moving_time', 'average_heartrate')
+    )
+    _, days, moving_times, heartrates = activity_arrays(rows.iterator())
+    in_range = days <= last_day
+    days = days[in_range] - first_day
+    load = daily_totals(days, trimp(moving_times[in_range], heartrates[in_range]), n_days)[0]
+    activities = daily_totals(days, np.ones(len(days)), n_days)[0]
+    ctl = ewma(load, CTL_TIME_CONSTANT, initial=ctl_before)
+    atl = ewma(load, ATL_TIME_CONSTANT, initial=atl_before)
+    return load, activities, ctl, atl
+
+
+def update_fitness_series(user, today=None):
+    """Return the FitnessSeries of a user, up to date with stored activities and extended to today
+
+    Only days from the first day changed by activities stored since the last update are
+    recomputed, starting from the stored fitness and fatigue of the day before.
+    """
+    series, _ = FitnessSeries.objects.get_or_create(user=user)
+    new_activities = Activity.objects.filter(
+        user=user, pk__gt=series.last_activity_pk
+    ).exclude(start_date_local=None)
+    new = new_activities.aggregate(first_date=Min('start_date_local'), last_pk=Max('pk'))
+
+    today = _day_number(today or timezone.now())
+    first_day = None if series.first_day is None else _day_number(series.first_day)
+    stored_last_day = None if first_day is None else first_day + len(series.load) - 1
+
+    if new['last_pk'] is None:
+        if first_day is None or stored_last_day >= today:
+            return series
+        changed_day = stored_last_day + 1
+    else:
+        changed_day = _day_number(new['first_date'])
+        series.last_activity_pk = new['last_pk']
+    if stored_last_day is not None:
+        # Days after the stored series are computed too, even when they have no activities
+        changed_day = min(changed_day, stored_last_day + 1)
+    last_day = max(today, changed_day, changed_day if stored_last_day is None else stored_last_day)
+
+    if first_day is None or changed_day <= first_day:
+        first_day = changed_day if first_day is None else min(first_day, changed_day)
+        arrays = _compute_days(user, first_day, last_day)
+    else:
+        keep = changed_day - first_day
+        kept = {name: series.get_array(name)[:keep] for name in FitnessSeries.ARRAYS}
+        tail = _compute_days(user, changed_day, last_day, kept['ctl'][-1], kept['atl'][-1])
+        arrays = [np.concatenate([kept[name], values]) for name, values in zip(FitnessSeries.ARRAYS, tail)]
+
+    series.first_day = np.datetime64(first_day, 'D').astype(object)
+    for name, values in zip(FitnessSeries.ARRAYS, arrays):
+        series.set_array(name, values)
+    series.save()
+    return series
@@ -0,0 +1,31 @@
+# Generated by Django 2.0.1 on 2026-10-18 11:45
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FitnessSeries',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('first_day', models.DateField(blank=True, null=True)),
+                ('last_activity_pk', models.BigIntegerField(default=0)),
+                ('load_data', models.BinaryField(default=b'')),
+                ('activities_data', models.BinaryField(default=b'')),
+                ('ctl_data', models.BinaryField(default=b'')),
+                ('atl_data', models.BinaryField(default=b'')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
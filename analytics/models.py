@@ -0,0 +1,60 @@
+""" Models to store analyses computed from the activities of users """
+import numpy as np
+
+from django.db import models
+from django.contrib import auth
+
+
+class FitnessSeries(models.Model):
+    """Daily training load, activity count, fitness (CTL) and fatigue (ATL) of a user
+
+    Arrays are stored as raw float64 bytes, one value per day from first_day. Activities up to
+    last_activity_pk are included, see analytics.fitness.update_fitness_series.
+    """
+    ARRAYS = ('load', 'activities', 'ctl', 'atl')
+
+    user_model = auth.get_user_model()
+
+    user = models.OneToOneField(user_model, on_delete=models.CASCADE)
+    first_day = models.DateField(null=True, blank=True)
+    last_activity_pk = models.BigIntegerField(default=0)
+    load_data = models.BinaryField(default=b'')
+    activities_data = models.BinaryField(default=b'')
+    ctl_data = models.BinaryField(default=b'')
+    atl_data = models.BinaryField(default=b'')
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def get_array(self, name):
+        return np.frombuffer(bytes(getattr(self, f'{name}_data')), dtype=np.float64)
+
+    def set_array(self, name, values):
+        setattr(self, f'{name}_data', np.ascontiguousarray(values, dtype=np.float64).tobytes())
+
+    @property
+    def load(self):
+        return self.get_array('load')
+
+    @property
+    def activities(self):
+        return self.get_array('activities')
+
+    @property
+    def ctl(self):
+        return self.get_array('ctl')
+
+    @property
+    def atl(self):
+        return self.get_array('atl')
+
+    @property
+    def tsb(self):
+        ctl, atl = self.ctl, self.atl
+        tsb = np.zeros_like(ctl)
+        tsb[1:] = ctl[:-1] - atl[:-1]
+        return tsb
+
+    @property
+    def days(self):
+        if self.first_day is None:
+            return np.zeros(0, dtype='datetime64[D]')
+        return np.datetime64(self.first_day, 'D') + np.arange(len(self.load))
@@ -0,0 +1,74 @@
+""" Songs played during each activity: Spotify plays joined onto the time windows of activities
+
+Windows are sorted by start and each play is located with a binary search, so joining m plays
+onto n activities costs O((n + m) log n) instead of comparing every play with every activity.
+"""
+from datetime import datetime, timezone
+
+import numpy as np
+from django.utils.dateparse import parse_datetime
+
+from keys.models import Activity, Play
+
+
+def _epoch_seconds(dates):
+    """Return the seconds since the epoch of UTC datetimes"""
+    return np.array(
+        [np.datetime64(date.replace(tzinfo=None), 's') for date in dates], dtype='datetime64[s]'
+    ).astype(np.int64)
+
+
+def assign_plays(starts, ends, play_times):
+    """Return for each play time the index of the window [start, end) it falls in, -1 when in none
+
+    Windows do not need to be sorted. When windows overlap a play goes to the latest window
+    started before it, if it is still inside that window.
+    """
+    starts = np.asarray(starts, dtype=np.int64)
+    ends = np.asarray(ends, dtype=np.int64)
+    play_times = np.asarray(play_times, dtype=np.int64)
+    if len(starts) == 0:
+        return np.full(len(play_times), -1, dtype=np.int64)
+    order = np.argsort(starts, kind='mergesort')
+    position = np.searchsorted(starts[order], play_times, side='right') - 1
+    window = np.maximum(position, 0)
+    inside = (position >= 0) & (play_times < ends[order][window])
+    return np.where(inside, order[window], -1)
+
+
+def strava_activity_windows(activities):
+    """Return start and end (seconds since the epoch) of activities as returned by get_strava_activities"""
+    starts = _epoch_seconds(parse_datetime(activity.get('start_date')) for activity in activities)
+    moving_times = np.array([activity.get('moving_time') or 0 for activity in activities], dtype=np.int64)
+    return starts, starts + moving_times
+
+
+def plays_during_activities(user):
+    """Return the plays (played at, track id) of a user during each of their activities, keyed by Activity pk
+
+    Activities last their moving time from their (UTC) start date. Activities without plays are left out.
+    """
+    activities = list(
+        Activity.objects.filter(user=user).exclude(start_date=None)
+        .values_list('pk', 'start_date', 'moving_time')
+    )
+    if not activities:
+        return {}
+    pks, start_dates, moving_times = zip(*activities)
+    starts = _epoch_seconds(start_dates)
+    ends = starts + np.array([time or 0 for time in moving_times], dtype=np.int64)
+
+    plays = list(
+        Play.objects.filter(
+            user=user,
+            played_at__gte=datetime.fromtimestamp(int(starts.min()), timezone.utc),
+            played_at__lt=datetime.fromtimestamp(int(ends.max()), timezone.utc),
+        ).order_by('played_at').values_list('played_at', 'track_id')
+    )
+    if not plays:
+        return {}
+    owners = assign_plays(starts, ends, _epoch_seconds(played_at for played_at, _ in plays))
+    during = {}
+    for index in np.flatnonzero(owners >= 0):
+        during.setdefault(pks[owners[index]], []).append(plays[index])
+    return during
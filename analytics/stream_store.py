@@ -0,0 +1,122 @@
+""" Columnar on disk store of the per second streams of activities
+
+Each channel of an activity is kept in its own .npy file, <root>/<user id>/<activity id>/<channel>.npy,
+holding a typed array. Files are read back memory mapped, so slicing a time window of a long
+ride only reads the pages of that window.
+"""
+import os
+import shutil
+import tempfile
+
+import numpy as np
+from django.conf import settings
+
+from utils.strava_utils import get_strava_activity_streams
+
+# Type of the samples of each channel stored, samples missing from float channels are NaN
+CHANNEL_DTYPES = {
+    'time': np.int32,
+    'heartrate': np.float32,
+    'velocity_smooth': np.float32,
+    'cadence': np.float32,
+    'altitude': np.float32,
+    'distance': np.float32,
+}
+FILE_EXTENSION = '.npy'
+
+
+class StreamStore:
+    """Stores and memory maps the channels of activities below a root directory"""
+
+    def __init__(self, root):
+        self.root = root
+
+    def activity_path(self, user_id, activity_id):
+        return os.path.join(self.root, str(user_id), str(activity_id))
+
+    def write(self, user_id, activity_id, streams):
+        """Store the channels of an activity from a dictionary of samples, replacing stored ones
+
+        Channels not in CHANNEL_DTYPES are left out. Each file is written to a temporary file
+        first and moved in place, readers never see half written files.
+        """
+        path = self.activity_path(user_id, activity_id)
+        os.makedirs(path, exist_ok=True)
+        for channel, samples in streams.items():
+            dtype = CHANNEL_DTYPES.get(channel)
+            if dtype is None:
+                continue
+            if np.issubdtype(dtype, np.floating):
+                samples = [np.nan if sample is None else sample for sample in samples]
+            values = np.asarray(samples, dtype=dtype)
+            descriptor, temporary = tempfile.mkstemp(dir=path, suffix=FILE_EXTENSION)
+            with os.fdopen(descriptor, 'wb') as stream_file:
+                np.save(stream_file, values)
+            os.replace(temporary, os.path.join(path, channel + FILE_EXTENSION))
+
+    def channels(self, user_id, activity_id):
+        """Return the names of the channels stored for an activity"""
+        try:
+            names = os.listdir(self.activity_path(user_id, activity_id))
+        except FileNotFoundError:
+            return []
+        return sorted(
+            name[:-len(FILE_EXTENSION)] for name in names
+            if name.endswith(FILE_EXTENSION) and name[:-len(FILE_EXTENSION)] in CHANNEL_DTYPES
+        )
+
+    def read(self, user_id, activity_id, channels=None):
+        """Return a dictionary of the channels of an activity as read only numpy.memmap arrays
+
+        Channels that are not stored are left out, an activity without streams gives {}.
+        """
+        path = self.activity_path(user_id, activity_id)
+        stored = self.channels(user_id, activity_id)
+        return {
+            channel: np.load(os.path.join(path, channel + FILE_EXTENSION), mmap_mode='r')
+            for channel in (stored if channels is None else channels)
+            if channel in stored
+        }
+
+    def window(self, user_id, activity_id, start, end, channels=None):
+        """Return the channels of an activity between `start` and `end` seconds, as memmap views
+
+        Samples are located with a binary search of the time channel, nothing is copied.
+        Returns {} when the activity has no time channel.
+        """
+        streams = self.read(user_id, activity_id, channels)
+        time = self.read(user_id, activity_id, ['time']).get('time')
+        if time is None:
+            return {}
+        first, last = np.searchsorted(time, [start, end], side='left')
+        return {channel: values[first:last] for channel, values in streams.items()}
+
+    def delete(self, user_id, activity_id):
+        shutil.rmtree(self.activity_path(user_id, activity_id), ignore_errors=True)
+
+    def activities(self, user_id):
+        """Return the ids of the activities of a user with stored streams"""
+        try:
+            return sorted(os.listdir(os.path.join(self.root, str(user_id))))
+        except FileNotFoundError:
+            return []
+
+
+def stream_store():
+    return StreamStore(settings.STREAM_STORE_ROOT)
+
+
+def load_activity_streams(user, token, strava_id, store=None):
+    """Return the memory mapped streams of a Strava activity, fetching and storing them when not stored
+
+    Returns None when they are not stored and can not be fetched.
+    """
+    store = store or stream_store()
+    streams = store.read(user.pk, strava_id)
+    if streams:
+        return streams
+    received = get_strava_activity_streams(token, strava_id)
+    if received is None:
+        return None
+    store.write(user.pk, strava_id, received)
+    return store.read(user.pk, strava_id)
@@ -0,0 +1,66 @@
+"""Unit tests for the analysis of breaks in training"""
+from datetime import datetime, date, timezone
+
+import numpy as np
+from django.test import TestCase
+from django.contrib import auth
+
+from keys.models import Activity
+from ..detraining import find_gaps, analyse_gap, detraining_report
+
+class FindGapsTest(TestCase):
+
+    """Unit tests for analytics.detraining.find_gaps"""
+
+    def test_finds_runs_of_days_without_activities(self):
+        """Test analytics.detraining.find_gaps returns first and last day of long enough breaks"""
+        activities = np.array([1, 0, 0, 1, 0, 0, 0, 0, 2, 1, 0, 0, 0])
+        self.assertEqual(find_gaps(activities, min_gap_days=3), [(4, 7)])
+
+    def test_ignores_days_after_last_activity(self):
+        """Test analytics.detraining.find_gaps does not count days after the last activity as a gap"""
+        self.assertEqual(find_gaps(np.array([1, 0, 0, 0, 0]), min_gap_days=2), [])
+
+class AnalyseGapTest(TestCase):
+
+    """Unit tests for analytics.detraining.analyse_gap"""
+
+    def test_reports_loss_build_and_recovery(self):
+        """Test analytics.detraining.analyse_gap compares time to lose, build and recover fitness"""
+        ctl = np.array([0, 2, 4, 6, 8, 7, 6, 5, 4, 6, 8, 9], dtype=float)
+        gap = analyse_gap(ctl, start=5, end=8)
+        self.assertEqual(gap.days, 4)
+        self.assertEqual((gap.fitness_before, gap.fitness_after, gap.loss), (8, 4, 4))
+        self.assertEqual(gap.loss_per_day, 1)
+        self.assertEqual((gap.build_days, gap.build_per_day), (2, 2))
+        self.assertEqual((gap.recovery_days, gap.recovery_per_day), (2, 2))
+
+    def test_recovery_is_none_until_fitness_is_back(self):
+        """Test analytics.detraining.analyse_gap has no recovery when fitness is not back yet"""
+        ctl = np.array([0, 4, 8, 6, 4, 5], dtype=float)
+        gap = analyse_gap(ctl, start=3, end=4)
+        self.assertIsNone(gap.recovery_days)
+        self.assertIsNone(gap.recovery_per_day)
+
+class DetrainingReportTest(TestCase):
+
+    """Unit tests for analytics.detraining.detraining_report"""
+
+    def test_reports_breaks_of_stored_activities(self):
+        """Test analytics.detraining.detraining_report finds breaks in the activities of a user"""
+        user_model = auth.get_user_model()
+        user = user_model.objects.create_user(
+            username="edith@mailinator.com", email="edith@mailinator.com", password="epwd"
+        )
+        for strava_id, day in enumerate([1, 2, 3, 4, 5, 16, 17, 18, 19, 20, 21, 22]):
+            Activity.objects.create(
+                user=user,
+                strava_id=strava_id,
+                moving_time=3600,
+                start_date_local=datetime(2018, 5, day, 19, tzinfo=timezone.utc),
+                average_heartrate=150,
+            )
+        report = detraining_report(user, today=datetime(2018, 5, 31))
+        self.assertEqual(len(report), 1)
+        self.assertEqual((report[0].start, report[0].end), (date(2018, 5, 6), date(2018, 5, 15)))
+        self.assertGreater(report[0].loss, 0)
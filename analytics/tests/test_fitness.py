@@ -0,0 +1,92 @@
+"""Unit tests for the per user fitness series"""
+from datetime import datetime, date, timezone
+
+import numpy as np
+from django.test import TestCase
+from django.contrib import auth
+
+from keys.models import Activity
+from ..models import FitnessSeries
+from ..fitness import update_fitness_series
+
+class UpdateFitnessSeriesTest(TestCase):
+
+    """Unit tests for analytics.fitness.update_fitness_series"""
+
+    def setUp(self):
+        """Create a user with activities on the first days of May 2018"""
+        user_model = auth.get_user_model()
+        self.existing_user = user_model.objects.create_user(
+            username="edith@mailinator.com", email="edith@mailinator.com", password="epwd"
+        )
+        self.next_strava_id = 1
+        for day in (1, 2, 4):
+            self.create_activity(day)
+
+    def create_activity(self, day, month=5, heartrate=150):
+        """Helper function to store an activity of an hour on a day of 2018"""
+        Activity.objects.create(
+            user=self.existing_user,
+            strava_id=self.next_strava_id,
+            moving_time=3600,
+            start_date_local=datetime(2018, month, day, 19, tzinfo=timezone.utc),
+            average_heartrate=heartrate,
+        )
+        self.next_strava_id += 1
+
+    def full_series(self, today):
+        """Helper function to compute the series of the user from scratch"""
+        FitnessSeries.objects.filter(user=self.existing_user).delete()
+        return update_fitness_series(self.existing_user, today)
+
+    def assertSameSeries(self, series, expected):
+        self.assertEqual(series.first_day, expected.first_day)
+        for name in FitnessSeries.ARRAYS:
+            np.testing.assert_allclose(series.get_array(name), expected.get_array(name), rtol=1e-12)
+
+    def test_covers_first_activity_to_today(self):
+        """Test analytics.fitness.update_fitness_series has a value for each day from the first activity to today"""
+        series = update_fitness_series(self.existing_user, datetime(2018, 5, 10))
+        self.assertEqual(series.first_day, date(2018, 5, 1))
+        self.assertEqual(len(series.ctl), 10)
+        self.assertEqual(series.activities.tolist(), [1, 1, 0, 1, 0, 0, 0, 0, 0, 0])
+
+    def test_stored_series_is_reused_without_new_activities(self):
+        """Test analytics.fitness.update_fitness_series does not recompute when nothing changed"""
+        update_fitness_series(self.existing_user, datetime(2018, 5, 10))
+        with self.assertNumQueries(2):
+            update_fitness_series(self.existing_user, datetime(2018, 5, 10))
+
+    def test_new_activities_give_same_series_as_full_computation(self):
+        """Test analytics.fitness.update_fitness_series recomputes new days like a computation from scratch"""
+        update_fitness_series(self.existing_user, datetime(2018, 5, 10))
+        self.create_activity(8)
+        self.create_activity(15)
+        series = update_fitness_series(self.existing_user, datetime(2018, 5, 20))
+        self.assertSameSeries(series, self.full_series(datetime(2018, 5, 20)))
+
+    def test_new_activities_after_days_not_stored_give_same_series_as_full_computation(self):
+        """Test analytics.fitness.update_fitness_series computes the days between the stored series and new activities"""
+        update_fitness_series(self.existing_user, datetime(2018, 5, 10))
+        self.create_activity(18)
+        series = update_fitness_series(self.existing_user, datetime(2018, 5, 20))
+        self.assertEqual(len(series.ctl), 20)
+        self.assertEqual(series.activities[17], 1)
+        self.assertSameSeries(series, self.full_series(datetime(2018, 5, 20)))
+
+    def test_only_recomputes_from_first_changed_day(self):
+        """Test analytics.fitness.update_fitness_series keeps the stored days before the new activities"""
+        series = update_fitness_series(self.existing_user, datetime(2018, 5, 10))
+        FitnessSeries.objects.filter(pk=series.pk).update(ctl_data=np.full(10, 99.0).tobytes())
+        self.create_activity(6)
+        series = update_fitness_series(self.existing_user, datetime(2018, 5, 10))
+        self.assertEqual(series.ctl[:5].tolist(), [99.0] * 5)
+        self.assertNotEqual(series.ctl[5], 99.0)
+
+    def test_older_activities_recompute_whole_series(self):
+        """Test analytics.fitness.update_fitness_series starts again from activities older than the series"""
+        update_fitness_series(self.existing_user, datetime(2018, 5, 10))
+        self.create_activity(20, month=4)
+        series = update_fitness_series(self.existing_user, datetime(2018, 5, 10))
+        self.assertEqual(series.first_day, date(2018, 4, 20))
+        self.assertSameSeries(series, self.full_series(datetime(2018, 5, 10)))
@@ -0,0 +1,68 @@
+"""Unit tests for the songs played during activities"""
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+from django.test import TestCase
+from django.contrib import auth
+
+from keys.models import Activity, Play
+from ..soundtrack import assign_plays, strava_activity_windows, plays_during_activities
+
+class AssignPlaysTest(TestCase):
+
+    """Unit tests for analytics.soundtrack.assign_plays"""
+
+    def test_assigns_each_play_to_its_window(self):
+        """Test analytics.soundtrack.assign_plays returns the window of each play, -1 outside windows"""
+        owners = assign_plays(starts=[100, 10], ends=[160, 40], play_times=[5, 10, 39, 40, 99, 100, 159, 160])
+        self.assertEqual(owners.tolist(), [-1, 1, 1, -1, -1, 0, 0, -1])
+
+    def test_gives_same_result_as_nested_loop(self):
+        """Test analytics.soundtrack.assign_plays agrees with comparing every play with every window"""
+        random = np.random.RandomState(1)
+        starts = np.arange(0, 100000, 1000) + random.randint(0, 200, 100)
+        ends = starts + random.randint(1, 800, 100)
+        play_times = random.randint(-500, 101000, 2000)
+        expected = [
+            next((index for index, (start, end) in enumerate(zip(starts, ends)) if start <= time < end), -1)
+            for time in play_times
+        ]
+        self.assertEqual(assign_plays(starts, ends, play_times).tolist(), expected)
+
+    def test_no_windows(self):
+        """Test analytics.soundtrack.assign_plays leaves every play out without windows"""
+        self.assertEqual(assign_plays([], [], [1, 2]).tolist(), [-1, -1])
+
+class StravaActivityWindowsTest(TestCase):
+
+    """Unit tests for analytics.soundtrack.strava_activity_windows"""
+
+    def test_windows_last_moving_time(self):
+        """Test analytics.soundtrack.strava_activity_windows ends activities after their moving time"""
+        starts, ends = strava_activity_windows([{"start_date": "2018-05-15T18:12:19Z", "moving_time": 2909}])
+        self.assertEqual(starts.tolist(), [1526407939])
+        self.assertEqual(ends.tolist(), [1526407939 + 2909])
+
+class PlaysDuringActivitiesTest(TestCase):
+
+    """Unit tests for analytics.soundtrack.plays_during_activities"""
+
+    def test_returns_plays_during_each_activity(self):
+        """Test analytics.soundtrack.plays_during_activities groups the plays of a user by activity"""
+        user_model = auth.get_user_model()
+        user = user_model.objects.create_user(
+            username="edith@mailinator.com", email="edith@mailinator.com", password="epwd"
+        )
+        other_user = user_model.objects.create_user(
+            username="joe@mailinator.com", email="joe@mailinator.com", password="jpwd"
+        )
+        start = datetime(2018, 5, 15, 18, 0, tzinfo=timezone.utc)
+        run = Activity.objects.create(user=user, strava_id=1, start_date=start, moving_time=1800)
+        Activity.objects.create(user=user, strava_id=2, start_date=start + timedelta(days=1), moving_time=1800)
+        for minutes in (-5, 0, 10, 29, 31):
+            Play.objects.create(user=user, track_id=f"track{minutes}", played_at=start + timedelta(minutes=minutes))
+        Play.objects.create(user=other_user, track_id="other", played_at=start + timedelta(minutes=1))
+
+        during = plays_during_activities(user)
+        self.assertEqual(list(during), [run.pk])
+        self.assertEqual([track_id for _, track_id in during[run.pk]], ["track0", "track10", "track29"])
@@ -0,0 +1,100 @@
+"""Unit tests for the store of activity streams"""
+import tempfile
+from unittest.mock import patch
+
+import numpy as np
+from django.test import TestCase
+from django.contrib import auth
+
+from ..stream_store import StreamStore, load_activity_streams
+
+class StreamStoreTest(TestCase):
+
+    """Unit tests for analytics.stream_store.StreamStore"""
+
+    def setUp(self):
+        """Use a store in a temporary directory"""
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.store = StreamStore(directory.name)
+        self.streams = {
+            'time': [0, 1, 2, 4, 5],
+            'heartrate': [120, 121, None, 125, 126],
+            'velocity_smooth': [2.5, 2.6, 2.7, 2.8, 2.9],
+            'latlng': [[45.1, 7.6]] * 5,
+        }
+
+    def test_reads_back_typed_memory_mapped_channels(self):
+        """Test analytics.stream_store.StreamStore.read returns each stored channel as a memmap"""
+        self.store.write(1, 1543287625, self.streams)
+        streams = self.store.read(1, 1543287625)
+        self.assertEqual(sorted(streams), ['heartrate', 'time', 'velocity_smooth'])
+        self.assertIsInstance(streams['time'], np.memmap)
+        self.assertEqual(streams['time'].dtype, np.int32)
+        self.assertEqual(streams['time'].tolist(), [0, 1, 2, 4, 5])
+        np.testing.assert_allclose(streams['velocity_smooth'], [2.5, 2.6, 2.7, 2.8, 2.9], rtol=1e-6)
+
+    def test_stores_missing_samples_as_nan(self):
+        """Test analytics.stream_store.StreamStore.write keeps missing samples of float channels as NaN"""
+        self.store.write(1, 1543287625, self.streams)
+        heartrate = self.store.read(1, 1543287625, ['heartrate'])['heartrate']
+        self.assertEqual(np.isnan(heartrate).tolist(), [False, False, True, False, False])
+
+    def test_window_slices_time_range_without_copying(self):
+        """Test analytics.stream_store.StreamStore.window returns views of the samples in a time range"""
+        self.store.write(1, 1543287625, self.streams)
+        window = self.store.window(1, 1543287625, 1, 5, ['velocity_smooth'])
+        self.assertEqual(list(window), ['velocity_smooth'])
+        self.assertIsInstance(window['velocity_smooth'], np.memmap)
+        np.testing.assert_allclose(window['velocity_smooth'], [2.6, 2.7, 2.8], rtol=1e-6)
+
+    def test_write_replaces_stored_channels(self):
+        """Test analytics.stream_store.StreamStore.write replaces the channels written again"""
+        self.store.write(1, 1543287625, self.streams)
+        self.store.write(1, 1543287625, {'time': [0, 1]})
+        streams = self.store.read(1, 1543287625)
+        self.assertEqual(streams['time'].tolist(), [0, 1])
+        self.assertEqual(len(streams['heartrate']), 5)
+
+    def test_lists_and_deletes_activities(self):
+        """Test analytics.stream_store.StreamStore lists the activities stored and deletes them"""
+        self.store.write(1, 1543287625, self.streams)
+        self.store.write(1, 1543287626, self.streams)
+        self.store.delete(1, 1543287625)
+        self.assertEqual(self.store.activities(1), ['1543287626'])
+        self.assertEqual(self.store.read(1, 1543287625), {})
+        self.assertEqual(self.store.activities(2), [])
+
+class LoadActivityStreamsTest(TestCase):
+
+    """Unit tests for analytics.stream_store.load_activity_streams"""
+
+    def setUp(self):
+        """Create a user and a store in a temporary directory"""
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.store = StreamStore(directory.name)
+        user_model = auth.get_user_model()
+        self.existing_user = user_model.objects.create_user(
+            username="edith@mailinator.com", email="edith@mailinator.com", password="epwd"
+        )
+
+    @patch('analytics.stream_store.get_strava_activity_streams')
+    def test_fetches_streams_only_once(self, get_streams_mock):
+        """Test analytics.stream_store.load_activity_streams stores the streams fetched from Strava"""
+        get_streams_mock.return_value = {'time': [0, 1, 2], 'heartrate': [120, 121, 122]}
+        load_activity_streams(self.existing_user, "87a407fc475a61ef97265b4bf8867f3ecfc102af", 1543287625, self.store)
+        streams = load_activity_streams(
+            self.existing_user, "87a407fc475a61ef97265b4bf8867f3ecfc102af", 1543287625, self.store
+        )
+        get_streams_mock.assert_called_once_with("87a407fc475a61ef97265b4bf8867f3ecfc102af", 1543287625)
+        self.assertEqual(streams['heartrate'].tolist(), [120, 121, 122])
+
+    @patch('analytics.stream_store.get_strava_activity_streams')
+    def test_returns_none_when_strava_fails(self, get_streams_mock):
+        """Test analytics.stream_store.load_activity_streams returns None when streams can not be fetched"""
+        get_streams_mock.return_value = None
+        self.assertIsNone(
+            load_activity_streams(self.existing_user, "87a407fc475a61ef97265b4bf8867f3ecfc102af", 1, self.store)
+        )
+        self.assertEqual(self.store.activities(self.existing_user.pk), [])
@@ -0,0 +1,120 @@
+"""Unit tests for training load computations"""
+from datetime import datetime, timezone
+
+import numpy as np
+from django.test import TestCase
+from django.contrib import auth
+
+from keys.models import Activity
+from ..training_load import (
+    trimp,
+    daily_totals,
+    ewma,
+    fitness_fatigue_form,
+    compute_training_load,
+    training_load,
+)
+
+def ewma_loop(values, time_constant):
+    """Reference implementation of the exponentially weighted average, a day at a time"""
+    result = []
+    average = 0.0
+    for value in values:
+        average += (value - average) / time_constant
+        result.append(average)
+    return np.array(result)
+
+class TrimpTest(TestCase):
+
+    """Unit tests for analytics.training_load.trimp"""
+
+    def test_computes_banister_trimp(self):
+        """Test analytics.training_load.trimp uses duration and heart rate reserve"""
+        # One hour at 50% of heart rate reserve
+        load = trimp([3600], [125], rest_heartrate=60, max_heartrate=190)
+        self.assertAlmostEqual(load[0], 60 * 0.5 * 0.64 * np.exp(1.92 * 0.5))
+
+    def test_activities_without_heartrate_have_no_load(self):
+        """Test analytics.training_load.trimp gives 0 to activities without heart rate"""
+        self.assertEqual(list(trimp([3600, 3600], [np.nan, 60])), [0, 0])
+
+class DailyTotalsTest(TestCase):
+
+    """Unit tests for analytics.training_load.daily_totals"""
+
+    def test_adds_values_of_same_day_and_row(self):
+        """Test analytics.training_load.daily_totals adds up values per row and day"""
+        totals = daily_totals([0, 0, 2, 1], [1.0, 2.0, 3.0, 4.0], 3, rows=[0, 0, 0, 1], n_rows=2)
+        self.assertEqual(totals.tolist(), [[3.0, 0.0, 3.0], [0.0, 4.0, 0.0]])
+
+class EwmaTest(TestCase):
+
+    """Unit tests for analytics.training_load.ewma"""
+
+    def test_matches_day_by_day_average_over_years(self):
+        """Test analytics.training_load.ewma gives the same values as a day by day loop over several years"""
+        values = np.random.RandomState(0).uniform(0, 300, 5 * 365)
+        for time_constant in (7, 42):
+            np.testing.assert_allclose(ewma(values, time_constant), ewma_loop(values, time_constant), rtol=1e-9)
+
+    def test_smooths_each_row(self):
+        """Test analytics.training_load.ewma smooths rows independently"""
+        values = np.random.RandomState(1).uniform(0, 300, (3, 400))
+        smoothed = ewma(values, 7)
+        for row in range(3):
+            np.testing.assert_allclose(smoothed[row], ewma_loop(values[row], 7), rtol=1e-9)
+
+class FitnessFatigueFormTest(TestCase):
+
+    """Unit tests for analytics.training_load.fitness_fatigue_form"""
+
+    def test_form_is_previous_day_fitness_minus_fatigue(self):
+        """Test analytics.training_load.fitness_fatigue_form computes TSB from the day before"""
+        ctl, atl, tsb = fitness_fatigue_form(np.array([100.0, 0.0, 50.0]))
+        self.assertEqual(tsb[0], 0)
+        self.assertAlmostEqual(tsb[2], ctl[1] - atl[1])
+        self.assertAlmostEqual(ctl[0], 100 / 42)
+        self.assertAlmostEqual(atl[0], 100 / 7)
+
+class ComputeTrainingLoadTest(TestCase):
+
+    """Unit tests for analytics.training_load.compute_training_load"""
+
+    def test_gives_one_row_per_user(self):
+        """Test analytics.training_load.compute_training_load separates users and spans every day"""
+        result = compute_training_load(
+            np.array([7, 3, 7]), np.array([10, 12, 14]), np.array([3600.0] * 3), np.array([150.0] * 3)
+        )
+        self.assertEqual(list(result.user_ids), [3, 7])
+        self.assertEqual(result.load.shape, (2, 5))
+        user_7 = result.for_user(7)
+        self.assertEqual(np.count_nonzero(user_7['load']), 2)
+        self.assertEqual(result.days[0], np.datetime64(10, 'D'))
+
+class TrainingLoadTest(TestCase):
+
+    """Unit tests for analytics.training_load.training_load"""
+
+    def setUp(self):
+        """Create a user with activities on two days"""
+        user_model = auth.get_user_model()
+        self.existing_user = user_model.objects.create_user(
+            username="edith@mailinator.com", email="edith@mailinator.com", password="epwd"
+        )
+        for strava_id, day, heartrate in ((1, 1, 150), (2, 1, None), (3, 3, 140)):
+            Activity.objects.create(
+                user=self.existing_user,
+                strava_id=strava_id,
+                moving_time=3600,
+                start_date_local=datetime(2018, 5, day, 19, tzinfo=timezone.utc),
+                average_heartrate=heartrate,
+            )
+
+    def test_computes_daily_load_of_stored_activities(self):
+        """Test analytics.training_load.training_load reads stored activities up to the day asked"""
+        result = training_load([self.existing_user], last_day=datetime(2018, 5, 5))
+        user_load = result.for_user(self.existing_user.pk)
+        self.assertEqual(result.days[0], np.datetime64('2018-05-01'))
+        self.assertEqual(len(user_load['load']), 5)
+        self.assertAlmostEqual(user_load['load'][0], trimp([3600], [150])[0])
+        self.assertAlmostEqual(user_load['load'][2], trimp([3600], [140])[0])
@@ -0,0 +1,78 @@
+"""Unit tests for the structure of workouts"""
+import numpy as np
+from django.test import TestCase
+
+from ..workout_structure import (
+    resample,
+    rolling_max,
+    change_points,
+    workout_structure,
+    EASY,
+    HARD,
+    STEADY_WORKOUT,
+    INTERVALS_WORKOUT,
+    TEMPO_WORKOUT,
+)
+
+def velocity_streams(*efforts):
+    """Helper function to build streams from (seconds, velocity) efforts"""
+    velocity = np.concatenate([np.full(seconds, value) for seconds, value in efforts])
+    return {'time': list(range(len(velocity))), 'velocity_smooth': velocity.tolist()}
+
+class RollingTest(TestCase):
+
+    """Unit tests for analytics.workout_structure helpers"""
+
+    def test_rolling_max_returns_max_of_each_window(self):
+        """Test analytics.workout_structure.rolling_max returns the same as a max over each window"""
+        values = np.random.RandomState(1).rand(100)
+        expected = [values[i:i + 7].max() for i in range(94)]
+        self.assertEqual(rolling_max(values, 7).tolist(), expected)
+
+    def test_resample_interpolates_missing_seconds(self):
+        """Test analytics.workout_structure.resample gives one value per second"""
+        self.assertEqual(resample([0, 1, 4], [2, 2, 5]).tolist(), [2, 2, 3, 4, 5])
+
+    def test_change_points_finds_changes_of_effort(self):
+        """Test analytics.workout_structure.change_points returns the second where the effort changes"""
+        intensity = np.concatenate([np.full(300, 3.0), np.full(300, 4.0), np.full(300, 3.0)])
+        self.assertEqual(change_points(intensity).tolist(), [300, 600])
+
+class WorkoutStructureTest(TestCase):
+
+    """Unit tests for analytics.workout_structure.workout_structure"""
+
+    def test_labels_noisy_constant_effort_as_steady(self):
+        """Test analytics.workout_structure.workout_structure finds a single segment in a steady run"""
+        velocity = 3 * (1 + 0.05 * np.random.RandomState(1).randn(7200))
+        streams = {'time': list(range(7200)), 'velocity_smooth': velocity.tolist()}
+        structure = workout_structure(streams)
+        self.assertEqual(structure.label, STEADY_WORKOUT)
+        self.assertEqual(len(structure.segments), 1)
+
+    def test_labels_hard_and_rest_repetitions_as_intervals(self):
+        """Test analytics.workout_structure.workout_structure finds each repetition of intervals"""
+        streams = velocity_streams((600, 2.8), *[(180, 4.5), (120, 1.5)] * 5, (600, 2.8))
+        structure = workout_structure(streams)
+        self.assertEqual(structure.label, INTERVALS_WORKOUT)
+        hard = [segment for segment in structure.segments if segment.level == HARD]
+        self.assertEqual([segment.start for segment in hard], [600, 900, 1200, 1500, 1800])
+
+    def test_labels_easy_hard_easy_as_tempo(self):
+        """Test analytics.workout_structure.workout_structure finds the easy, tempo and easy parts"""
+        structure = workout_structure(velocity_streams((900, 2.8), (1500, 3.8), (900, 2.8)))
+        self.assertEqual(structure.label, TEMPO_WORKOUT)
+        self.assertEqual(
+            [(segment.start, segment.end, segment.level) for segment in structure.segments],
+            [(0, 900, EASY), (900, 2400, HARD), (2400, 3300, EASY)]
+        )
+
+    def test_uses_heartrate_without_velocity(self):
+        """Test analytics.workout_structure.workout_structure falls back to heart rate"""
+        streams = {'time': list(range(600)), 'heartrate': [120] * 200 + [170] * 200 + [120] * 200}
+        self.assertEqual(workout_structure(streams).label, TEMPO_WORKOUT)
+
+    def test_returns_none_without_enough_samples(self):
+        """Test analytics.workout_structure.workout_structure returns None for too short streams"""
+        self.assertIsNone(workout_structure({'time': [0, 1], 'heartrate': [120, 121]}))
+        self.assertIsNone(workout_structure({'time': [0, 1]}))
@@ -0,0 +1,141 @@
+""" Training load (TRIMP) and the fitness, fatigue and form computed from it
+
+Everything works on NumPy arrays of days, one row per user when several users are
+computed together, so that whole histories are computed without Python loops over
+activities or days.
+"""
+import numpy as np
+
+from keys.models import Activity
+
+DEFAULT_REST_HEARTRATE = 60
+DEFAULT_MAX_HEARTRATE = 190
+CTL_TIME_CONSTANT = 42
+ATL_TIME_CONSTANT = 7
+# Days smoothed together by ewma, small enough for decay ** -EWMA_BLOCK_DAYS to stay accurate
+EWMA_BLOCK_DAYS = 128
+SECONDS_PER_DAY = 24 * 60 * 60
+
+
+def trimp(moving_times, heartrates, rest_heartrate=DEFAULT_REST_HEARTRATE, max_heartrate=DEFAULT_MAX_HEARTRATE):
+    """Return Banister TRIMP of activities from their moving times (seconds) and average heart rates
+
+    Activities without heart rate (NaN) have no TRIMP.
+    """
+    minutes = np.asarray(moving_times, dtype=float) / 60
+    reserve = (np.asarray(heartrates, dtype=float) - rest_heartrate) / (max_heartrate - rest_heartrate)
+    reserve = np.clip(reserve, 0, 1)
+    load = minutes * reserve * 0.64 * np.exp(1.92 * reserve)
+    return np.nan_to_num(load)
+
+
+def daily_totals(days, values, n_days, rows=None, n_rows=1):
+    """Add up values falling on the same day (and row), returns an array of n_rows x n_days"""
+    days = np.asarray(days, dtype=np.int64)
+    index = days if rows is None else np.asarray(rows, dtype=np.int64) * n_days + days
+    totals = np.bincount(index, weights=values, minlength=n_rows * n_days)
+    return totals.reshape(n_rows, n_days)
+
+
+def ewma(values, time_constant, initial=0.0):
+    """Exponentially weighted average along the last axis: y[t] = y[t-1] + (x[t] - y[t-1]) / time_constant
+
+    Computed a block of days at a time with cumulative sums: within a block
+    y[j] = decay ** (j + 1) * y[-1] + alpha * decay ** j * cumsum(x[k] / decay ** k)
+    """
+    values = np.asarray(values, dtype=float)
+    alpha = 1.0 / time_constant
+    decay = 1.0 - alpha
+    powers = decay ** np.arange(EWMA_BLOCK_DAYS)
+    carry = np.broadcast_to(np.asarray(initial, dtype=float), values.shape[:-1]).copy()
+    result = np.empty_like(values)
+    for start in range(0, values.shape[-1], EWMA_BLOCK_DAYS):
+        block = values[..., start:start + EWMA_BLOCK_DAYS]
+        block_powers = powers[:block.shape[-1]]
+        smoothed = alpha * block_powers * np.cumsum(block / block_powers, axis=-1)
+        smoothed += carry[..., np.newaxis] * (block_powers * decay)
+        result[..., start:start + EWMA_BLOCK_DAYS] = smoothed
+        carry = smoothed[..., -1]
+    return result
+
+
+def fitness_fatigue_form(daily_load, ctl_time_constant=CTL_TIME_CONSTANT, atl_time_constant=ATL_TIME_CONSTANT):
+    """Return fitness (CTL), fatigue (ATL) and form (TSB) for daily loads
+
+    Form of a day is the fitness minus the fatigue of the day before, the first day has no form.
+    """
+    ctl = ewma(daily_load, ctl_time_constant)
+    atl = ewma(daily_load, atl_time_constant)
+    tsb = np.zeros_like(ctl)
+    tsb[..., 1:] = ctl[..., :-1] - atl[..., :-1]
+    return ctl, atl, tsb
+
+
+def _day_numbers(start_dates):
+    """Return the number of days since the epoch of datetime64 dates"""
+    return np.asarray(start_dates, dtype='datetime64[D]').astype(np.int64)
+
+
+def activity_arrays(activities):
+    """Pack (user id, start date local, moving time, average heartrate) rows into NumPy arrays"""
+    rows = list(activities)
+    if not rows:
+        return np.zeros(0, np.int64), np.zeros(0, np.int64), np.zeros(0), np.zeros(0)
+    user_ids, start_dates, moving_times, heartrates = zip(*rows)
+    dates = np.array([np.datetime64(date.replace(tzinfo=None), 's') for date in start_dates])
+    return (
+        np.array(user_ids, dtype=np.int64),
+        _day_numbers(dates),
+        np.array([time or 0 for time in moving_times], dtype=float),
+        np.array([np.nan if rate is None else rate for rate in heartrates], dtype=float),
+    )
+
+
+class TrainingLoad:
+    """Daily TRIMP, CTL, ATL and TSB of users, one row per user and one column per day"""
+
+    def __init__(self, user_ids, first_day, load, ctl, atl, tsb):
+        self.user_ids = user_ids
+        self.first_day = first_day
+        self.load = load
+        self.ctl = ctl
+        self.atl = atl
+        self.tsb = tsb
+
+    @property
+    def days(self):
+        return np.arange(self.load.shape[-1]) + np.datetime64(int(self.first_day), 'D')
+
+    def for_user(self, user_id):
+        """Return the row of the arrays of a user"""
+        row = int(np.searchsorted(self.user_ids, user_id))
+        if row == len(self.user_ids) or self.user_ids[row] != user_id:
+            raise KeyError(user_id)
+        return {name: getattr(self, name)[row] for name in ('load', 'ctl', 'atl', 'tsb')}
+
+
+def compute_training_load(user_ids, days, moving_times, heartrates, last_day=None, **trimp_kwargs):
+    """Compute the TrainingLoad of the users of activity arrays, from their first activity to last_day"""
+    users, rows = np.unique(user_ids, return_inverse=True)
+    if len(days) == 0:
+        first_day = last_day if last_day is not None else 0
+        empty = np.zeros((len(users), 0))
+        return TrainingLoad(users, first_day, empty, empty, empty, empty)
+    first_day = int(days.min())
+    last_day = int(days.max()) if last_day is None else max(int(last_day), int(days.max()))
+    n_days = last_day - first_day + 1
+    load = daily_totals(days - first_day, trimp(moving_times, heartrates, **trimp_kwargs), n_days, rows, len(users))
+    ctl, atl, tsb = fitness_fatigue_form(load)
+    return TrainingLoad(users, first_day, load, ctl, atl, tsb)
+
+
+def training_load(users=None, last_day=None, **trimp_kwargs):
+    """Compute the TrainingLoad of users (all users with activities by default) from stored activities"""
+    activities = Activity.objects.all()
+    if users is not None:
+        activities = activities.filter(user__in=users)
+    rows = activities.values_list('user_id', 'start_date_local', 'moving_time', 'average_heartrate')
+    arrays = activity_arrays(rows.exclude(start_date_local=None).iterator())
+    if last_day is not None:
+        last_day = _day_numbers([np.datetime64(last_day)])[0]
+    return compute_training_load(*arrays, last_day=last_day, **trimp_kwargs)
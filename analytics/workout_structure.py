@@ -0,0 +1,150 @@
+""" Structure of a workout (steady, intervals, tempo) found in its Strava streams
+
+Streams are resampled to one sample per second and searched for change points with
+rolling means computed from cumulative sums, so a two hour stream is segmented without
+Python loops over samples.
+"""
+from collections import namedtuple
+
+import numpy as np
+
+from .stream_store import load_activity_streams
+
+# Seconds of each side of a candidate change point compared with each other
+CHANGE_WINDOW = 30
+# Relative change in intensity between both sides that makes a change point
+CHANGE_THRESHOLD = 0.1
+# Relative distance from the average intensity of the workout that makes a segment easy or hard
+LEVEL_STEP = 0.1
+# Hard segments, separated by easier ones, that make a workout intervals
+MIN_INTERVALS = 3
+
+EASY = 'easy'
+STEADY = 'steady'
+HARD = 'hard'
+
+STEADY_WORKOUT = 'steady'
+INTERVALS_WORKOUT = 'intervals'
+TEMPO_WORKOUT = 'tempo'
+MIXED_WORKOUT = 'mixed'
+
+Segment = namedtuple('Segment', ['start', 'end', 'level', 'intensity'])
+WorkoutStructure = namedtuple('WorkoutStructure', ['label', 'segments'])
+
+
+def resample(time, values):
+    """Return values sampled at irregular times (seconds) linearly interpolated at every second"""
+    time = np.asarray(time, dtype=float)
+    values = np.asarray(values, dtype=float)
+    seconds = np.arange(time[0], time[-1] + 1)
+    return np.interp(seconds, time, values)
+
+
+def rolling_sums(values, window):
+    """Return the sums of every run of `window` consecutive values, len(values) - window + 1 of them"""
+    cumulative = np.concatenate([[0.0], np.cumsum(values, dtype=float)])
+    return cumulative[window:] - cumulative[:-window]
+
+
+def rolling_max(values, window):
+    """Return the maxima of every run of `window` consecutive values, len(values) - window + 1 of them
+
+    Uses running maxima forwards and backwards within blocks of `window` values (van Herk / Gil-Werman).
+    """
+    values = np.asarray(values, dtype=float)
+    n_blocks = -(-len(values) // window)
+    padded = np.full(n_blocks * window, -np.inf)
+    padded[:len(values)] = values
+    blocks = padded.reshape(n_blocks, window)
+    forward = np.maximum.accumulate(blocks, axis=1).ravel()
+    backward = np.maximum.accumulate(blocks[:, ::-1], axis=1)[:, ::-1].ravel()
+    n_windows = len(values) - window + 1
+    return np.maximum(backward[:n_windows], forward[window - 1:window - 1 + n_windows])
+
+
+def change_points(intensity, window=CHANGE_WINDOW, threshold=CHANGE_THRESHOLD):
+    """Return the seconds where the average intensity before and after differs the most
+
+    Candidates are seconds whose `window` seconds before and after differ by more than `threshold`
+    of the average intensity, kept when no candidate within `window` seconds differs more.
+    """
+    intensity = np.asarray(intensity, dtype=float)
+    if len(intensity) < 2 * window:
+        return np.empty(0, dtype=np.int64)
+    means = rolling_sums(intensity, window) / window
+    # score[i] compares the seconds before and after second i + window
+    score = np.abs(means[window:] - means[:-window]) / max(intensity.mean(), np.finfo(float).tiny)
+    padded = np.concatenate([np.full(window, -np.inf), score, np.full(window, -np.inf)])
+    local_max = rolling_max(padded, 2 * window + 1)
+    previous = np.concatenate([[-np.inf], score[:-1]])
+    is_peak = (score > threshold) & (score == local_max) & (score > previous)
+    return np.flatnonzero(is_peak) + window
+
+
+def segment(intensity, window=CHANGE_WINDOW, threshold=CHANGE_THRESHOLD, level_step=LEVEL_STEP):
+    """Split a second by second intensity into Segments of the same level (easy, steady or hard)
+
+    The level of a segment depends on its average intensity relative to the whole workout.
+    Neighbouring segments of the same level are merged.
+    """
+    intensity = np.asarray(intensity, dtype=float)
+    starts = np.concatenate([[0], change_points(intensity, window, threshold)])
+    ends = np.concatenate([starts[1:], [len(intensity)]])
+    means = np.add.reduceat(intensity, starts) / (ends - starts)
+    relative = means / max(intensity.mean(), np.finfo(float).tiny)
+    levels = np.where(relative > 1 + level_step, HARD, np.where(relative < 1 - level_step, EASY, STEADY))
+
+    first = np.concatenate([[True], levels[1:] != levels[:-1]])
+    starts, levels = starts[first], levels[first]
+    ends = np.concatenate([starts[1:], [len(intensity)]])
+    means = np.add.reduceat(intensity, starts) / (ends - starts)
+    return [
+        Segment(int(start), int(end), str(level), float(mean))
+        for start, end, level, mean in zip(starts, ends, levels, means)
+    ]
+
+
+def label_structure(segments):
+    """Name the structure of a workout from its segments
+
+    intervals: at least MIN_INTERVALS hard segments separated by easier ones
+    tempo: an easy start and finish around harder efforts
+    steady: a single level from start to finish
+    """
+    levels = [segment.level for segment in segments]
+    if len(set(levels)) == 1:
+        return STEADY_WORKOUT
+    if levels.count(HARD) >= MIN_INTERVALS:
+        return INTERVALS_WORKOUT
+    if levels[0] == EASY and levels[-1] == EASY and EASY not in levels[1:-1]:
+        return TEMPO_WORKOUT
+    return MIXED_WORKOUT
+
+
+def workout_structure(streams, window=CHANGE_WINDOW, threshold=CHANGE_THRESHOLD):
+    """Return the WorkoutStructure of a workout from its streams, as received from Strava
+
+    Velocity measures intensity, heart rate when the workout has no velocity.
+    Returns None when there are not enough samples.
+    """
+    velocity = streams.get('velocity_smooth')
+    channel = 'velocity_smooth' if velocity is not None and len(velocity) else 'heartrate'
+    time, values = streams.get('time'), streams.get(channel)
+    if time is None or values is None or not len(time) or len(time) != len(values):
+        return None
+    intensity = resample(time, values)
+    if len(intensity) < 2 * window:
+        return None
+    segments = segment(intensity, window, threshold)
+    return WorkoutStructure(label_structure(segments), segments)
+
+
+def strava_workout_structure(user, token, strava_id):
+    """Return the WorkoutStructure of a Strava activity of a user, None on error
+
+    Streams are read from the stream store, and fetched from Strava the first time.
+    """
+    streams = load_activity_streams(user, token, strava_id)
+    if streams is None:
+        return None
+    return workout_structure(streams)
@@ -17,6 +17,9 @@ import structlog
 import structlog.processors
 import structlog.stdlib
 
+from utils.request_context import merge_log_context
+from utils.log_pipeline import compact_dumps
+
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
@@ -47,14 +50,17 @@ INSTALLED_APPS = [
     'keys',
     'accounts',
     'API',
+    'analytics',
 ]
 
 MIDDLEWARE = [
+    'utils.middleware.RequestTimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'utils.middleware.RequestLogContextMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -63,7 +69,8 @@ ROOT_URLCONF = 'justletic.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'NAME': 'django',
+        'BACKEND': 'utils.timing.TimedDjangoTemplates',
         'DIRS': [],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -89,6 +96,23 @@ DATABASES = {
     }
 }
 
+# Cache
+# https://docs.djangoproject.com/en/2.0/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', 'justletic'),
+    }
+}
+
+# Cache holding the activity summary of each user and how long (seconds) it is kept
+ACTIVITY_SUMMARY_CACHE = os.environ.get('ACTIVITY_SUMMARY_CACHE', 'default')
+ACTIVITY_SUMMARY_CACHE_TTL = int(os.environ.get('ACTIVITY_SUMMARY_CACHE_TTL', 15 * 60))
+
+# Cache counting the Strava API calls of the application, it must be shared by the web and worker processes
+STRAVA_RATE_LIMIT_CACHE = os.environ.get('STRAVA_RATE_LIMIT_CACHE', 'default')
+
 # Password validation
 # https://docs.djangoproject.com/en/1.11/ref/settings/#auth-password-validators
 
@@ -109,6 +133,8 @@ AUTH_PASSWORD_VALIDATORS = [
 
 AUTHENTICATION_BACKENDS = [
     'django.contrib.auth.backends.ModelBackend',
+    # Logs in users typing their email with a different case
+    'accounts.authentication.JustleticAuthenticationBackend',
 ]
 
 # Test runner
@@ -116,7 +142,7 @@ TEST_RUNNER = 'django_nose.NoseTestSuiteRunner'
 #TEST_RUNNER = 'utils.test_runner.DisableLoggingNoseTestSuiteRunner'
 NOSE_ARGS = [
     '--with-coverage',
-    '--cover-package=accounts,keys, utils, API',
+    '--cover-package=accounts,keys, utils, API, analytics',
     '--cover-html',
     '--cover-erase',
     "--logging-filter='selenium'",
@@ -142,16 +168,33 @@ USE_TZ = True
 STATIC_URL = '/static/'
 
 # Logging
+# The dev profile writes indented JSON to stdout from the thread logging. The production
+# profile (LOG_PROFILE=production) renders single line JSON and hands records to a bounded
+# queue written by a background thread, dropping (and counting) records when it is full.
+
+LOG_PROFILE = os.environ.get('LOG_PROFILE', 'dev')
+LOG_QUEUE_SIZE = int(os.environ.get('LOG_QUEUE_SIZE', 10000))
+
+if LOG_PROFILE == 'production':
+    LOG_HANDLER = {
+        '()': 'utils.log_pipeline.queue_handler',
+        'maxsize': LOG_QUEUE_SIZE,
+        'level': 'INFO',
+    }
+    LOG_RENDERER = structlog.processors.JSONRenderer(serializer=compact_dumps)
+else:
+    LOG_HANDLER = {
+        'class': 'logging.StreamHandler',
+        'level': 'INFO',
+        'stream': sys.stdout,
+    }
+    LOG_RENDERER = structlog.processors.JSONRenderer(indent=1, sort_keys=True)
 
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
     'handlers': {
-        'console': {
-            'class': 'logging.StreamHandler',
-            'level': 'INFO',
-            'stream': sys.stdout,
-        },
+        'console': LOG_HANDLER,
     },
     'loggers': {
         '': {
@@ -164,11 +207,12 @@ LOGGING = {
 
 structlog.configure(
     processors = [
+        merge_log_context,
         structlog.stdlib.add_logger_name,
         structlog.stdlib.add_log_level,
         structlog.processors.TimeStamper(fmt="iso", utc=True),
         structlog.processors.format_exc_info,
-        structlog.processors.JSONRenderer(indent=1, sort_keys=True),
+        LOG_RENDERER,
     ],
     wrapper_class = structlog.stdlib.BoundLogger
 )
@@ -181,9 +225,22 @@ structlog.configure(
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework.authentication.TokenAuthentication',
+        'API.authentication.CachedTokenAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
     )
 }
+
+# Cache of the users authenticated by API tokens: entries kept in each process, how long
+# (seconds) they are kept, and the Django cache (if any) holding them instead, so that
+# deleted tokens and deactivated users are rejected at once by every process
+API_TOKEN_CACHE_SIZE = int(os.environ.get('API_TOKEN_CACHE_SIZE', 1024))
+API_TOKEN_CACHE_TTL = int(os.environ.get('API_TOKEN_CACHE_TTL', 60))
+API_TOKEN_CACHE = os.environ.get('API_TOKEN_CACHE') or None
+
+# Rows per page of the paginated API lists (users, tokens)
+API_PAGE_SIZE = int(os.environ.get('API_PAGE_SIZE', 100))
+
+# Directory of the per second activity streams, one file per channel of each activity
+STREAM_STORE_ROOT = os.environ.get('STREAM_STORE_ROOT', os.path.join(BASE_DIR, 'streams'))
@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class KeysConfig(AppConfig):
     name = 'keys'
+
+    def ready(self):
+        import keys.signals
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from keys.models import Key
+from keys.sync import sync_spotify_plays
+
+
+class Command(BaseCommand):
+    help = "Store the tracks played on Spotify since the last sync by every user with a Spotify key"
+
+    def handle(self, *args, **options):
+        for key in Key.objects.filter(service=Key.SPOTIFY).select_related("user").iterator():
+            created = sync_spotify_plays(key)
+            if created is None:
+                self.stderr.write(f"Spotify error syncing the plays of user {key.user_id}")
+            else:
+                self.stdout.write(f"Stored {created} plays of user {key.user_id}")
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from keys.worker import run_worker, SYNC_WORKER_POLL_INTERVAL
+
+
+class Command(BaseCommand):
+    help = "Run the worker that syncs activities queued by the views"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--name", default=None, help="Name that identifies this worker in the job table")
+        parser.add_argument("--poll-interval", type=float, default=SYNC_WORKER_POLL_INTERVAL)
+        parser.add_argument("--once", action="store_true", help="Stop when there are no jobs left")
+
+    def handle(self, *args, **options):
+        run_worker(
+            worker=options["name"],
+            poll_interval=options["poll_interval"],
+            once=options["once"],
+        )
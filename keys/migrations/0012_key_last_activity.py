@@ -0,0 +1,18 @@
+# Generated by Django 2.0.1 on 2026-10-18 08:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('keys', '0011_auto_20180828_1851'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='key',
+            name='last_activity_date',
+            field=models.DateTimeField(blank=True, default=None, null=True),
+        ),
+    ]
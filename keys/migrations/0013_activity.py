@@ -0,0 +1,41 @@
+# Generated by Django 2.0.1 on 2026-10-18 09:02
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('keys', '0012_key_last_activity'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Activity',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('platform', models.CharField(default='Strava', max_length=20)),
+                ('strava_id', models.BigIntegerField()),
+                ('distance', models.FloatField(blank=True, null=True)),
+                ('moving_time', models.IntegerField(blank=True, null=True)),
+                ('elevation_gain', models.FloatField(blank=True, null=True)),
+                ('type', models.CharField(blank=True, max_length=30)),
+                ('start_date', models.DateTimeField(blank=True, null=True)),
+                ('start_date_local', models.DateTimeField(blank=True, null=True)),
+                ('average_heartrate', models.FloatField(blank=True, null=True)),
+                ('average_cadence', models.FloatField(blank=True, null=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='activity',
+            index=models.Index(fields=['user', 'start_date'], name='keys_activi_user_id_9a3713_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='activity',
+            unique_together={('user', 'strava_id')},
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 2.0.1 on 2026-10-18 10:05
+
+from django.conf import settings
+from django.db import migrations
+from django.db.models import Max
+
+
+def delete_duplicate_keys(apps, schema_editor):
+    """Keep only the newest Key of each user for each service"""
+    Key = apps.get_model('keys', 'Key')
+    newest = Key.objects.values('user', 'service').annotate(newest=Max('pk')).values('newest')
+    Key.objects.exclude(pk__in=newest).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('keys', '0014_syncjob'),
+    ]
+
+    operations = [
+        migrations.RunPython(delete_duplicate_keys, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='key',
+            unique_together={('user', 'service')},
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 2.0.1 on 2026-10-18 09:23
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('keys', '0015_key_user_service_unique'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='key',
+            name='last_play_cursor',
+            field=models.BigIntegerField(blank=True, default=None, null=True),
+        ),
+        migrations.CreateModel(
+            name='Play',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('track_id', models.CharField(max_length=22)),
+                ('played_at', models.DateTimeField()),
+                ('duration_ms', models.PositiveIntegerField(blank=True, null=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('user', 'played_at')},
+            },
+        ),
+    ]
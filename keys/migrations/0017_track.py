@@ -0,0 +1,23 @@
+# Generated by Django 2.0.1 on 2026-10-18 09:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('keys', '0016_play'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Track',
+            fields=[
+                ('track_id', models.CharField(max_length=22, primary_key=True, serialize=False)),
+                ('tempo', models.FloatField(blank=True, null=True)),
+                ('energy', models.FloatField(blank=True, null=True)),
+                ('danceability', models.FloatField(blank=True, null=True)),
+                ('valence', models.FloatField(blank=True, null=True)),
+            ],
+        ),
+    ]
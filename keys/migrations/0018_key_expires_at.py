@@ -0,0 +1,33 @@
+# Generated by Django 2.0.1 on 2026-10-18 09:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('keys', '0017_track'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='key',
+            name='expires_at',
+            field=models.DateTimeField(blank=True, default=None, null=True),
+        ),
+        migrations.AddField(
+            model_name='key',
+            name='refreshing_until',
+            field=models.DateTimeField(blank=True, default=None, null=True),
+        ),
+        migrations.AlterField(
+            model_name='key',
+            name='refresh_token',
+            field=models.CharField(blank=True, default=None, max_length=255),
+        ),
+        migrations.AlterField(
+            model_name='key',
+            name='token',
+            field=models.CharField(default=None, max_length=255),
+        ),
+    ]
@@ -1,7 +1,30 @@
 """ Models to store Keys and tokens for authenticated services """
 
-from django.db import models
+from datetime import timedelta
+
+from django.db import models, transaction, IntegrityError
+from django.db.models import F, Q
 from django.contrib import auth
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+ACTIVITY_INGEST_BATCH_SIZE = 500
+SYNC_JOB_MAX_ATTEMPTS = 5
+SYNC_JOB_BACKOFF = timedelta(seconds=30)
+SYNC_JOB_MAX_BACKOFF = timedelta(hours=1)
+SYNC_JOB_LOCK_TIMEOUT = timedelta(minutes=10)
+# Time after a job finished before the next sync of the same user is queued
+SYNC_JOB_MIN_INTERVAL = timedelta(minutes=5)
+
+
+class KeyManager(models.Manager):
+
+    def for_service(self, user, service):
+        """Return the Key of a user for a service, None if the user has not authorised the service"""
+        try:
+            return self.get(user=user, service=service)
+        except self.model.DoesNotExist:
+            return None
 
 
 class Key(models.Model):
@@ -15,11 +38,322 @@ class Key(models.Model):
     user_model = auth.get_user_model()
 
     user = models.ForeignKey(user_model, on_delete=models.CASCADE)
-    token = models.CharField(max_length=50, default=None)
-    refresh_token = models.CharField(max_length=50, default=None, blank=True)
+    token = models.CharField(max_length=255, default=None)
+    refresh_token = models.CharField(max_length=255, default=None, blank=True)
     strava_id = models.CharField(max_length=50, default=None, blank=True)
     service = models.CharField(
         max_length=3,
         choices=SERVICE_CHOICES,
         default=None,
     )
+    last_activity_date = models.DateTimeField(null=True, blank=True, default=None)
+    # When activities were last received from Strava, None until the first sync is done
+    last_synced_at = models.DateTimeField(null=True, blank=True, default=None)
+    # Spotify cursor (milliseconds since the epoch) of the newest play stored
+    last_play_cursor = models.BigIntegerField(null=True, blank=True, default=None)
+    # When the (Spotify) access token stops working, None if unknown
+    expires_at = models.DateTimeField(null=True, blank=True, default=None)
+    # Until when a process renewing the access token holds the renewal, None when nobody does
+    refreshing_until = models.DateTimeField(null=True, blank=True, default=None)
+
+    objects = KeyManager()
+
+    class Meta:
+        unique_together = (('user', 'service'),)
+
+
+class ActivityManager(models.Manager):
+
+    def ingest(self, user, activities, batch_size=ACTIVITY_INGEST_BATCH_SIZE):
+        """Store activities received from Strava for a user, skipping the ones already stored
+
+        Each batch costs one query to find the activities already stored and one bulk insert.
+        Returns the number of activities created
+        """
+        created = 0
+        batch = []
+        for activity in activities:
+            batch.append(activity)
+            if len(batch) == batch_size:
+                created += self._ingest_batch(user, batch)
+                batch = []
+        if batch:
+            created += self._ingest_batch(user, batch)
+        return created
+
+    def _ingest_batch(self, user, batch):
+        return _create_missing_rows(self._create_missing, user, batch)
+
+    def _create_missing(self, user, batch):
+        strava_ids = [activity.get('strava_id') for activity in batch]
+        stored = set(
+            self.filter(user=user, strava_id__in=strava_ids).values_list('strava_id', flat=True)
+        )
+        new_activities = []
+        for activity in batch:
+            if activity.get('strava_id') in stored:
+                continue
+            stored.add(activity.get('strava_id'))
+            new_activities.append(self.model.from_strava(user, activity))
+        self.bulk_create(new_activities)
+        return len(new_activities)
+
+
+class Activity(models.Model):
+    user_model = auth.get_user_model()
+
+    user = models.ForeignKey(user_model, on_delete=models.CASCADE)
+    platform = models.CharField(max_length=20, default='Strava')
+    strava_id = models.BigIntegerField()
+    distance = models.FloatField(null=True, blank=True)
+    moving_time = models.IntegerField(null=True, blank=True)
+    elevation_gain = models.FloatField(null=True, blank=True)
+    type = models.CharField(max_length=30, blank=True)
+    start_date = models.DateTimeField(null=True, blank=True)
+    start_date_local = models.DateTimeField(null=True, blank=True)
+    average_heartrate = models.FloatField(null=True, blank=True)
+    average_cadence = models.FloatField(null=True, blank=True)
+
+    objects = ActivityManager()
+
+    class Meta:
+        unique_together = (('user', 'strava_id'),)
+        indexes = [
+            models.Index(fields=['user', 'start_date']),
+        ]
+
+    @classmethod
+    def from_strava(cls, user, activity):
+        """Build an (unsaved) Activity from an activity returned by get_strava_activities"""
+        return cls(
+            user=user,
+            platform=activity.get('platform'),
+            strava_id=activity.get('strava_id'),
+            distance=activity.get('distance'),
+            moving_time=activity.get('moving_time'),
+            elevation_gain=activity.get('elevation_gain'),
+            type=activity.get('type') or '',
+            start_date=_parse_date(activity.get('start_date')),
+            start_date_local=_parse_date(activity.get('start_date_local')),
+            average_heartrate=activity.get('average_heartrate'),
+            average_cadence=activity.get('average_cadence'),
+        )
+
+
+class PlayManager(models.Manager):
+
+    def ingest(self, user, plays):
+        """Store plays received from Spotify for a user, skipping the ones already stored
+
+        Returns the number of plays created
+        """
+        return _create_missing_rows(self._create_missing, user, plays)
+
+    def _create_missing(self, user, plays):
+        received = {}
+        for play in plays:
+            played_at = _parse_date(play.get('played_at'))
+            if played_at is not None and play.get('track_id'):
+                received.setdefault(played_at, play)
+        stored = set(
+            self.filter(user=user, played_at__in=list(received)).values_list('played_at', flat=True)
+        )
+        new_plays = [
+            self.model(
+                user=user,
+                track_id=play.get('track_id'),
+                played_at=played_at,
+                duration_ms=play.get('duration_ms'),
+            )
+            for played_at, play in received.items()
+            if played_at not in stored
+        ]
+        self.bulk_create(new_plays)
+        return len(new_plays)
+
+
+class Play(models.Model):
+    """A track played by a user on Spotify"""
+    user_model = auth.get_user_model()
+
+    user = models.ForeignKey(user_model, on_delete=models.CASCADE)
+    track_id = models.CharField(max_length=22)
+    played_at = models.DateTimeField()
+    duration_ms = models.PositiveIntegerField(null=True, blank=True)
+
+    objects = PlayManager()
+
+    class Meta:
+        unique_together = (('user', 'played_at'),)
+
+
+class TrackManager(models.Manager):
+
+    def store(self, tracks_features):
+        """Store the audio features of tracks received from Spotify, skipping the tracks already stored
+
+        Returns the Tracks of every track received
+        """
+        received = {features.get('track_id'): features for features in tracks_features}
+        _create_missing_rows(self._create_missing, received)
+        return list(self.filter(track_id__in=list(received)))
+
+    def _create_missing(self, received):
+        stored = set(self.filter(track_id__in=list(received)).values_list('track_id', flat=True))
+        self.bulk_create([
+            self.model(
+                track_id=track_id,
+                tempo=features.get('tempo'),
+                energy=features.get('energy'),
+                danceability=features.get('danceability'),
+                valence=features.get('valence'),
+            )
+            for track_id, features in received.items()
+            if track_id not in stored
+        ])
+
+
+class Track(models.Model):
+    """Audio features of a Spotify track, shared by all users as they never change
+
+    Features are None for tracks Spotify has no audio features for.
+    """
+    track_id = models.CharField(max_length=22, primary_key=True)
+    tempo = models.FloatField(null=True, blank=True)
+    energy = models.FloatField(null=True, blank=True)
+    danceability = models.FloatField(null=True, blank=True)
+    valence = models.FloatField(null=True, blank=True)
+
+    objects = TrackManager()
+
+
+class SyncJobManager(models.Manager):
+
+    def enqueue(self, user):
+        """Queue a sync of the user activities, unless one is waiting, running or finished recently
+
+        Each user has a single job row, queued again when it is run once more. The row is
+        switched back to pending with a conditional UPDATE, so concurrent requests queue it once.
+        """
+        job, created = self.get_or_create(user=user)
+        if created:
+            return job
+        now = timezone.now()
+        requeued = self.filter(
+            Q(finished_at__isnull=True) | Q(finished_at__lte=now - SYNC_JOB_MIN_INTERVAL),
+            pk=job.pk,
+            status__in=(SyncJob.DONE, SyncJob.FAILED),
+        ).update(
+            status=SyncJob.PENDING,
+            attempts=0,
+            run_after=now,
+            last_error='',
+            finished_at=None,
+        )
+        if requeued:
+            job.refresh_from_db()
+        return job
+
+    def claim(self, worker):
+        """Mark the next job due as running for a worker and return it (None if no job is due)
+
+        Jobs are claimed with a conditional UPDATE, so when several workers race for the same
+        job only one of them changes the row. Jobs left running by a dead worker are claimed
+        again once their lock times out.
+        """
+        now = timezone.now()
+        due = self.filter(
+            Q(status=SyncJob.PENDING, run_after__lte=now) |
+            Q(status=SyncJob.RUNNING, locked_at__lt=now - SYNC_JOB_LOCK_TIMEOUT)
+        ).order_by('run_after', 'pk').values_list('pk', 'status', 'locked_at')[:10]
+        for pk, status, locked_at in due:
+            claimed = self.filter(pk=pk, status=status, locked_at=locked_at).update(
+                status=SyncJob.RUNNING,
+                locked_by=worker,
+                locked_at=now,
+                attempts=F('attempts') + 1,
+            )
+            if claimed:
+                return self.get(pk=pk)
+        return None
+
+
+class SyncJob(models.Model):
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = (
+        (PENDING, 'Pending'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    )
+
+    user_model = auth.get_user_model()
+
+    user = models.OneToOneField(user_model, on_delete=models.CASCADE)
+    status = models.CharField(max_length=7, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.IntegerField(default=0)
+    run_after = models.DateTimeField(default=timezone.now)
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    objects = SyncJobManager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'run_after']),
+        ]
+
+    def complete(self):
+        self.status = SyncJob.DONE
+        self.locked_by = ''
+        self.locked_at = None
+        self.finished_at = timezone.now()
+        self.save(update_fields=['status', 'locked_by', 'locked_at', 'finished_at'])
+
+    def defer(self, until):
+        """Put the job back in the queue until a time, without counting the attempt"""
+        self.status = SyncJob.PENDING
+        self.attempts -= 1
+        self.run_after = until
+        self.locked_by = ''
+        self.locked_at = None
+        self.save(update_fields=['status', 'attempts', 'run_after', 'locked_by', 'locked_at'])
+
+    def retry_later(self, error):
+        """Put the job back in the queue with exponential backoff, or fail it after too many attempts"""
+        self.last_error = str(error)
+        self.locked_by = ''
+        self.locked_at = None
+        if self.attempts >= SYNC_JOB_MAX_ATTEMPTS:
+            self.status = SyncJob.FAILED
+            self.finished_at = timezone.now()
+        else:
+            self.status = SyncJob.PENDING
+            backoff = min(SYNC_JOB_BACKOFF * 2 ** (self.attempts - 1), SYNC_JOB_MAX_BACKOFF)
+            self.run_after = timezone.now() + backoff
+        self.save(update_fields=['status', 'run_after', 'locked_by', 'locked_at', 'last_error', 'finished_at'])
+
+
+def _parse_date(value):
+    if value is None:
+        return None
+    return parse_datetime(value)
+
+
+def _create_missing_rows(create_missing, *args):
+    """Call `create_missing`, which stores the rows not stored yet, and return what it returns
+
+    When a concurrent sync stored some of the same rows between the lookup and the insert,
+    the insert is rolled back and done again, skipping those rows as well.
+    """
+    try:
+        with transaction.atomic():
+            return create_missing(*args)
+    except IntegrityError:
+        return create_missing(*args)
@@ -0,0 +1,11 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .models import Key
+from .summary import invalidate_activity_summary
+
+@receiver(post_save, sender=Key)
+@receiver(post_delete, sender=Key)
+def invalidate_strava_key_summary(sender, instance=None, **kwargs):
+    if instance.service == Key.STRAVA:
+        invalidate_activity_summary(instance)
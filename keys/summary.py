@@ -0,0 +1,45 @@
+""" Summary of the activities stored for a user, cached per user and sync """
+from django.conf import settings
+from django.core.cache import caches
+
+from .models import Activity
+
+
+def activity_summary_cache():
+    return caches[settings.ACTIVITY_SUMMARY_CACHE]
+
+
+def activity_summary_cache_key(key):
+    """Return the cache key of the summary for the user of a Strava Key, at its last sync"""
+    marker = "never"
+    if key.last_activity_date is not None:
+        marker = int(key.last_activity_date.timestamp())
+    return f"activity-summary:{key.user_id}:{marker}"
+
+
+def get_activity_summary(key):
+    """Return the summary of the activities of the user of a Strava Key, None if there are none
+
+    Activities received without a start date or a distance are left out.
+    """
+    cache = activity_summary_cache()
+    cache_key = activity_summary_cache_key(key)
+    summary = cache.get(cache_key)
+    if summary is None:
+        last_activity = (
+            Activity.objects.filter(user_id=key.user_id)
+            .exclude(start_date=None)
+            .exclude(distance=None)
+            .order_by("-start_date")
+            .only("distance")
+            .first()
+        )
+        if last_activity is None:
+            return None
+        summary = {"last_activity_distance": last_activity.distance / 1000}
+        cache.set(cache_key, summary, settings.ACTIVITY_SUMMARY_CACHE_TTL)
+    return summary
+
+
+def invalidate_activity_summary(key):
+    activity_summary_cache().delete(activity_summary_cache_key(key))
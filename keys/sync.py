@@ -0,0 +1,102 @@
+""" Synchronisation of activities from services linked with a Key """
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import Activity, Play
+from .summary import invalidate_activity_summary
+from .tokens import get_spotify_token
+from utils.strava_utils import iter_strava_activity_pages, StravaRequestError
+from utils.async_strava_utils import get_strava_activities_concurrently
+from utils.spotify_utils import iter_spotify_recently_played_pages, SpotifyRequestError
+
+
+def sync_strava_activities(key, raise_errors=False):
+    """Store the activities started after the Key high-water mark and move the mark forward
+
+    Pages are stored as they are received, so the history is never held in memory. The mark
+    only moves once every page was received: without a mark Strava sends the newest first.
+    Returns the number of new activities stored or None if Strava answered with an error,
+    with `raise_errors` the StravaRequestError is raised instead.
+    """
+    after = None
+    if key.last_activity_date is not None:
+        after = int(key.last_activity_date.timestamp())
+
+    try:
+        return _store_strava_pages(key, iter_strava_activity_pages(key.token, after=after))
+    except StravaRequestError:
+        if raise_errors:
+            raise
+        return None
+
+
+def backfill_strava_activities(key, raise_errors=False):
+    """Store the whole activity history of a Key, requesting several pages at the same time
+
+    Returns the number of new activities stored or None if Strava answered with an error,
+    with `raise_errors` the StravaRequestError is raised instead.
+    """
+    activities = get_strava_activities_concurrently(key.token, key.strava_id, raise_errors=raise_errors)
+    if activities is None:
+        return None
+    return _store_strava_pages(key, [activities])
+
+
+def _store_strava_pages(key, pages):
+    """Store pages of activities, then move the Key high-water mark to the latest start date received"""
+    created = 0
+    latest_start_date = None
+    for activities in pages:
+        created += Activity.objects.ingest(key.user, activities)
+        if activities:
+            invalidate_activity_summary(key)
+        page_latest = max(
+            (parse_datetime(activity["start_date"]) for activity in activities if activity.get("start_date")),
+            default=None,
+        )
+        if page_latest is not None and (latest_start_date is None or page_latest > latest_start_date):
+            latest_start_date = page_latest
+    if latest_start_date is not None and (
+        key.last_activity_date is None or latest_start_date > key.last_activity_date
+    ):
+        key.last_activity_date = latest_start_date
+    key.last_synced_at = timezone.now()
+    key.save(update_fields=["last_activity_date", "last_synced_at"])
+    return created
+
+
+def sync_spotify_plays(key):
+    """Store the tracks played since the Key cursor and move the cursor forward
+
+    The first sync pages back through all the plays Spotify keeps, later ones only ask for the
+    plays after the cursor. Returns the number of new plays stored or None if Spotify answered
+    with an error
+    """
+    token = get_spotify_token(key)
+    if token is None:
+        return None
+    created = 0
+    newest = key.last_play_cursor
+    try:
+        for plays in iter_spotify_recently_played_pages(token, after=key.last_play_cursor):
+            created += Play.objects.ingest(key.user, plays)
+            cursor = _play_cursor(plays)
+            if cursor is not None and (newest is None or cursor > newest):
+                newest = cursor
+    except SpotifyRequestError:
+        return None
+    if newest != key.last_play_cursor:
+        key.last_play_cursor = newest
+        key.save(update_fields=["last_play_cursor"])
+    return created
+
+
+def _play_cursor(plays):
+    """Return the cursor of the newest play, as Spotify sends it: milliseconds since the epoch
+
+    Plays without a time are left out, returns None when no play has one.
+    """
+    return max(
+        (int(parse_datetime(play["played_at"]).timestamp() * 1000) for play in plays if play.get("played_at")),
+        default=None,
+    )
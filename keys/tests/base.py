@@ -0,0 +1,18 @@
+"""Helpers shared by the keys unit tests"""
+
+def strava_activity(strava_id, start_date="2018-05-15T18:12:19Z", distance=7972.5, **fields):
+    """Build an activity as returned by get strava activities helpers, `fields` overriding the others"""
+    activity = {
+        "distance": distance,
+        "moving_time": 2909,
+        "elevation_gain": 110.0,
+        "type": "Run",
+        "strava_id": strava_id,
+        "platform": "Strava",
+        "start_date": start_date,
+        "start_date_local": start_date,
+        "average_heartrate": 151.1,
+        "average_cadence": 79.1,
+    }
+    activity.update(fields)
+    return activity
@@ -1,9 +1,19 @@
 """Tests for logs in Keys views"""
-from unittest.mock import patch, call, Mock
+from unittest.mock import patch, call
 
 from django.test import TestCase
 from django.contrib import auth
 
+from ..models import Key, Activity
+from ..summary import activity_summary_cache
+from utils.request_context import get_log_context
+
+def record_log_context(mock_logger):
+    """Helper function to keep the log context in use at each call of logger info"""
+    contexts = []
+    mock_logger.info.side_effect = lambda *args, **kwargs: contexts.append(get_log_context())
+    return contexts
+
 class StravaTokenExchangeView(TestCase):
 
     """Tests for logs in Keys.views.StravaTokenExchange view"""
@@ -23,18 +33,16 @@ class StravaTokenExchangeView(TestCase):
         """Create a user and log it in before runinng each test"""
         self.create_user_and_login("edith@mailinator.com", "epwd")
 
-    @patch("keys.views.logger.bind")
+    @patch("keys.views.logger")
     @patch("keys.views.exchange_strava_code")
     def test_calls_logger_on_success(
-        self, mock_exchange_code, mock_logger_bind
+        self, mock_exchange_code, mock_logger
     ):
         """Test keys.views.StravaTokenExchanges calls logger info"""
-        bound_logger = Mock()
-        mock_logger_bind.return_value = bound_logger
 
         mock_exchange_code.return_value = ("Token", "Strava_id")
         response = self.client.get("/keys/stravatokenexchange?state=&code=abc123")
-        info_calls = bound_logger.mock_calls
+        info_calls = mock_logger.info.mock_calls
         self.assertEqual(len(info_calls),1)
         self.assertEqual(call("Access to Strava authorised"),info_calls[0])
 
@@ -43,41 +51,36 @@ class StravaTokenExchangeView(TestCase):
     def test_binds_logged_in_user(
         self, mock_exchange_code, mock_logger
     ):
-        """Test keys.views.StravaTokenExchanges binds logged in user to logger"""
+        """Test keys.views.StravaTokenExchanges binds logged in user to the log context"""
+        contexts = record_log_context(mock_logger)
         mock_exchange_code.return_value = ("Token", "Strava_id")
         response = self.client.get("/keys/stravatokenexchange?state=&code=abc123")
-        self.assertTrue(mock_logger.bind.called)
-        user_bound = mock_logger.bind.call_args
-        self.assertEqual(call(user='edith@mailinator.com'),user_bound)
+        self.assertEqual(contexts[0]["user"], 'edith@mailinator.com')
     
-    @patch("keys.views.logger.bind")
+    @patch("keys.views.logger")
     @patch("keys.views.exchange_strava_code")
     def test_calls_logger_when_receives_none_as_token(
-        self, mock_exchange_code, mock_logger_bind
+        self, mock_exchange_code, mock_logger
     ):
         """Test keys.views.StravaTokenExchanges calls logger info when receives error token"""
-        bound_logger = Mock()
-        mock_logger_bind.return_value = bound_logger
 
         mock_exchange_code.return_value = (None, "2")
         response = self.client.get("/keys/stravatokenexchange?state=&code=abc123")
-        self.assertTrue(bound_logger.info.called)
-        message_used = bound_logger.info.call_args
+        self.assertTrue(mock_logger.info.called)
+        message_used = mock_logger.info.call_args
         self.assertEqual(call("Received Strava error in token exchange"),message_used)
 
-    @patch("keys.views.logger.bind")
+    @patch("keys.views.logger")
     @patch("keys.views.exchange_strava_code")
     def test_calls_logger_when_receives_none_as_strava_id(
-        self, mock_exchange_code, mock_logger_bind
+        self, mock_exchange_code, mock_logger
     ):
         """Test keys.views.StravaTokenExchanges calls logger when receives error token"""
-        bound_logger = Mock()
-        mock_logger_bind.return_value = bound_logger
 
         mock_exchange_code.return_value = ("2",None)
         response = self.client.get("/keys/stravatokenexchange?state=&code=abc123")
-        self.assertTrue(bound_logger.info.called)
-        message_used = bound_logger.info.call_args
+        self.assertTrue(mock_logger.info.called)
+        message_used = mock_logger.info.call_args
         self.assertEqual(call("Received Strava error in token exchange"),message_used)
 
 class ActivitySummaryView(TestCase):
@@ -95,47 +98,40 @@ class ActivitySummaryView(TestCase):
         self.client.login(username="edith@mailinator.com", password="epwd")
 
     def setUp(self):
-        """Create a user and log it in before runinng each test"""
+        """Create a user with a Strava key and log it in before runinng each test"""
+        activity_summary_cache().clear()
         self.create_user_and_login("edith@mailinator.com", "epwd")
+        Key.objects.create(
+            user=self.existing_user,
+            token="stored_token",
+            refresh_token="",
+            strava_id="10",
+            service=Key.STRAVA
+        )
     
     @patch("keys.views.logger")
-    @patch("keys.views.get_strava_activities")
-    def test_binds_logged_in_user(
-        self, mock_get_activities, mock_logger
-    ):
-        """Test keys.views.ActivitySummary binds logged in user to logger"""
+    def test_binds_logged_in_user(self, mock_logger):
+        """Test keys.views.ActivitySummary binds logged in user to the log context"""
+        contexts = record_log_context(mock_logger)
         response = self.client.get("/keys/-activity-summary")
-        self.assertTrue(mock_logger.bind.called)
-        user_bound = mock_logger.bind.call_args
-        self.assertEqual(call(user='edith@mailinator.com'),user_bound)
-
-    @patch("keys.views.logger.bind")
-    @patch("keys.views.get_strava_activities")
-    def test_calls_logger_when_receives_none_as_activities(
-            self, mock_get_activities, mock_logger_bind
-    ):
-        """Test keys.views.activitySummary calls logger info when receives error activity summary"""
-        bound_logger = Mock()
-        mock_logger_bind.return_value = bound_logger
-        mock_get_activities.return_value = None
+        self.assertEqual(contexts[0]["user"], 'edith@mailinator.com')
+
+    @patch("keys.views.logger")
+    def test_calls_logger_before_first_sync(self, mock_logger):
+        """Test keys.views.activitySummary calls logger info when activities were never synced"""
         response = self.client.get("/keys/-activity-summary")
-        info_calls = bound_logger.mock_calls
+        info_calls = mock_logger.info.mock_calls
         self.assertEqual(len(info_calls),1)
-        self.assertEqual(call("Received Strava error for activity summary"),info_calls[0])
+        self.assertEqual(call("Activity summary asked before first sync"),info_calls[0])
 
-    @patch("keys.views.logger.bind")
-    @patch("keys.views.get_strava_activities")
-    def test_calls_logger_on_success(
-        self, mock_get_activities, mock_logger_bind
-    ):
+    @patch("keys.views.logger")
+    def test_calls_logger_on_success(self, mock_logger):
         """Test keys.views.ActivitySummary calls logger info on success"""
-        bound_logger = Mock()
-        mock_logger_bind.return_value = bound_logger
-        mock_get_activities = [
-            {'platform':'Strava','distance':'7', 'average_heartrate':'150'},
-            {'platform':'Strava','distance':'17', 'average_heartrate':'155'},
-        ]
+        Activity.objects.ingest(self.existing_user, [
+            {'platform':'Strava','strava_id':1,'distance':7, 'start_date':'2018-05-15T19:12:19Z'},
+            {'platform':'Strava','strava_id':2,'distance':17, 'start_date':'2018-05-16T19:12:19Z'},
+        ])
         response = self.client.get("/keys/-activity-summary")
-        info_calls = bound_logger.mock_calls
+        info_calls = mock_logger.info.mock_calls
         self.assertEqual(len(info_calls),1)
         self.assertEqual(call("Strava activity summary received"),info_calls[0])
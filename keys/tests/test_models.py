@@ -1,8 +1,13 @@
 """Unit tests for Keys models"""
+from datetime import timedelta
+
 from django.test import TestCase
+from django.db import IntegrityError
+from django.utils import timezone
 from django.contrib import auth
 
-from ..models import Key
+from ..models import Key, Activity, Play, SyncJob, SYNC_JOB_MAX_ATTEMPTS, SYNC_JOB_MIN_INTERVAL
+from .base import strava_activity
 
 
 class KeyModelTest(TestCase):
@@ -55,3 +60,210 @@ class KeyModelTest(TestCase):
         self.assertEqual(saved_key.refresh_token, "efgh")
         self.assertEqual(saved_key.strava_id, "")
         self.assertEqual(saved_key.service, Key.SPOTIFY)
+
+
+    def test_rejects_second_key_for_same_service(self):
+        """Test keys.models.Key allows a single Key per user and service"""
+        Key.objects.create(user=self.existing_user, token="abcd", refresh_token="", strava_id="10", service=Key.STRAVA)
+        with self.assertRaises(IntegrityError):
+            Key.objects.create(user=self.existing_user, token="efgh", refresh_token="", strava_id="10", service=Key.STRAVA)
+
+    def test_for_service_returns_key_of_service(self):
+        """Test keys.models.Key.objects.for_service finds the Key of the user for the service in one query"""
+        Key.objects.create(user=self.existing_user, token="abcd", refresh_token="", strava_id="10", service=Key.STRAVA)
+        Key.objects.create(user=self.existing_user, token="efgh", refresh_token="", strava_id="", service=Key.SPOTIFY)
+        with self.assertNumQueries(1):
+            key = Key.objects.for_service(self.existing_user, Key.SPOTIFY)
+        self.assertEqual(key.token, "efgh")
+
+    def test_for_service_returns_none_without_key(self):
+        """Test keys.models.Key.objects.for_service returns None when the user has not authorised the service"""
+        self.assertIsNone(Key.objects.for_service(self.existing_user, Key.STRAVA))
+
+class ActivityModelTest(TestCase):
+
+    """Unit tests for keys Activity model"""
+
+    def setUp(self):
+        """Create a user in the database befor runinng each test"""
+        user_model = auth.get_user_model()
+        self.existing_user = user_model.objects.create_user(
+            username="edith@mailinator.com",
+            email="edith@mailinator.com",
+            password="epwd",
+        )
+
+    def test_ingest_stores_activities_received(self):
+        """Test keys.models.Activity.objects.ingest stores every field of the activities received"""
+        activity = strava_activity(1574689979, start_date_local="2018-05-15T19:12:19Z")
+        created = Activity.objects.ingest(self.existing_user, [activity])
+
+        self.assertEqual(created, 1)
+        saved_activity = Activity.objects.all()[0]
+        self.assertEqual(saved_activity.user, self.existing_user)
+        self.assertEqual(saved_activity.platform, "Strava")
+        self.assertEqual(saved_activity.strava_id, 1574689979)
+        self.assertEqual(saved_activity.distance, 7972.5)
+        self.assertEqual(saved_activity.moving_time, 2909)
+        self.assertEqual(saved_activity.elevation_gain, 110.0)
+        self.assertEqual(saved_activity.type, "Run")
+        self.assertEqual(saved_activity.start_date.isoformat(), "2018-05-15T18:12:19+00:00")
+        self.assertEqual(saved_activity.start_date_local.isoformat(), "2018-05-15T19:12:19+00:00")
+        self.assertEqual(saved_activity.average_heartrate, 151.1)
+        self.assertEqual(saved_activity.average_cadence, 79.1)
+
+    def test_ingest_skips_activities_already_stored(self):
+        """Test keys.models.Activity.objects.ingest does not duplicate activities"""
+        Activity.objects.ingest(self.existing_user, [strava_activity(1), strava_activity(2)])
+        created = Activity.objects.ingest(
+            self.existing_user,
+            [strava_activity(2), strava_activity(3), strava_activity(3)]
+        )
+
+        self.assertEqual(created, 1)
+        self.assertEqual(Activity.objects.count(), 3)
+
+    def test_ingest_same_activity_for_different_users(self):
+        """Test keys.models.Activity.objects.ingest only skips activities stored for the same user"""
+        user_model = auth.get_user_model()
+        other_user = user_model.objects.create_user(
+            username="joe@mailinator.com", email="joe@mailinator.com", password="jpwd"
+        )
+        Activity.objects.ingest(self.existing_user, [strava_activity(1)])
+        created = Activity.objects.ingest(other_user, [strava_activity(1)])
+
+        self.assertEqual(created, 1)
+
+    def test_ingest_uses_one_insert_per_batch(self):
+        """Test keys.models.Activity.objects.ingest stores activities in batches"""
+        activities = [strava_activity(strava_id) for strava_id in range(150)]
+        # Per batch: savepoint, select stored ids, bulk insert, release savepoint
+        with self.assertNumQueries(3 * 4):
+            Activity.objects.ingest(self.existing_user, activities, batch_size=50)
+        self.assertEqual(Activity.objects.count(), 150)
+
+
+class PlayModelTest(TestCase):
+
+    """Unit tests for keys Play model"""
+
+    def setUp(self):
+        """Create a user in the database befor runinng each test"""
+        user_model = auth.get_user_model()
+        self.existing_user = user_model.objects.create_user(
+            username="edith@mailinator.com",
+            email="edith@mailinator.com",
+            password="epwd",
+        )
+
+    def spotify_play(self, played_at, track_id="4iV5W9uYEdYUVa79Axb7Rh"):
+        """Helper function to build a play as returned by get spotify recently played helper"""
+        return {"track_id": track_id, "played_at": played_at, "duration_ms": 108546}
+
+    def test_ingest_stores_plays_received(self):
+        """Test keys.models.Play.objects.ingest stores every field of the plays received"""
+        created = Play.objects.ingest(self.existing_user, [self.spotify_play("2018-05-15T19:12:19.589Z")])
+
+        self.assertEqual(created, 1)
+        saved_play = Play.objects.get()
+        self.assertEqual(saved_play.user, self.existing_user)
+        self.assertEqual(saved_play.track_id, "4iV5W9uYEdYUVa79Axb7Rh")
+        self.assertEqual(saved_play.played_at.isoformat(), "2018-05-15T19:12:19.589000+00:00")
+        self.assertEqual(saved_play.duration_ms, 108546)
+
+    def test_ingest_skips_plays_already_stored(self):
+        """Test keys.models.Play.objects.ingest does not duplicate plays"""
+        Play.objects.ingest(self.existing_user, [self.spotify_play("2018-05-15T19:12:19Z")])
+        created = Play.objects.ingest(
+            self.existing_user,
+            [
+                self.spotify_play("2018-05-15T19:12:19Z"),
+                self.spotify_play("2018-05-15T19:16:02Z"),
+                self.spotify_play("2018-05-15T19:16:02Z"),
+            ]
+        )
+
+        self.assertEqual(created, 1)
+        self.assertEqual(Play.objects.count(), 2)
+
+class SyncJobModelTest(TestCase):
+
+    """Unit tests for keys.models.SyncJob"""
+
+    def setUp(self):
+        """Create a user before runinng each test"""
+        user_model = auth.get_user_model()
+        self.existing_user = user_model.objects.create_user(
+            username="edith@mailinator.com",
+            email="edith@mailinator.com",
+            password="epwd",
+        )
+
+    def test_enqueue_does_not_duplicate_pending_jobs(self):
+        """Test keys.models.SyncJob.objects.enqueue keeps a single pending job per user"""
+        first = SyncJob.objects.enqueue(self.existing_user)
+        second = SyncJob.objects.enqueue(self.existing_user)
+        self.assertEqual(first.pk, second.pk)
+        self.assertEqual(SyncJob.objects.count(), 1)
+
+    def test_enqueue_skips_running_and_recently_finished_jobs(self):
+        """Test keys.models.SyncJob.objects.enqueue does not queue a sync while one runs or just finished"""
+        SyncJob.objects.enqueue(self.existing_user)
+        job = SyncJob.objects.claim("worker-1")
+        self.assertEqual(SyncJob.objects.enqueue(self.existing_user).status, SyncJob.RUNNING)
+        job.complete()
+        self.assertEqual(SyncJob.objects.enqueue(self.existing_user).status, SyncJob.DONE)
+
+    def test_enqueue_reuses_finished_job(self):
+        """Test keys.models.SyncJob.objects.enqueue queues the finished job of the user again"""
+        SyncJob.objects.enqueue(self.existing_user)
+        job = SyncJob.objects.claim("worker-1")
+        job.complete()
+        SyncJob.objects.filter(pk=job.pk).update(finished_at=timezone.now() - SYNC_JOB_MIN_INTERVAL)
+        requeued = SyncJob.objects.enqueue(self.existing_user)
+        self.assertEqual(requeued.pk, job.pk)
+        self.assertEqual((requeued.status, requeued.attempts), (SyncJob.PENDING, 0))
+        self.assertIsNone(requeued.finished_at)
+        self.assertEqual(SyncJob.objects.count(), 1)
+
+    def test_claim_marks_job_as_running(self):
+        """Test keys.models.SyncJob.objects.claim locks the job for the worker"""
+        SyncJob.objects.enqueue(self.existing_user)
+        job = SyncJob.objects.claim("worker-1")
+        self.assertEqual(job.status, SyncJob.RUNNING)
+        self.assertEqual(job.locked_by, "worker-1")
+        self.assertEqual(job.attempts, 1)
+
+    def test_claimed_job_is_not_claimed_twice(self):
+        """Test keys.models.SyncJob.objects.claim gives a job to a single worker"""
+        SyncJob.objects.enqueue(self.existing_user)
+        SyncJob.objects.claim("worker-1")
+        self.assertIsNone(SyncJob.objects.claim("worker-2"))
+
+    def test_stale_running_job_is_claimed_again(self):
+        """Test keys.models.SyncJob.objects.claim takes over jobs left running by a dead worker"""
+        job = SyncJob.objects.enqueue(self.existing_user)
+        SyncJob.objects.claim("worker-1")
+        SyncJob.objects.filter(pk=job.pk).update(locked_at=timezone.now() - timedelta(hours=1))
+        job = SyncJob.objects.claim("worker-2")
+        self.assertEqual(job.locked_by, "worker-2")
+        self.assertEqual(job.attempts, 2)
+
+    def test_retry_later_backs_off(self):
+        """Test keys.models.SyncJob.retry_later puts the job back in the queue in the future"""
+        SyncJob.objects.enqueue(self.existing_user)
+        job = SyncJob.objects.claim("worker-1")
+        job.retry_later("Boom")
+        job.refresh_from_db()
+        self.assertEqual(job.status, SyncJob.PENDING)
+        self.assertEqual(job.last_error, "Boom")
+        self.assertGreater(job.run_after, timezone.now())
+        self.assertIsNone(SyncJob.objects.claim("worker-1"))
+
+    def test_retry_later_fails_after_max_attempts(self):
+        """Test keys.models.SyncJob.retry_later gives up after the maximum number of attempts"""
+        job = SyncJob.objects.enqueue(self.existing_user)
+        SyncJob.objects.filter(pk=job.pk).update(attempts=SYNC_JOB_MAX_ATTEMPTS)
+        job.refresh_from_db()
+        job.retry_later("Boom")
+        self.assertEqual(job.status, SyncJob.FAILED)
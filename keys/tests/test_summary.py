@@ -0,0 +1,96 @@
+"""Unit tests for the cached summary of activities"""
+from unittest.mock import patch
+
+from django.test import TestCase
+from django.contrib import auth
+
+from ..models import Key, Activity
+from ..summary import get_activity_summary, activity_summary_cache, activity_summary_cache_key
+from ..sync import sync_strava_activities
+from .base import strava_activity
+
+
+class GetActivitySummaryTest(TestCase):
+
+    """Unit tests for keys.summary.get_activity_summary"""
+
+    def setUp(self):
+        """Create a user with a Strava key and an empty cache before runinng each test"""
+        activity_summary_cache().clear()
+        user_model = auth.get_user_model()
+        self.existing_user = user_model.objects.create_user(
+            username="edith@mailinator.com",
+            email="edith@mailinator.com",
+            password="epwd",
+        )
+        self.key = Key.objects.create(
+            user=self.existing_user,
+            token="stored_token",
+            refresh_token="",
+            strava_id="10",
+            service=Key.STRAVA
+        )
+
+    def sync(self, *activities):
+        """Helper function to sync the Key with the activities received from Strava"""
+        with patch("keys.sync.iter_strava_activity_pages") as mock_iter_pages:
+            mock_iter_pages.return_value = iter([list(activities)])
+            sync_strava_activities(self.key)
+
+    def test_returns_none_without_activities(self):
+        """Test keys.summary.get_activity_summary returns None when no activities are stored"""
+        self.assertIsNone(get_activity_summary(self.key))
+
+    def test_returns_distance_of_last_activity_in_km(self):
+        """Test keys.summary.get_activity_summary summarises the last activity stored"""
+        self.sync(
+            strava_activity(1, "2018-05-14T19:12:19Z", distance=1000),
+            strava_activity(2, "2018-05-15T19:12:19Z", distance=3140),
+        )
+        self.assertEqual(get_activity_summary(self.key), {"last_activity_distance": 3.14})
+
+    def test_leaves_out_activities_without_start_date_or_distance(self):
+        """Test keys.summary.get_activity_summary summarises the last activity with a start date and a distance"""
+        self.sync(
+            strava_activity(1, "2018-05-14T19:12:19Z", distance=3140),
+            strava_activity(2, "2018-05-15T19:12:19Z", distance=None),
+        )
+        Activity.objects.create(user=self.existing_user, strava_id=3, distance=5000, start_date=None)
+        self.assertEqual(get_activity_summary(self.key), {"last_activity_distance": 3.14})
+
+    def test_returns_none_without_activities_with_distance(self):
+        """Test keys.summary.get_activity_summary returns None when no activity stored has a distance"""
+        self.sync(strava_activity(1, "2018-05-14T19:12:19Z", distance=None))
+        self.assertIsNone(get_activity_summary(self.key))
+
+    def test_repeated_summaries_do_not_query_database(self):
+        """Test keys.summary.get_activity_summary renders repeated summaries from the cache"""
+        self.sync(strava_activity(1, "2018-05-14T19:12:19Z", distance=1000))
+        get_activity_summary(self.key)
+        with self.assertNumQueries(0):
+            summary = get_activity_summary(self.key)
+        self.assertEqual(summary, {"last_activity_distance": 1})
+
+    def test_cache_key_includes_user_and_last_sync(self):
+        """Test keys.summary.activity_summary_cache_key changes with the high-water mark of the Key"""
+        before = activity_summary_cache_key(self.key)
+        self.sync(strava_activity(1, "2018-05-14T19:12:19Z", distance=1000))
+        self.assertNotEqual(activity_summary_cache_key(self.key), before)
+        self.assertIn(str(self.existing_user.pk), before)
+
+    def test_ingesting_activities_invalidates_summary(self):
+        """Test keys.summary.get_activity_summary does not use a summary older than the activities stored"""
+        self.sync(strava_activity(2, "2018-05-15T19:12:19Z", distance=1000))
+        get_activity_summary(self.key)
+        Activity.objects.filter(user=self.existing_user).update(distance=2000)
+        self.sync(strava_activity(1, "2018-05-14T19:12:19Z", distance=5000))
+        self.assertEqual(get_activity_summary(self.key), {"last_activity_distance": 2})
+
+    def test_key_change_invalidates_summary(self):
+        """Test keys.summary.get_activity_summary does not use a summary cached before the Strava Key changed"""
+        self.sync(strava_activity(1, "2018-05-15T19:12:19Z", distance=1000))
+        get_activity_summary(self.key)
+        Activity.objects.filter(user=self.existing_user).update(distance=2000)
+        self.key.token = "new_token"
+        self.key.save()
+        self.assertEqual(get_activity_summary(self.key), {"last_activity_distance": 2})
@@ -0,0 +1,255 @@
+"""Unit tests for synchronisation of activities of a Key"""
+import socket
+from datetime import timedelta
+
+import httpretty
+from unittest.mock import patch, call
+
+from django.test import TestCase
+from django.contrib import auth
+from django.utils import timezone
+
+from ..models import Key, Activity, Play
+from ..sync import backfill_strava_activities, sync_strava_activities, sync_spotify_plays
+from .base import strava_activity
+from utils.strava_utils import StravaRequestError
+from utils.spotify_utils import SpotifyRequestError, SPOTIFY_RECENTLY_PLAYED_URL
+
+
+class BackfillStravaActivitiesTest(TestCase):
+
+    """Unit tests for keys.sync.backfill_strava_activities"""
+
+    def setUp(self):
+        """Create a user with a Strava key before runinng each test"""
+        user_model = auth.get_user_model()
+        self.existing_user = user_model.objects.create_user(
+            username="edith@mailinator.com",
+            email="edith@mailinator.com",
+            password="epwd",
+        )
+        self.key = Key.objects.create(
+            user=self.existing_user,
+            token="stored_token",
+            refresh_token="",
+            strava_id="10",
+            service=Key.STRAVA
+        )
+
+    @patch("keys.sync.get_strava_activities_concurrently")
+    def test_requests_activities_with_token_and_athlete_id(self, mock_get_activities):
+        """Test keys.sync.backfill_strava_activities sends token and strava id of the Key"""
+        mock_get_activities.return_value = []
+        backfill_strava_activities(self.key)
+        self.assertEqual(mock_get_activities.call_args, call("stored_token", "10", raise_errors=False))
+
+    @patch("keys.sync.get_strava_activities_concurrently")
+    def test_stores_activities_and_moves_high_water_mark(self, mock_get_activities):
+        """Test keys.sync.backfill_strava_activities stores the history and remembers the latest date"""
+        mock_get_activities.return_value = [
+            strava_activity(1, "2018-05-14T19:12:19Z"),
+            strava_activity(2, "2018-05-15T19:12:19Z"),
+        ]
+        created = backfill_strava_activities(self.key)
+        self.key.refresh_from_db()
+        self.assertEqual(created, 2)
+        self.assertEqual(Activity.objects.filter(user=self.existing_user).count(), 2)
+        self.assertEqual(self.key.last_activity_date.isoformat(), "2018-05-15T19:12:19+00:00")
+
+    @patch("keys.sync.get_strava_activities_concurrently")
+    def test_moves_high_water_mark_past_activities_without_start_date(self, mock_get_activities):
+        """Test keys.sync.backfill_strava_activities ignores activities without start date for the high-water mark"""
+        mock_get_activities.return_value = [
+            strava_activity(1, "2018-05-14T19:12:19Z"),
+            strava_activity(2, None),
+        ]
+        created = backfill_strava_activities(self.key)
+        self.key.refresh_from_db()
+        self.assertEqual(created, 2)
+        self.assertEqual(self.key.last_activity_date.isoformat(), "2018-05-14T19:12:19+00:00")
+
+    @patch("keys.sync.get_strava_activities_concurrently")
+    def test_keeps_high_water_mark_without_start_dates(self, mock_get_activities):
+        """Test keys.sync.backfill_strava_activities stores activities without start date and leaves the high-water mark"""
+        mock_get_activities.return_value = [strava_activity(1, None)]
+        created = backfill_strava_activities(self.key)
+        self.key.refresh_from_db()
+        self.assertEqual(created, 1)
+        self.assertIsNone(self.key.last_activity_date)
+
+    @patch("keys.sync.get_strava_activities_concurrently")
+    def test_remembers_sync_of_empty_history(self, mock_get_activities):
+        """Test keys.sync.backfill_strava_activities marks the Key synced when Strava has no activities"""
+        mock_get_activities.return_value = []
+        backfill_strava_activities(self.key)
+        self.key.refresh_from_db()
+        self.assertIsNotNone(self.key.last_synced_at)
+        self.assertIsNone(self.key.last_activity_date)
+
+    @patch("keys.sync.get_strava_activities_concurrently")
+    def test_returns_none_on_error(self, mock_get_activities):
+        """Test keys.sync.backfill_strava_activities returns None when Strava answers with an error"""
+        mock_get_activities.return_value = None
+        self.assertIsNone(backfill_strava_activities(self.key))
+        self.assertEqual(Activity.objects.count(), 0)
+
+
+class SyncStravaActivitiesTest(TestCase):
+
+    """Unit tests for keys.sync.sync_strava_activities"""
+
+    def setUp(self):
+        """Create a user with a Strava key before runinng each test"""
+        user_model = auth.get_user_model()
+        self.existing_user = user_model.objects.create_user(
+            username="edith@mailinator.com",
+            email="edith@mailinator.com",
+            password="epwd",
+        )
+        self.key = Key.objects.create(
+            user=self.existing_user,
+            token="stored_token",
+            refresh_token="",
+            strava_id="10",
+            service=Key.STRAVA
+        )
+
+    @patch("keys.sync.iter_strava_activity_pages")
+    def test_stores_every_page_and_moves_high_water_mark(self, mock_iter_pages):
+        """Test keys.sync.sync_strava_activities stores pages newest first and remembers the latest date"""
+        mock_iter_pages.return_value = iter([
+            [strava_activity(3, "2018-05-16T19:12:19Z"), strava_activity(2, "2018-05-15T19:12:19Z")],
+            [strava_activity(1, "2018-05-14T19:12:19Z")],
+        ])
+        created = sync_strava_activities(self.key)
+        self.key.refresh_from_db()
+        self.assertEqual(created, 3)
+        self.assertEqual(Activity.objects.filter(user=self.existing_user).count(), 3)
+        self.assertEqual(self.key.last_activity_date.isoformat(), "2018-05-16T19:12:19+00:00")
+        self.assertEqual(mock_iter_pages.call_args, call("stored_token", after=None))
+
+    @patch("keys.sync.Activity.objects.ingest")
+    @patch("keys.sync.iter_strava_activity_pages")
+    def test_stores_each_page_as_it_is_received(self, mock_iter_pages, mock_ingest):
+        """Test keys.sync.sync_strava_activities does not keep the pages received in memory"""
+        pages = [[strava_activity(2, "2018-05-15T19:12:19Z")], [strava_activity(1, "2018-05-14T19:12:19Z")]]
+        mock_iter_pages.return_value = iter(pages)
+        mock_ingest.return_value = 1
+        sync_strava_activities(self.key)
+        self.assertEqual([args[1] for args, _ in mock_ingest.call_args_list], pages)
+
+    @patch("keys.sync.iter_strava_activity_pages")
+    def test_asks_for_activities_after_high_water_mark(self, mock_iter_pages):
+        """Test keys.sync.sync_strava_activities only asks for activities started after the Key mark"""
+        mock_iter_pages.return_value = iter([])
+        self.key.last_activity_date = timezone.now().replace(microsecond=0)
+        sync_strava_activities(self.key)
+        self.assertEqual(
+            mock_iter_pages.call_args, call("stored_token", after=int(self.key.last_activity_date.timestamp()))
+        )
+
+    @patch("keys.sync.iter_strava_activity_pages")
+    def test_keeps_high_water_mark_when_a_page_fails(self, mock_iter_pages):
+        """Test keys.sync.sync_strava_activities keeps the pages stored but not the mark when Strava fails midway"""
+        def pages(token, after=None):
+            yield [strava_activity(2, "2018-05-15T19:12:19Z")]
+            raise StravaRequestError(500)
+        mock_iter_pages.side_effect = pages
+        self.assertIsNone(sync_strava_activities(self.key))
+        self.key.refresh_from_db()
+        self.assertEqual(Activity.objects.filter(user=self.existing_user).count(), 1)
+        self.assertIsNone(self.key.last_activity_date)
+        self.assertIsNone(self.key.last_synced_at)
+
+    @patch("keys.sync.iter_strava_activity_pages")
+    def test_raises_error_when_asked(self, mock_iter_pages):
+        """Test keys.sync.sync_strava_activities raises StravaRequestError with raise_errors"""
+        mock_iter_pages.side_effect = StravaRequestError(429)
+        with self.assertRaises(StravaRequestError):
+            sync_strava_activities(self.key, raise_errors=True)
+
+
+class SyncSpotifyPlaysTest(TestCase):
+
+    """Unit tests for keys.sync.sync_spotify_plays"""
+
+    def setUp(self):
+        """Create a user with a Spotify key before runinng each test"""
+        user_model = auth.get_user_model()
+        self.existing_user = user_model.objects.create_user(
+            username="edith@mailinator.com",
+            email="edith@mailinator.com",
+            password="epwd",
+        )
+        self.key = Key.objects.create(
+            user=self.existing_user,
+            token="stored_token",
+            refresh_token="stored_refresh_token",
+            strava_id="",
+            service=Key.SPOTIFY,
+            expires_at=timezone.now() + timedelta(hours=1),
+        )
+
+    def spotify_play(self, played_at):
+        """Helper function to build a play as returned by get spotify recently played helpers"""
+        return {"track_id": "4iV5W9uYEdYUVa79Axb7Rh", "played_at": played_at, "duration_ms": 108546}
+
+    @patch("keys.sync.iter_spotify_recently_played_pages")
+    def test_stores_plays_and_moves_cursor(self, mock_iter_pages):
+        """Test keys.sync.sync_spotify_plays stores every page and remembers the newest play"""
+        mock_iter_pages.return_value = iter([
+            [self.spotify_play("2018-05-15T19:16:02.500Z"), self.spotify_play("2018-05-15T19:12:19Z")],
+            [self.spotify_play("2018-05-15T19:08:40Z")],
+        ])
+        created = sync_spotify_plays(self.key)
+        self.key.refresh_from_db()
+        self.assertEqual(created, 3)
+        self.assertEqual(Play.objects.filter(user=self.existing_user).count(), 3)
+        self.assertEqual(self.key.last_play_cursor, 1526411762500)
+        self.assertEqual(mock_iter_pages.call_args, call("stored_token", after=None))
+
+    @patch("keys.sync.iter_spotify_recently_played_pages")
+    def test_skips_plays_without_time(self, mock_iter_pages):
+        """Test keys.sync.sync_spotify_plays moves the cursor past plays with a time and skips the others"""
+        mock_iter_pages.return_value = iter([
+            [self.spotify_play(None), self.spotify_play("2018-05-15T19:12:19Z")],
+            [self.spotify_play(None)],
+        ])
+        created = sync_spotify_plays(self.key)
+        self.key.refresh_from_db()
+        self.assertEqual(created, 1)
+        self.assertEqual(self.key.last_play_cursor, 1526411539000)
+
+    @httpretty.activate
+    def test_returns_none_when_spotify_does_not_answer(self):
+        """Test keys.sync.sync_spotify_plays returns None and keeps the cursor when Spotify times out"""
+        def time_out(request, uri, response_headers):
+            raise socket.timeout("timed out")
+        httpretty.register_uri(httpretty.GET, SPOTIFY_RECENTLY_PLAYED_URL, body=time_out)
+        self.assertIsNone(sync_spotify_plays(self.key))
+        self.key.refresh_from_db()
+        self.assertIsNone(self.key.last_play_cursor)
+
+    @patch("keys.sync.iter_spotify_recently_played_pages")
+    def test_asks_for_plays_after_cursor(self, mock_iter_pages):
+        """Test keys.sync.sync_spotify_plays only asks for plays after the Key cursor"""
+        mock_iter_pages.return_value = iter([])
+        self.key.last_play_cursor = 1526411762500
+        self.assertEqual(sync_spotify_plays(self.key), 0)
+        self.assertEqual(mock_iter_pages.call_args, call("stored_token", after=1526411762500))
+
+    @patch("keys.sync.iter_spotify_recently_played_pages")
+    def test_returns_none_on_error(self, mock_iter_pages):
+        """Test keys.sync.sync_spotify_plays returns None and keeps the cursor when Spotify answers with an error"""
+        mock_iter_pages.side_effect = SpotifyRequestError(401)
+        self.assertIsNone(sync_spotify_plays(self.key))
+        self.key.refresh_from_db()
+        self.assertIsNone(self.key.last_play_cursor)
+
+    @patch("keys.sync.get_spotify_token")
+    @patch("keys.sync.iter_spotify_recently_played_pages")
+    def test_returns_none_when_token_can_not_be_renewed(self, mock_iter_pages, mock_get_token):
+        """Test keys.sync.sync_spotify_plays does not ask for plays without a valid token"""
+        mock_get_token.return_value = None
+        self.assertIsNone(sync_spotify_plays(self.key))
+        self.assertFalse(mock_iter_pages.called)
@@ -0,0 +1,195 @@
+"""Unit tests for the renewal of access tokens"""
+import socket
+import threading
+from datetime import timedelta
+from unittest.mock import patch
+
+import httpretty
+from django.test import TestCase
+from django.contrib import auth
+from django.utils import timezone
+
+from ..models import Key
+from ..tokens import SingleFlight, get_spotify_token, _renew_spotify_token
+from utils.spotify_utils import SPOTIFY_CODE_EXCHANGE_URL
+
+
+class SingleFlightTest(TestCase):
+
+    """Unit tests for keys.tokens.SingleFlight"""
+
+    def test_concurrent_callers_share_one_call(self):
+        """Test keys.tokens.SingleFlight runs the function once for callers arriving while it runs"""
+        flight = SingleFlight()
+        started, release = threading.Event(), threading.Event()
+        calls, results = [], []
+
+        def renew():
+            calls.append(1)
+            started.set()
+            release.wait(5)
+            return "new token"
+
+        leader = threading.Thread(target=lambda: results.append(flight.do(1, renew)))
+        leader.start()
+        started.wait(5)
+        followers = [threading.Thread(target=lambda: results.append(flight.do(1, renew))) for _ in range(3)]
+        for follower in followers:
+            follower.start()
+        release.set()
+        for thread in [leader] + followers:
+            thread.join(5)
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, ["new token"] * 4)
+
+    def test_calls_again_once_call_is_done(self):
+        """Test keys.tokens.SingleFlight only shares calls that are running"""
+        flight = SingleFlight()
+        self.assertEqual(flight.do(1, lambda: 1), 1)
+        self.assertEqual(flight.do(1, lambda: 2), 2)
+
+    def test_raises_error_of_call(self):
+        """Test keys.tokens.SingleFlight raises the error of the function and forgets the call"""
+        flight = SingleFlight()
+        with self.assertRaises(ValueError):
+            flight.do(1, lambda: int("not a number"))
+        self.assertEqual(flight.do(1, lambda: 3), 3)
+
+
+class GetSpotifyTokenTest(TestCase):
+
+    """Unit tests for keys.tokens.get_spotify_token"""
+
+    def setUp(self):
+        """Create a user with a Spotify key before runinng each test"""
+        user_model = auth.get_user_model()
+        self.existing_user = user_model.objects.create_user(
+            username="edith@mailinator.com",
+            email="edith@mailinator.com",
+            password="epwd",
+        )
+        self.key = Key.objects.create(
+            user=self.existing_user,
+            token="stored_token",
+            refresh_token="stored_refresh_token",
+            strava_id="",
+            service=Key.SPOTIFY,
+            expires_at=timezone.now() + timedelta(minutes=2),
+        )
+
+    @patch("keys.tokens.refresh_spotify_token")
+    def test_returns_stored_token_while_it_lasts(self, mock_refresh):
+        """Test keys.tokens.get_spotify_token does not renew tokens far from expiring"""
+        Key.objects.filter(pk=self.key.pk).update(expires_at=timezone.now() + timedelta(minutes=30))
+        self.key.refresh_from_db()
+        self.assertEqual(get_spotify_token(self.key), "stored_token")
+        self.assertFalse(mock_refresh.called)
+
+    @patch("keys.tokens.refresh_spotify_token")
+    def test_renews_token_about_to_expire(self, mock_refresh):
+        """Test keys.tokens.get_spotify_token stores the token received and when it expires"""
+        mock_refresh.return_value = ("new_token", None, 3600)
+        self.assertEqual(get_spotify_token(self.key), "new_token")
+        mock_refresh.assert_called_once_with("stored_refresh_token")
+        self.key.refresh_from_db()
+        self.assertEqual(self.key.token, "new_token")
+        self.assertEqual(self.key.refresh_token, "stored_refresh_token")
+        self.assertGreater(self.key.expires_at, timezone.now() + timedelta(minutes=59))
+
+    @patch("keys.tokens.refresh_spotify_token")
+    def test_stores_refresh_token_received(self, mock_refresh):
+        """Test keys.tokens.get_spotify_token replaces the refresh token when Spotify sends a new one"""
+        mock_refresh.return_value = ("new_token", "new_refresh_token", 3600)
+        get_spotify_token(self.key)
+        self.key.refresh_from_db()
+        self.assertEqual(self.key.refresh_token, "new_refresh_token")
+
+    @patch("keys.tokens.refresh_spotify_token")
+    def test_uses_token_renewed_by_another_process(self, mock_refresh):
+        """Test keys.tokens.get_spotify_token does not renew a token renewed since the Key was read"""
+        Key.objects.filter(pk=self.key.pk).update(
+            token="renewed_token", expires_at=timezone.now() + timedelta(hours=1)
+        )
+        self.assertEqual(get_spotify_token(self.key), "renewed_token")
+        self.assertFalse(mock_refresh.called)
+
+    @patch("keys.tokens.refresh_spotify_token")
+    def test_releases_renewal_once_token_is_stored(self, mock_refresh):
+        """Test keys.tokens.get_spotify_token releases the renewal it claimed once the token is stored"""
+        mock_refresh.return_value = ("new_token", None, 3600)
+        get_spotify_token(self.key)
+        self.key.refresh_from_db()
+        self.assertIsNone(self.key.refreshing_until)
+
+    @patch("keys.tokens.time.sleep")
+    @patch("keys.tokens.refresh_spotify_token")
+    def test_only_one_process_renews_token_at_a_time(self, mock_refresh, mock_sleep):
+        """Test keys.tokens.get_spotify_token waits instead of renewing when another process renews the token"""
+        class Waiting(Exception):
+            pass
+        mock_sleep.side_effect = Waiting
+        other_process_results = []
+
+        def renew(refresh_token):
+            # Another process finds the token stale while this one renews it
+            other_process_key = Key.objects.get(pk=self.key.pk)
+            with self.assertRaises(Waiting):
+                _renew_spotify_token(other_process_key.pk)
+            other_process_results.append("waited")
+            return ("new_token", None, 3600)
+        mock_refresh.side_effect = renew
+
+        self.assertEqual(get_spotify_token(self.key), "new_token")
+        self.assertEqual(mock_refresh.call_count, 1)
+        self.assertEqual(other_process_results, ["waited"])
+
+    @patch("keys.tokens.time.sleep")
+    @patch("keys.tokens.refresh_spotify_token")
+    def test_uses_token_stored_by_process_renewing_it(self, mock_refresh, mock_sleep):
+        """Test keys.tokens.get_spotify_token uses the token stored by the process that holds the renewal"""
+        Key.objects.filter(pk=self.key.pk).update(refreshing_until=timezone.now() + timedelta(seconds=30))
+        def other_process_stores_token(seconds):
+            Key.objects.filter(pk=self.key.pk).update(
+                token="other_process_token", expires_at=timezone.now() + timedelta(hours=1), refreshing_until=None
+            )
+        mock_sleep.side_effect = other_process_stores_token
+        self.assertEqual(get_spotify_token(self.key), "other_process_token")
+        self.assertFalse(mock_refresh.called)
+
+    @patch("keys.tokens.time.sleep")
+    @patch("keys.tokens.refresh_spotify_token")
+    def test_returns_none_when_process_renewing_token_fails(self, mock_refresh, mock_sleep):
+        """Test keys.tokens.get_spotify_token returns None when the process that held the renewal released it without a token"""
+        Key.objects.filter(pk=self.key.pk).update(refreshing_until=timezone.now() + timedelta(seconds=30))
+        def other_process_fails(seconds):
+            Key.objects.filter(pk=self.key.pk).update(refreshing_until=None)
+        mock_sleep.side_effect = other_process_fails
+        self.assertIsNone(get_spotify_token(self.key))
+        self.assertFalse(mock_refresh.called)
+
+    @patch("keys.tokens.refresh_spotify_token")
+    def test_renews_token_when_renewal_lease_expired(self, mock_refresh):
+        """Test keys.tokens.get_spotify_token renews the token when the process holding the renewal went away"""
+        Key.objects.filter(pk=self.key.pk).update(refreshing_until=timezone.now() - timedelta(seconds=1))
+        mock_refresh.return_value = ("new_token", None, 3600)
+        self.assertEqual(get_spotify_token(self.key), "new_token")
+
+    @patch("keys.tokens.refresh_spotify_token")
+    def test_returns_none_when_spotify_refuses(self, mock_refresh):
+        """Test keys.tokens.get_spotify_token returns None and keeps the Key when the token can not be renewed"""
+        mock_refresh.return_value = (None, None, None)
+        self.assertIsNone(get_spotify_token(self.key))
+        self.key.refresh_from_db()
+        self.assertEqual(self.key.token, "stored_token")
+        self.assertIsNone(self.key.refreshing_until)
+
+    @httpretty.activate
+    def test_returns_none_when_spotify_does_not_answer(self):
+        """Test keys.tokens.get_spotify_token returns None and keeps the Key when renewing the token times out"""
+        def time_out(request, uri, response_headers):
+            raise socket.timeout("timed out")
+        httpretty.register_uri(httpretty.POST, SPOTIFY_CODE_EXCHANGE_URL, body=time_out)
+        self.assertIsNone(get_spotify_token(self.key))
+        self.key.refresh_from_db()
+        self.assertEqual(self.key.token, "stored_token")
@@ -0,0 +1,46 @@
+"""Unit tests for the audio features of Spotify tracks"""
+from unittest.mock import patch
+
+from django.test import TestCase
+
+from ..models import Track
+from ..tracks import get_tracks
+
+
+def spotify_features(track_id, tempo=170.1):
+    """Helper function to build audio features as returned by get spotify audio features helpers"""
+    return {"track_id": track_id, "tempo": tempo, "energy": 0.8, "danceability": 0.5, "valence": 0.3}
+
+
+class GetTracksTest(TestCase):
+
+    """Unit tests for keys.tracks.get_tracks"""
+
+    @patch("keys.tracks.get_spotify_audio_features_concurrently")
+    def test_stores_features_of_tracks_received(self, mock_get_features):
+        """Test keys.tracks.get_tracks stores the audio features received from Spotify"""
+        mock_get_features.return_value = [spotify_features("4iV5W9uYEdYUVa79Axb7Rh"), spotify_features("1301WleyT98MSxVHPZCA6M", None)]
+        tracks = get_tracks("token", ["4iV5W9uYEdYUVa79Axb7Rh", "1301WleyT98MSxVHPZCA6M"])
+        self.assertEqual(tracks["4iV5W9uYEdYUVa79Axb7Rh"].tempo, 170.1)
+        self.assertEqual(tracks["4iV5W9uYEdYUVa79Axb7Rh"].energy, 0.8)
+        self.assertIsNone(tracks["1301WleyT98MSxVHPZCA6M"].tempo)
+        self.assertEqual(Track.objects.count(), 2)
+
+    @patch("keys.tracks.get_spotify_audio_features_concurrently")
+    def test_only_requests_tracks_not_stored(self, mock_get_features):
+        """Test keys.tracks.get_tracks requests each track from Spotify only once"""
+        Track.objects.create(track_id="4iV5W9uYEdYUVa79Axb7Rh", tempo=170.1)
+        mock_get_features.return_value = [spotify_features("1301WleyT98MSxVHPZCA6M")]
+        tracks = get_tracks("token", ["4iV5W9uYEdYUVa79Axb7Rh", "1301WleyT98MSxVHPZCA6M", "1301WleyT98MSxVHPZCA6M"])
+        mock_get_features.assert_called_once_with("token", ["1301WleyT98MSxVHPZCA6M"])
+        self.assertEqual(sorted(tracks), ["1301WleyT98MSxVHPZCA6M", "4iV5W9uYEdYUVa79Axb7Rh"])
+
+        get_tracks("token", ["4iV5W9uYEdYUVa79Axb7Rh", "1301WleyT98MSxVHPZCA6M"])
+        self.assertEqual(mock_get_features.call_count, 1)
+
+    @patch("keys.tracks.get_spotify_audio_features_concurrently")
+    def test_returns_none_on_error(self, mock_get_features):
+        """Test keys.tracks.get_tracks returns None when Spotify answers with an error"""
+        mock_get_features.return_value = None
+        self.assertIsNone(get_tracks("token", ["4iV5W9uYEdYUVa79Axb7Rh"]))
+        self.assertEqual(Track.objects.count(), 0)
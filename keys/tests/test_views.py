@@ -1,14 +1,21 @@
 """Unit Tests for Keys views"""
+import socket
+import httpretty
+from datetime import timedelta
 from unittest.mock import patch, call
 
 from django.test import TestCase
+from django.utils import timezone
 from django.utils.html import escape
 from django.contrib import auth
 
-from ..models import Key
+from ..models import Key, Activity, SyncJob
 from ..forms import HeroForm
+from ..summary import activity_summary_cache
+from .base import strava_activity
 
-from utils.strava_utils import STRAVA_AUTH_ERROR
+from utils.strava_utils import STRAVA_AUTH_ERROR, STRAVA_SYNC_IN_PROGRESS, STRAVA_NO_ACTIVITIES
+from utils.strava_utils import STRAVA_CODE_EXCHANGE_URL
 from utils.spotify_utils import SPOTIFY_AUTH_ERROR
 from accounts.forms import LoginForm, ChangePasswordForm
 
@@ -91,6 +98,16 @@ class StravaTokenExchangeView(TestCase):
         response = self.client.get("/keys/stravatokenexchange?state=&code=abc123")
         self.assertContains(response, expected_error)
 
+    @httpretty.activate
+    def test_shows_error_message_when_strava_does_not_answer(self):
+        """Test keys.views.strava_token_exchange displays error when the code exchange times out"""
+        def time_out(request, uri, response_headers):
+            raise socket.timeout("timed out")
+        httpretty.register_uri(httpretty.POST, STRAVA_CODE_EXCHANGE_URL, body=time_out)
+        response = self.client.get("/keys/stravatokenexchange?state=&code=abc123")
+        self.assertContains(response, escape(STRAVA_AUTH_ERROR))
+        self.assertEqual(Key.objects.count(), 0)
+
     @patch("keys.views.exchange_strava_code")
     def test_stores_token_and_strava_id_in_database(
         self, mock_exchange_code
@@ -105,6 +122,18 @@ class StravaTokenExchangeView(TestCase):
         self.assertEqual(Key.objects.all()[0].token, "Token")
         self.assertEqual(Key.objects.all()[0].strava_id, "Strava_id")
 
+    @patch("keys.views.exchange_strava_code")
+    def test_replaces_key_when_authorised_again(
+        self, mock_exchange_code
+    ):
+        """Test keys.views.strava_token_exchange keeps a single Strava key when the user authorises again"""
+        mock_exchange_code.return_value = ("Token", "Strava_id")
+        self.client.get("/keys/stravatokenexchange?state=&code=abc123")
+        mock_exchange_code.return_value = ("New token", "Strava_id")
+        self.client.get("/keys/stravatokenexchange?state=&code=abc123")
+        self.assertEqual(Key.objects.count(), 1)
+        self.assertEqual(Key.objects.all()[0].token, "New token")
+
     @patch("keys.views.exchange_strava_code")
     def test_links_token_and_stravaid_to_logged_in_user(
         self, mock_exchange_code
@@ -118,6 +147,14 @@ class StravaTokenExchangeView(TestCase):
         self.assertEqual(stored_key.token, "Token")
         self.assertEqual(stored_key.strava_id, "Strava_id")
 
+    @patch("keys.views.exchange_strava_code")
+    def test_queues_sync_of_activities(self, mock_exchange_code):
+        """Test keys.views.strava_token_exchange queues the first sync of activities for the sync worker"""
+        mock_exchange_code.return_value = ("Token", "Strava_id")
+        self.client.get("/keys/stravatokenexchange?state=&code=abc123")
+        job = SyncJob.objects.get(user=self.existing_user)
+        self.assertEqual(job.status, SyncJob.PENDING)
+
     @patch("keys.views.exchange_strava_code")
     def test_redirects_to_activity_summary_on_success(
         self, mock_exchange_code
@@ -145,6 +182,7 @@ class ActivitySummaryView(TestCase):
 
     def setUp(self):
         """Create a user in the database, a key and log it in before runinng each test"""
+        activity_summary_cache().clear()
         self.create_user_and_login("edith@mailinator.com", "epwd")
         key = Key(
             user=self.existing_user, 
@@ -155,67 +193,72 @@ class ActivitySummaryView(TestCase):
         )
         key.save() 
 
-    @patch("keys.views.get_strava_activities")
-    def test_calls_get_strava_activities_with_token_argument(
-        self, mock_get_activities
-    ):
-        """Test keys.views.activity_summary sends token received to get strava activities helper after succesful exchange"""
+    def store_activities(self, *activities):
+        """Helper function to store activities as the sync worker does"""
+        Activity.objects.ingest(self.existing_user, activities)
+        Key.objects.filter(user=self.existing_user).update(
+            last_activity_date=timezone.now(), last_synced_at=timezone.now()
+        )
+
+    @patch("keys.sync.get_strava_activities_concurrently")
+    @patch("keys.sync.iter_strava_activity_pages")
+    def test_does_not_call_strava(self, mock_get_activities, mock_get_activities_concurrently):
+        """Test keys.views.activity_summary leaves requests to Strava to the sync worker"""
+        self.client.get("/keys/-activity-summary")
+        self.store_activities(strava_activity(1574689979, "2018-05-15T19:12:19Z", distance=1000))
+        self.client.get("/keys/-activity-summary")
+        self.assertFalse(mock_get_activities.called)
+        self.assertFalse(mock_get_activities_concurrently.called)
+
+    def test_shows_sync_in_progress_before_first_sync(self):
+        """Test keys.views.activity_summary tells the user activities are on their way before the first sync"""
         response = self.client.get("/keys/-activity-summary")
-        used_args = mock_get_activities.call_args
-        self.assertEqual(used_args, call("stored_token"))
-    
-    @patch("keys.views.get_strava_activities")
-    def test_shows_km_from_last_activity_on_success(
-        self, mock_get_activities
-    ):
-        """Test keys.views.activity_summary renders distance from last run"""
+        self.assertTemplateUsed(response, "home.html")
+        self.assertContains(response, escape(STRAVA_SYNC_IN_PROGRESS))
+
+    def test_shows_no_activities_once_synced_without_activities(self):
+        """Test keys.views.activity_summary tells the user Strava has no activities after a sync found none"""
+        Key.objects.filter(user=self.existing_user).update(last_synced_at=timezone.now())
+        response = self.client.get("/keys/-activity-summary")
+        self.assertContains(response, escape(STRAVA_NO_ACTIVITIES))
+
+    def test_queues_sync_of_new_activities(self):
+        """Test keys.views.activity_summary queues a single background sync for the logged in user"""
+        self.client.get("/keys/-activity-summary")
+        self.client.get("/keys/-activity-summary")
+        self.client.get("/keys/-activity-summary")
+        jobs = SyncJob.objects.filter(user=self.existing_user, status=SyncJob.PENDING)
+        self.assertEqual(jobs.count(), 1)
+
+    def test_shows_km_from_last_activity_on_success(self):
+        """Test keys.views.activity_summary renders distance from last run stored"""
         expected_km_number = 3.14
-        mock_get_activities.return_value = [
-            {
-                "distance": expected_km_number * 1000,
-                "moving_time": 100,
-                "elevation_gain": 100,
-                "type": "Run",
-                "strava_id": 1574689979,
-                "platform": "Strava",
-                "start_date_local": "2018-05-15T19:12:19Z",
-                "average_heartrate": 151.1,
-                "average_cadence": 79.1,
-            }
-        ]
+        self.store_activities(
+            strava_activity(1, "2018-05-14T19:12:19Z", distance=1000),
+            strava_activity(2, "2018-05-15T19:12:19Z", distance=expected_km_number * 1000),
+        )
         response = self.client.get("/keys/-activity-summary")
         self.assertContains(response, expected_km_number)
-    
-    @patch("keys.views.get_strava_activities")
-    def test_uses_congratulations_template_on_success(
-        self, mock_get_activities
-    ):
+
+    def test_uses_congratulations_template_on_success(self):
         """Test keys.views.activity_summary renders right template"""
+        self.store_activities(strava_activity(1574689979, "2018-05-15T19:12:19Z", distance=1000))
         response = self.client.get("/keys/-activity-summary")
         self.assertTemplateUsed(response, "congratulations.html")
-    
-    @patch("keys.views.get_strava_activities")
-    def test_includes_change_password_form_on_succes(
-        self, mock_get_activities
-    ):
+
+    def test_includes_change_password_form_on_succes(self):
         """ Test keys.view.activity_summary includes change_password form in the context on success"""
+        self.store_activities(strava_activity(1574689979, "2018-05-15T19:12:19Z", distance=1000))
         response = self.client.get("/keys/-activity-summary")
         form_used = response.context['change_password_form']
         self.assertIsInstance(form_used, ChangePasswordForm)
-    
-    @patch("keys.views.get_strava_activities")
-    def test_renders_home_on_failure(self, mock_get_activities):
-        """Test keys.views.activity_summary renders home if receives error activity summary"""
-        mock_get_activities.return_value = None
-        response = self.client.get("/keys/-activity-summary")
-        self.assertTemplateUsed(response, "home.html")
 
-    @patch("keys.views.get_strava_activities")
-    def test_shows_message_on_failure(self, mock_get_activities):
-        """Test keys.views.activity_summary displays error if receives error activity summary"""
-        mock_get_activities.return_value = None
+    def test_shows_message_without_strava_key(self):
+        """Test keys.views.activity_summary displays error when the user has not linked Strava"""
+        Key.objects.all().delete()
         expected_error = escape(STRAVA_AUTH_ERROR)
         response = self.client.get("/keys/-activity-summary")
+        self.assertTemplateUsed(response, "home.html")
         self.assertContains(response, expected_error)
 
 class SpotifyTokenExchangeView(TestCase):
@@ -242,7 +285,7 @@ class SpotifyTokenExchangeView(TestCase):
         self, mock_exchange_code
     ):
         """Test keys.views.spotify_token_exchange calls exchange spotify code helper function"""
-        mock_exchange_code.return_value = ("token", "refresh_token")
+        mock_exchange_code.return_value = ("token", "refresh_token", 3600)
         response = self.client.get("/keys/spotifytokenexchange/?state=&code=abc123")
         self.assertTrue(mock_exchange_code.called)
 
@@ -251,7 +294,7 @@ class SpotifyTokenExchangeView(TestCase):
         self, mock_exchange_code
     ):
         """Test keys.views.spotify_token_exchange sends code received to exchange strava code helper function"""
-        mock_exchange_code.return_value = ("Token", "Refresh_token")
+        mock_exchange_code.return_value = ("Token", "Refresh_token", 3600)
         response = self.client.get("/keys/spotifytokenexchange/?state=&code=abc123")
         used_args = mock_exchange_code.call_args
         self.assertEqual(used_args, call("abc123"))
@@ -261,7 +304,7 @@ class SpotifyTokenExchangeView(TestCase):
         self, mock_exchange_code
     ):
         """Test keys.views.spotify_token_exchange displays error when receives None as token"""
-        mock_exchange_code.return_value = (None, "2")
+        mock_exchange_code.return_value = (None, "2", 3600)
         expected_error = escape(SPOTIFY_AUTH_ERROR)
         response = self.client.get("/keys/spotifytokenexchange/?state=&code=abc123")
         self.assertContains(response, expected_error)
@@ -271,7 +314,7 @@ class SpotifyTokenExchangeView(TestCase):
         self, mock_exchange_code
     ):
         """Test keys.views.spotify_token_exchange displays error when receives None as refresh_token"""
-        mock_exchange_code.return_value = ("2", None)
+        mock_exchange_code.return_value = ("2", None, 3600)
         expected_error = escape(SPOTIFY_AUTH_ERROR)
         response = self.client.get("/keys/spotifytokenexchange/?state=&code=abc123")
         self.assertContains(response, expected_error)
@@ -281,7 +324,7 @@ class SpotifyTokenExchangeView(TestCase):
         self, mock_exchange_code
     ):
         """Test keys.views.spotify_token_exchange stores token and refresh_token received"""
-        mock_exchange_code.return_value = ("Token", "Refresh token")
+        mock_exchange_code.return_value = ("Token", "Refresh token", 3600)
 
         self.assertEqual(Key.objects.count(), 0)
 
@@ -290,12 +333,30 @@ class SpotifyTokenExchangeView(TestCase):
         self.assertEqual(Key.objects.all()[0].token, "Token")
         self.assertEqual(Key.objects.all()[0].refresh_token, "Refresh token")
 
+    @patch("keys.views.exchange_spotify_code")
+    def test_stores_when_token_expires(self, mock_exchange_code):
+        """Test keys.views.spotify_token_exchange stores that the token expires in an hour"""
+        mock_exchange_code.return_value = ("Token", "Refresh token", 3600)
+
+        response = self.client.get("/keys/spotifytokenexchange/?state=&code=abc123")
+        expires_in = Key.objects.get().expires_at - timezone.now()
+        self.assertTrue(timedelta(minutes=59) < expires_in <= timedelta(hours=1))
+
+    @patch("keys.views.exchange_spotify_code")
+    def test_stores_expiry_received_with_token(self, mock_exchange_code):
+        """Test keys.views.spotify_token_exchange stores when the token expires from the lifetime Spotify sends"""
+        mock_exchange_code.return_value = ("Token", "Refresh token", 600)
+
+        response = self.client.get("/keys/spotifytokenexchange/?state=&code=abc123")
+        expires_in = Key.objects.get().expires_at - timezone.now()
+        self.assertTrue(timedelta(minutes=9) < expires_in <= timedelta(minutes=10))
+
     @patch("keys.views.exchange_spotify_code")
     def test_links_token_and_refresh_token_to_logged_in_user(
         self, mock_exchange_code
     ):
         """Test keys.views.spotify_token_exchange linkss token and refresh_token to user logged in"""
-        mock_exchange_code.return_value = ("Token", "Refresh token")
+        mock_exchange_code.return_value = ("Token", "Refresh token", 3600)
 
         response = self.client.get("/keys/spotifytokenexchange/?state=&code=abc123")
         stored_key = Key.objects.all()[0]
@@ -308,7 +369,7 @@ class SpotifyTokenExchangeView(TestCase):
         self, mock_exchange_code
     ):
         """Test keys.views.spotify_token_exchange renders right template"""
-        mock_exchange_code.return_value = ("Token", "Refresh token")
+        mock_exchange_code.return_value = ("Token", "Refresh token", 3600)
 
         response = self.client.get("/keys/spotifytokenexchange/?state=&code=abc123")
         self.assertTemplateUsed(response, "user_summary.html")
@@ -0,0 +1,138 @@
+"""Unit tests for the background worker that syncs activities"""
+from datetime import datetime, timezone
+from unittest.mock import patch
+
+from django.test import TestCase
+from django.contrib import auth
+from django.core.management import call_command
+
+from ..models import Key, SyncJob, SYNC_JOB_MAX_ATTEMPTS
+from ..worker import run_next_job
+from utils.strava_utils import StravaRequestError
+from utils.strava_rate_limit import StravaRateLimited
+
+
+class RunNextJobTest(TestCase):
+
+    """Unit tests for keys.worker.run_next_job"""
+
+    def setUp(self):
+        """Create a user with a Strava key and a queued job before runinng each test"""
+        user_model = auth.get_user_model()
+        self.existing_user = user_model.objects.create_user(
+            username="edith@mailinator.com",
+            email="edith@mailinator.com",
+            password="epwd",
+        )
+        self.key = Key.objects.create(
+            user=self.existing_user,
+            token="stored_token",
+            refresh_token="",
+            strava_id="10",
+            service=Key.STRAVA
+        )
+        self.job = SyncJob.objects.enqueue(self.existing_user)
+
+    def test_returns_false_without_jobs(self):
+        """Test keys.worker.run_next_job returns False when there is no job due"""
+        SyncJob.objects.all().delete()
+        self.assertFalse(run_next_job("worker-1"))
+
+    @patch("keys.worker.backfill_strava_activities")
+    def test_backfills_keys_never_synced(self, mock_backfill):
+        """Test keys.worker.run_next_job fetches the whole history for a Key never synced"""
+        mock_backfill.return_value = 0
+        run_next_job("worker-1")
+        self.assertEqual(mock_backfill.call_args[0][0].pk, self.key.pk)
+
+    @patch("keys.worker.sync_strava_activities")
+    def test_syncs_new_activities_of_synced_keys(self, mock_sync):
+        """Test keys.worker.run_next_job only asks for new activities once a Key was synced"""
+        Key.objects.filter(pk=self.key.pk).update(
+            last_activity_date=datetime(2018, 5, 15, tzinfo=timezone.utc)
+        )
+        mock_sync.return_value = 0
+        run_next_job("worker-1")
+        self.assertTrue(mock_sync.called)
+
+    @patch("keys.worker.backfill_strava_activities")
+    def test_marks_job_done_on_success(self, mock_backfill):
+        """Test keys.worker.run_next_job completes the job when the sync succeeds"""
+        mock_backfill.return_value = 3
+        run_next_job("worker-1")
+        self.job.refresh_from_db()
+        self.assertEqual(self.job.status, SyncJob.DONE)
+
+    @patch("keys.worker.backfill_strava_activities")
+    def test_retries_job_on_strava_error(self, mock_backfill):
+        """Test keys.worker.run_next_job puts the job back in the queue when Strava answers with an error"""
+        mock_backfill.side_effect = StravaRequestError(500)
+        run_next_job("worker-1")
+        self.job.refresh_from_db()
+        self.assertEqual(self.job.status, SyncJob.PENDING)
+        self.assertEqual(self.job.attempts, 1)
+
+    @patch("keys.worker.backfill_strava_activities")
+    def test_sync_worker_command_runs_queued_jobs(self, mock_backfill):
+        """Test sync_worker management command with --once runs the queued jobs and stops"""
+        mock_backfill.return_value = 0
+        call_command("sync_worker", "--once", "--name", "worker-1")
+        self.job.refresh_from_db()
+        self.assertEqual(self.job.status, SyncJob.DONE)
+
+    @patch("keys.worker.rate_limiter")
+    @patch("keys.worker.backfill_strava_activities")
+    def test_defers_job_when_rate_limited(self, mock_backfill, mock_limiter):
+        """Test keys.worker.run_next_job defers the job until Strava budget is back without counting the attempt"""
+        mock_backfill.side_effect = StravaRequestError(429)
+        mock_limiter.blocked_until.side_effect = [None, 1526411700]
+        run_next_job("worker-1")
+        self.job.refresh_from_db()
+        self.assertEqual(self.job.status, SyncJob.PENDING)
+        self.assertEqual(self.job.attempts, 0)
+        self.assertEqual(self.job.run_after.timestamp(), 1526411700)
+
+    @patch("keys.worker.rate_limiter")
+    @patch("keys.worker.backfill_strava_activities")
+    def test_defers_job_until_rate_limiter_retry_time(self, mock_backfill, mock_limiter):
+        """Test keys.worker.run_next_job defers the job until the time the rate limiter refused the call for"""
+        limited = StravaRateLimited(1526412600)
+        error = StravaRequestError(429)
+        error.__cause__ = limited
+        mock_backfill.side_effect = error
+        mock_limiter.blocked_until.return_value = None
+        run_next_job("worker-1")
+        self.job.refresh_from_db()
+        self.assertEqual(self.job.attempts, 0)
+        self.assertEqual(self.job.run_after.timestamp(), 1526412600)
+
+    @patch("keys.worker.rate_limiter")
+    @patch("keys.worker.backfill_strava_activities")
+    def test_counts_other_errors_while_rate_limited(self, mock_backfill, mock_limiter):
+        """Test keys.worker.run_next_job counts attempts failing with other errors even when Strava budget is spent"""
+        mock_backfill.side_effect = ValueError("Bad activity")
+        mock_limiter.blocked_until.side_effect = [None, 1526411700]
+        run_next_job("worker-1")
+        self.job.refresh_from_db()
+        self.assertEqual(self.job.status, SyncJob.PENDING)
+        self.assertEqual(self.job.attempts, 1)
+        self.assertEqual(self.job.last_error, "Bad activity")
+
+    @patch("keys.worker.rate_limiter")
+    @patch("keys.worker.backfill_strava_activities")
+    def test_fails_job_after_max_attempts_while_rate_limited(self, mock_backfill, mock_limiter):
+        """Test keys.worker.run_next_job fails a job that keeps failing with other errors while Strava budget is spent"""
+        SyncJob.objects.filter(pk=self.job.pk).update(attempts=SYNC_JOB_MAX_ATTEMPTS - 1)
+        mock_backfill.side_effect = ValueError("Bad activity")
+        mock_limiter.blocked_until.side_effect = [None, 1526411700]
+        run_next_job("worker-1")
+        self.job.refresh_from_db()
+        self.assertEqual(self.job.status, SyncJob.FAILED)
+
+    @patch("keys.worker.rate_limiter")
+    def test_does_not_claim_jobs_when_rate_limited(self, mock_limiter):
+        """Test keys.worker.run_next_job leaves jobs queued while there is no Strava budget"""
+        mock_limiter.blocked_until.return_value = 1526411700
+        self.assertFalse(run_next_job("worker-1"))
+        self.job.refresh_from_db()
+        self.assertEqual(self.job.status, SyncJob.PENDING)
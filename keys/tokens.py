@@ -0,0 +1,125 @@
+""" Access tokens of Keys, renewed with their refresh token before they expire """
+import time
+import threading
+from datetime import timedelta
+from functools import partial
+
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Key
+from utils.spotify_utils import refresh_spotify_token
+
+# Spotify access tokens last an hour, a token is renewed when it has less than the margin left
+SPOTIFY_TOKEN_LIFETIME = timedelta(hours=1)
+SPOTIFY_REFRESH_MARGIN = timedelta(minutes=5)
+# Time a process has to renew a token it claimed, after that another process may claim it
+SPOTIFY_REFRESH_LEASE = timedelta(seconds=30)
+# Seconds between two reads of a Key while another process renews its token
+SPOTIFY_REFRESH_POLL_INTERVAL = 0.2
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Runs one call per key at a time, callers arriving while it runs wait and share its result"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, function):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        try:
+            call.result = function()
+        except Exception as error:
+            call.error = error
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+
+spotify_refresh_flight = SingleFlight()
+
+
+def spotify_token_expiry(expires_in=None):
+    """Return when a Spotify access token received now expires"""
+    lifetime = SPOTIFY_TOKEN_LIFETIME if expires_in is None else timedelta(seconds=expires_in)
+    return timezone.now() + lifetime
+
+
+def _is_fresh(key):
+    return key.expires_at is not None and key.expires_at - SPOTIFY_REFRESH_MARGIN > timezone.now()
+
+
+def get_spotify_token(key):
+    """Return an access token of a Spotify Key, renewing it first when it is about to expire
+
+    Callers renewing the token of the same Key at the same time share one request to Spotify.
+    Across processes the renewal is claimed with a lease on the Key row (refreshing_until),
+    other processes wait for the token it stores. Returns None if Spotify refused to renew it.
+    """
+    if _is_fresh(key):
+        return key.token
+    renewed = spotify_refresh_flight.do(key.pk, partial(_renew_spotify_token, key.pk))
+    if renewed is None:
+        return None
+    key.token, key.refresh_token, key.expires_at = renewed.token, renewed.refresh_token, renewed.expires_at
+    return key.token
+
+
+def _renew_spotify_token(key_pk):
+    key = Key.objects.get(pk=key_pk)
+    waited = False
+    while not _is_fresh(key):
+        if waited and key.refreshing_until is None:
+            # The process that held the renewal could not renew the token
+            return None
+        now = timezone.now()
+        claimed = Key.objects.filter(
+            Q(refreshing_until=None) | Q(refreshing_until__lte=now), pk=key_pk
+        ).update(refreshing_until=now + SPOTIFY_REFRESH_LEASE)
+        if claimed:
+            return _renew_claimed_spotify_token(key)
+        waited = True
+        time.sleep(SPOTIFY_REFRESH_POLL_INTERVAL)
+        key = Key.objects.get(pk=key_pk)
+    # Renewed by another process since the Key was read
+    return key
+
+
+def _renew_claimed_spotify_token(key):
+    """Ask Spotify for a new token of a Key this process claimed the renewal of, and release it"""
+    stored = {"refreshing_until": None}
+    try:
+        token, refresh_token, expires_in = refresh_spotify_token(key.refresh_token)
+        if token is not None:
+            stored.update(
+                token=token,
+                refresh_token=refresh_token or key.refresh_token,
+                expires_at=spotify_token_expiry(expires_in),
+            )
+    finally:
+        Key.objects.filter(pk=key.pk).update(**stored)
+    if token is None:
+        return None
+    for name, value in stored.items():
+        setattr(key, name, value)
+    return key
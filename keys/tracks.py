@@ -0,0 +1,27 @@
+""" Audio features of Spotify tracks, requested once and kept in the Track table """
+from .models import Track
+from utils.async_spotify_utils import get_spotify_audio_features_concurrently
+
+# Tracks looked up per query, well below the number of parameters a query can hold
+TRACK_LOOKUP_BATCH_SIZE = 500
+
+
+def get_tracks(token, track_ids, batch_size=TRACK_LOOKUP_BATCH_SIZE):
+    """Return a dictionary of the Tracks of `track_ids` keyed by track id
+
+    Only tracks that are not stored yet are requested from Spotify, in batches sent at the
+    same time. Returns None if Spotify answered with an error.
+    """
+    track_ids = sorted(set(track_ids))
+    tracks = {}
+    for start in range(0, len(track_ids), batch_size):
+        batch = track_ids[start:start + batch_size]
+        tracks.update((track.track_id, track) for track in Track.objects.filter(track_id__in=batch))
+        missing = [track_id for track_id in batch if track_id not in tracks]
+        if not missing:
+            continue
+        features = get_spotify_audio_features_concurrently(token, missing)
+        if features is None:
+            return None
+        tracks.update((track.track_id, track) for track in Track.objects.store(features))
+    return tracks
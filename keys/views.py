@@ -9,10 +9,12 @@ from django.http import HttpResponse
 from django.contrib import messages
 
 from .forms import HeroForm
-from .models import Key
+from .models import Key, SyncJob
+from .summary import get_activity_summary
+from .tokens import spotify_token_expiry
 
-from utils.strava_utils import STRAVA_AUTH_ERROR
-from utils.strava_utils import exchange_strava_code, get_strava_activities
+from utils.strava_utils import STRAVA_AUTH_ERROR, STRAVA_SYNC_IN_PROGRESS, STRAVA_NO_ACTIVITIES
+from utils.strava_utils import exchange_strava_code
 from utils.spotify_utils import exchange_spotify_code, SPOTIFY_AUTH_ERROR
 from accounts.forms import LoginForm, ChangePasswordForm
 
@@ -27,9 +29,7 @@ def home_page(request):
 
 def strava_token_exchange(request):
     """Receives Strava authorisation code and sends request for user token"""
-    global logger
     logged_in_user = request.user
-    logger = logger.bind(user=logged_in_user.email) 
 
     code = request.GET.get("code")
     token, strava_id = exchange_strava_code(code)
@@ -39,65 +39,68 @@ def strava_token_exchange(request):
         logger.info("Received Strava error in token exchange")
         return render(request, "home.html")
 
-    new_key = Key(
+    Key.objects.update_or_create(
         user=logged_in_user,
-        token=token,
-        refresh_token="",
-        strava_id=strava_id,
-        service=Key.STRAVA
+        service=Key.STRAVA,
+        defaults={"token": token, "refresh_token": "", "strava_id": strava_id},
     )
-    new_key.save()
+    SyncJob.objects.enqueue(logged_in_user)
     logger.info("Access to Strava authorised")
     return redirect('activity_summary')
 
 def activity_summary(request):
-    """Recovers Strava token for logged in user, recover list of activites and present summary of activity"""
-    global logger
-    logged_in_user = request.user
-    logger = logger.bind(user=logged_in_user.email) 
-    token = None
-
-    keys = Key.objects.filter(user=logged_in_user) 
-    for key in keys:
-        if key.service == Key.STRAVA:
-            token = key.token
+    """Recovers Strava key for logged in user, queue a sync of new activites and present summary of stored activity
 
-    activities = get_strava_activities(token)
-    if activities:
-        logger.info("Strava activity summary received") 
-        change_password_form = ChangePasswordForm() 
-        return render(
-            request,
-            "congratulations.html",
-            {"last_activity_distance": activities[0].get("distance") / 1000,
-            "change_password_form": change_password_form,
-            },
-        )
-    else:
+    Strava is never called here, activities are received by the sync worker.
+    """
+    logged_in_user = request.user
+    strava_key = Key.objects.for_service(logged_in_user, Key.STRAVA)
+    if strava_key is None:
         messages.add_message(request, messages.ERROR, STRAVA_AUTH_ERROR)
-        logger.info("Received Strava error for activity summary")
+        logger.info("Activity summary asked without Strava key")
         return render(request, "home.html")
 
+    SyncJob.objects.enqueue(logged_in_user)
+    summary = get_activity_summary(strava_key)
+    if summary is None:
+        if strava_key.last_synced_at is None:
+            messages.add_message(request, messages.INFO, STRAVA_SYNC_IN_PROGRESS)
+            logger.info("Activity summary asked before first sync")
+        else:
+            messages.add_message(request, messages.INFO, STRAVA_NO_ACTIVITIES)
+            logger.info("Activity summary asked without activities")
+        return render(request, "home.html")
+
+    logger.info("Strava activity summary received")
+    change_password_form = ChangePasswordForm()
+    return render(
+        request,
+        "congratulations.html",
+        {"last_activity_distance": summary["last_activity_distance"],
+        "change_password_form": change_password_form,
+        },
+    )
+
 def spotify_token_exchange(request):
     """Receives Spotify authorisation code and sends request for user token"""
-    global logger
     logged_in_user = request.user
-    logger = logger.bind(user=logged_in_user.email) 
     code = request.GET.get("code")
-    token, refresh_token = exchange_spotify_code(code)
+    token, refresh_token, expires_in = exchange_spotify_code(code)
     if not token or not refresh_token:
         messages.add_message(request, messages.ERROR, SPOTIFY_AUTH_ERROR)
         logger.info("Received Spotify error in token exchange")
         return render(request, "home.html")
     
-    new_key = Key(
+    Key.objects.update_or_create(
         user=logged_in_user,
-        token=token,
-        refresh_token=refresh_token,
-        strava_id="",
-        service=Key.SPOTIFY
+        service=Key.SPOTIFY,
+        defaults={
+            "token": token,
+            "refresh_token": refresh_token,
+            "strava_id": "",
+            "expires_at": spotify_token_expiry(expires_in),
+        },
     )
-    new_key.save()
     logger.info("Access to Spotify authorised")
 
     return render(request,"user_summary.html")
@@ -0,0 +1,98 @@
+""" Background worker that runs the queued syncs of activities """
+import os
+import socket
+import time
+import logging
+from datetime import datetime, timezone
+from structlog import wrap_logger
+
+from django.utils import timezone as django_timezone
+
+from .models import Key, SyncJob, SYNC_JOB_BACKOFF
+from .sync import sync_strava_activities, backfill_strava_activities
+from utils.strava_utils import StravaRequestError
+from utils.strava_rate_limit import (
+    rate_limiter,
+    set_default_priority,
+    StravaRateLimited,
+    STRAVA_BACKGROUND,
+)
+
+SYNC_WORKER_POLL_INTERVAL = 5
+
+log = logging.getLogger(__name__)
+logger = wrap_logger(log)
+
+
+def default_worker_name():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def run_job(job):
+    """Sync the activities of the user of a job, using the Strava Key of the user
+
+    Raises StravaRequestError when Strava answers with an error.
+    """
+    strava_key = Key.objects.for_service(job.user_id, Key.STRAVA)
+    if strava_key is None:
+        return
+
+    if strava_key.last_activity_date is None:
+        backfill_strava_activities(strava_key, raise_errors=True)
+    else:
+        sync_strava_activities(strava_key, raise_errors=True)
+
+
+def _rate_limit_retry_time(error):
+    """Return when a job that failed with `error` can run again if Strava rate limited it, else None"""
+    if isinstance(error, StravaRequestError) and error.args[:1] == (429,):
+        error = error.__cause__ or error
+    elif not isinstance(error, StravaRateLimited):
+        return None
+    retry_at = getattr(error, 'retry_at', None) or rate_limiter.blocked_until()
+    if retry_at is None:
+        return django_timezone.now() + SYNC_JOB_BACKOFF
+    return datetime.fromtimestamp(retry_at, timezone.utc)
+
+
+def run_next_job(worker):
+    """Claim and run the next job due. Returns False if there was no job to run"""
+    if rate_limiter.blocked_until() is not None:
+        return False
+    job = SyncJob.objects.claim(worker)
+    if job is None:
+        return False
+
+    job_logger = logger.bind(job=job.pk, user=job.user_id, attempt=job.attempts)
+    try:
+        run_job(job)
+    except Exception as error:
+        retry_at = _rate_limit_retry_time(error)
+        if retry_at is not None:
+            job.defer(retry_at)
+            job_logger.info("Sync job deferred by Strava rate limit", run_after=job.run_after.isoformat())
+        else:
+            job.retry_later(error)
+            job_logger.warning("Sync job failed", status=job.status, error=str(error))
+    else:
+        job.complete()
+        job_logger.info("Sync job done")
+    return True
+
+
+def run_worker(worker=None, poll_interval=SYNC_WORKER_POLL_INTERVAL, once=False):
+    """Run jobs as they become due. With `once` stop when there are no jobs left
+
+    Strava calls made by the worker are background calls, they give way to the calls of logged in users
+    """
+    worker = worker or default_worker_name()
+    previous_priority = set_default_priority(STRAVA_BACKGROUND)
+    try:
+        while True:
+            ran = run_next_job(worker)
+            if not ran:
+                if once:
+                    return
+                time.sleep(poll_interval)
+    finally:
+        set_default_priority(previous_priority)
@@ -0,0 +1,47 @@
+""" Asyncio variant of the Spotify helpers
+
+Audio features are requested SPOTIFY_MAX_AUDIO_FEATURES_IDS tracks at a time, several
+batches at the same time (at most SPOTIFY_MAX_CONCURRENT_BATCHES in flight).
+"""
+import asyncio
+
+from utils.http_client import run_in_executor, run_coroutine
+from utils.spotify_utils import (
+    SPOTIFY_MAX_AUDIO_FEATURES_IDS,
+    SpotifyRequestError,
+    exchange_spotify_code as _exchange_spotify_code,
+    get_spotify_audio_features_batch as _get_spotify_audio_features_batch,
+)
+
+SPOTIFY_MAX_CONCURRENT_BATCHES = 4
+
+
+async def exchange_spotify_code(code):
+    return await run_in_executor(_exchange_spotify_code, code)
+
+async def get_spotify_audio_features_batch(token, track_ids):
+    return await run_in_executor(_get_spotify_audio_features_batch, token, track_ids)
+
+async def get_spotify_audio_features(
+    token,
+    track_ids,
+    batch_size=SPOTIFY_MAX_AUDIO_FEATURES_IDS,
+    max_concurrent_batches=SPOTIFY_MAX_CONCURRENT_BATCHES,
+):
+    """Return the audio features of the tracks in the order of `track_ids`, or None if Spotify answered with an error"""
+    semaphore = asyncio.Semaphore(max_concurrent_batches)
+
+    async def fetch_batch(batch):
+        async with semaphore:
+            return await get_spotify_audio_features_batch(token, batch)
+
+    batches = [track_ids[start:start + batch_size] for start in range(0, len(track_ids), batch_size)]
+    try:
+        results = await asyncio.gather(*(fetch_batch(batch) for batch in batches))
+    except SpotifyRequestError:
+        return None
+    return [features for result in results for features in result]
+
+def get_spotify_audio_features_concurrently(token, track_ids):
+    """Synchronous entry point to get_spotify_audio_features for code that is not running in an event loop"""
+    return run_coroutine(get_spotify_audio_features(token, list(track_ids)))
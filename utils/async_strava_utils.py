@@ -0,0 +1,71 @@
+""" Asyncio variant of the Strava helpers
+
+Once the number of activities of the athlete is known, the pages of activities are
+requested at the same time (at most STRAVA_MAX_CONCURRENT_PAGES in flight). Pages past
+that count are requested a window of STRAVA_MAX_CONCURRENT_PAGES at a time.
+"""
+import asyncio
+import math
+from operator import itemgetter
+
+from utils.http_client import run_in_executor, run_coroutine
+from utils.strava_utils import (
+    STRAVA_MAX_PER_PAGE,
+    StravaRequestError,
+    exchange_strava_code as _exchange_strava_code,
+    get_strava_activity_count as _get_strava_activity_count,
+    get_strava_activity_page as _get_strava_activity_page,
+)
+
+STRAVA_MAX_CONCURRENT_PAGES = 4
+
+
+async def exchange_strava_code(code):
+    return await run_in_executor(_exchange_strava_code, code)
+
+async def get_strava_activity_count(token, athlete_id):
+    return await run_in_executor(_get_strava_activity_count, token, athlete_id)
+
+async def get_strava_activity_page(token, page, per_page=STRAVA_MAX_PER_PAGE):
+    return await run_in_executor(_get_strava_activity_page, token, page, per_page=per_page)
+
+async def get_strava_activities(
+    token,
+    athlete_id,
+    per_page=STRAVA_MAX_PER_PAGE,
+    max_concurrent_pages=STRAVA_MAX_CONCURRENT_PAGES,
+    raise_errors=False,
+):
+    """Return all the athlete activities sorted by date
+
+    Returns None if Strava answered with an error, or raises StravaRequestError with `raise_errors`.
+    """
+    semaphore = asyncio.Semaphore(max_concurrent_pages)
+
+    async def fetch_page(page):
+        async with semaphore:
+            return await get_strava_activity_page(token, page, per_page=per_page)
+
+    try:
+        count = await get_strava_activity_count(token, athlete_id)
+        last_page = max(1, math.ceil(count / per_page))
+        pages = await asyncio.gather(*(fetch_page(page) for page in range(1, last_page + 1)))
+        # Stats only count runs, rides and swims, keep going while the last page is full
+        while len(pages[-1]) == per_page:
+            window = range(last_page + 1, last_page + 1 + max_concurrent_pages)
+            last_page = window[-1]
+            for page in await asyncio.gather(*(fetch_page(page) for page in window)):
+                pages.append(page)
+                if len(page) < per_page:
+                    break
+    except StravaRequestError:
+        if raise_errors:
+            raise
+        return None
+
+    activities = [activity for page in pages for activity in page]
+    return sorted(activities, key=itemgetter('start_date_local'))
+
+def get_strava_activities_concurrently(token, athlete_id, raise_errors=False):
+    """Synchronous entry point to get_strava_activities for code that is not running in an event loop"""
+    return run_coroutine(get_strava_activities(token, athlete_id, raise_errors=raise_errors))
@@ -0,0 +1,107 @@
+""" Shared HTTP client for the calls to Strava and Spotify
+
+Every call goes through the same requests Session, so connections to each host are kept alive
+and reused instead of paying a new TCP and TLS handshake per call.
+"""
+import time
+import asyncio
+import threading
+import contextvars
+from functools import partial
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from utils.request_context import add_request_timing
+
+CONNECT_TIMEOUT = 3.05
+READ_TIMEOUT = 10
+DEFAULT_POOL_SIZE = 4
+HOST_POOL_SIZES = {
+    'https://www.strava.com': 20,
+    'https://accounts.spotify.com': 4,
+    'https://api.spotify.com': 10,
+}
+# Only idempotent requests are retried on read errors and server errors, a POST
+# (e.g. an oAuth code exchange) is only retried when the connection could not be made
+TRANSPORT_RETRIES = Retry(
+    total=3,
+    connect=3,
+    read=2,
+    status=2,
+    backoff_factor=0.3,
+    status_forcelist=(500, 502, 503, 504),
+    raise_on_status=False,
+)
+
+_session = None
+_session_lock = threading.Lock()
+
+
+class TimeoutHTTPAdapter(HTTPAdapter):
+
+    """HTTP adapter that applies a default (connect, read) timeout to every request
+
+    The time spent by each request, retries included, is added to the timings of the
+    current request as 'http'.
+    """
+
+    def __init__(self, timeout=(CONNECT_TIMEOUT, READ_TIMEOUT), **kwargs):
+        self.timeout = timeout
+        super(TimeoutHTTPAdapter, self).__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        if kwargs.get('timeout') is None:
+            kwargs['timeout'] = self.timeout
+        start = time.perf_counter()
+        try:
+            return super(TimeoutHTTPAdapter, self).send(request, **kwargs)
+        finally:
+            add_request_timing('http', time.perf_counter() - start)
+
+
+def build_session():
+    """Return a new Session with a connection pool per external host"""
+    session = requests.Session()
+    session.mount('https://', TimeoutHTTPAdapter(
+        pool_connections=DEFAULT_POOL_SIZE,
+        pool_maxsize=DEFAULT_POOL_SIZE,
+        max_retries=TRANSPORT_RETRIES,
+    ))
+    for host, pool_size in HOST_POOL_SIZES.items():
+        session.mount(host, TimeoutHTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=pool_size,
+            max_retries=TRANSPORT_RETRIES,
+        ))
+    return session
+
+
+def get_session():
+    """Return the Session shared by the whole process"""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = build_session()
+    return _session
+
+
+async def run_in_executor(function, *args, **kwargs):
+    """Run a blocking call (e.g. through the shared Session) without blocking the event loop
+
+    The call runs in a copy of the caller context, so it adds its time to the caller request.
+    """
+    loop = asyncio.get_event_loop()
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(None, partial(context.run, function, *args, **kwargs))
+
+
+def run_coroutine(coroutine):
+    """Run a coroutine to completion from synchronous code"""
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
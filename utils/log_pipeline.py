@@ -0,0 +1,104 @@
+import os
+import sys
+import json
+import queue
+import atexit
+import logging
+import threading
+import logging.handlers
+
+LOG_QUEUE_SIZE = 10000
+
+def compact_dumps(obj, default=None, **kwargs):
+    """json.dumps compatible serializer writing single line JSON"""
+    return json.dumps(obj, default=default, separators=(',', ':'))
+
+class BoundedQueueHandler(logging.handlers.QueueHandler):
+    """Hand records to a bounded queue without blocking, counting the records dropped when it is full
+
+    With a target handler, records are written to it by a QueueListener thread. The thread is
+    started by the first record handed over in each process, so a handler built before a server
+    forks its workers (gunicorn --preload) gets a listener in every worker. A warning telling how
+    many records were dropped is queued once the queue has room again, and written when the
+    listener stops.
+    """
+
+    def __init__(self, queue, target=None):
+        super().__init__(queue)
+        self.target = target
+        self.listener = None
+        self.listener_running = False
+        self.dropped = 0
+        self._dropped_reported = 0
+        self._dropped_lock = threading.Lock()
+        self._listener_lock = threading.Lock()
+        self._listener_pid = None
+
+    def start_listener(self):
+        """Start the listener thread of this process, it is stopped when the process exits"""
+        with self._listener_lock:
+            pid = os.getpid()
+            if self._listener_pid == pid:
+                return
+            if self._listener_pid is not None:
+                # Forked from a process with a running listener: its queue may be locked by a thread that is gone
+                self.queue = queue.Queue(self.queue.maxsize)
+            self.listener = logging.handlers.QueueListener(self.queue, self.target, respect_handler_level=True)
+            self.listener.start()
+            self.listener_running = True
+            self._listener_pid = pid
+            atexit.register(self.stop_listener)
+
+    def stop_listener(self):
+        """Stop the listener thread of this process, once the records left in the queue are written"""
+        with self._listener_lock:
+            if not self.listener_running or self._listener_pid != os.getpid():
+                return
+            self.listener.stop()
+            self.listener_running = False
+        warning = self._dropped_warning()
+        if warning is not None:
+            self.target.handle(warning)
+
+    def _dropped_warning(self):
+        """Return a warning record for the records dropped since the last one, None if none were"""
+        with self._dropped_lock:
+            count = self.dropped - self._dropped_reported
+            self._dropped_reported = self.dropped
+        if not count:
+            return None
+        return logging.LogRecord(
+            __name__, logging.WARNING, __file__, 0, 'Log queue full, %d records dropped', (count,), None
+        )
+
+    def enqueue(self, record):
+        if self.target is not None and self._listener_pid != os.getpid():
+            self.start_listener()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            with self._dropped_lock:
+                self.dropped += 1
+            return
+        if self.dropped != self._dropped_reported:
+            warning = self._dropped_warning()
+            if warning is None:
+                return
+            try:
+                self.queue.put_nowait(warning)
+            except queue.Full:
+                # Full again already, the next record with room reports them
+                with self._dropped_lock:
+                    self._dropped_reported -= warning.args[0]
+
+def queue_handler(maxsize=LOG_QUEUE_SIZE, stream=None, level=logging.NOTSET):
+    """Build a BoundedQueueHandler writing to a stream (stdout by default) from a listener thread
+
+    Used as a factory ('()') in the LOGGING setting. No thread is started here, settings are
+    imported before pre-fork servers fork their workers.
+    """
+    target = logging.StreamHandler(stream or sys.stdout)
+    target.setLevel(level)
+    handler = BoundedQueueHandler(queue.Queue(maxsize), target)
+    handler.setLevel(level)
+    return handler
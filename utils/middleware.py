@@ -0,0 +1,104 @@
+import time
+import uuid
+import logging
+from contextlib import ExitStack
+
+from django.db import connections
+from structlog import wrap_logger
+
+from utils.request_context import new_log_context, reset_log_context
+from utils.request_context import get_request_timings, new_request_timings, reset_request_timings
+from utils.timing import time_query
+
+log = logging.getLogger(__name__)
+logger = wrap_logger(log)
+
+# Parts of the time of a request reported, besides the total
+TIMED_PARTS = ('db', 'http', 'template')
+
+
+class RequestLogContextMiddleware:
+    """Give each request its own log context, with an id, the path and the logged in user
+
+    The context lives in a context variable, so it is not shared between threads or tasks,
+    and is dropped once the response is ready.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        context = {
+            'request_id': uuid.uuid4().hex,
+            'method': request.method,
+            'path': request.path,
+        }
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_authenticated:
+            context['user'] = user.email
+        request.request_id = context['request_id']
+        token = new_log_context(**context)
+        try:
+            return self.get_response(request)
+        finally:
+            reset_log_context(token)
+
+
+class RequestTimingMiddleware:
+    """Measure the time each request spends in total, in database queries, in calls to other
+    services and rendering templates
+
+    Writes one log line per request and a Server-Timing header (milliseconds) on the response.
+    Only a couple of clock reads are added per query, call or template. Bodies of streaming
+    responses are produced after the middleware returns and are not counted.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        start = time.perf_counter()
+        token = new_request_timings()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(time_query))
+                response = self.get_response(request)
+            timings = get_request_timings()
+        finally:
+            reset_request_timings(token)
+        total = time.perf_counter() - start
+
+        response['Server-Timing'] = server_timing_header(total, timings)
+        logger.info(
+            "Request timing",
+            request_id=getattr(request, 'request_id', None),
+            method=request.method,
+            path=request.path,
+            status=response.status_code,
+            duration_ms=_milliseconds(total),
+            **_timing_fields(timings)
+        )
+        return response
+
+
+def _milliseconds(seconds):
+    return round(seconds * 1000, 1)
+
+
+def _timing_fields(timings):
+    fields = {}
+    for part in TIMED_PARTS:
+        fields[part + '_ms'] = _milliseconds(timings.get(part, 0.0))
+        fields[part + '_count'] = timings.get(part + '_count', 0)
+    return fields
+
+
+def server_timing_header(total, timings):
+    """Return the Server-Timing header value of a request from its total time and timings (seconds)"""
+    metrics = [f'total;dur={_milliseconds(total)}']
+    for part in TIMED_PARTS:
+        count = timings.get(part + '_count', 0)
+        if count:
+            metrics.append(f'{part};dur={_milliseconds(timings[part])};desc="{count}"')
+    return ', '.join(metrics)
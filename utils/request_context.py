@@ -0,0 +1,47 @@
+import contextvars
+
+_log_context = contextvars.ContextVar('log_context', default={})
+
+def bind_log_context(**values):
+    """Add values to the log context of the current request"""
+    _log_context.set({**_log_context.get(), **values})
+
+def get_log_context():
+    return _log_context.get()
+
+def new_log_context(**values):
+    """Start a log context holding only `values`, returns a token to restore the previous one"""
+    return _log_context.set(dict(values))
+
+def reset_log_context(token):
+    _log_context.reset(token)
+
+def merge_log_context(logger, method_name, event_dict):
+    """structlog processor adding the log context of the current request to each event
+
+    Values bound on the logger itself take precedence over the request context.
+    """
+    context = _log_context.get()
+    if context:
+        event_dict = {**context, **event_dict}
+    return event_dict
+
+_request_timings = contextvars.ContextVar('request_timings', default=None)
+
+def get_request_timings():
+    """Return the dict of time (seconds) and counts spent by the current request, None outside requests"""
+    return _request_timings.get()
+
+def new_request_timings():
+    """Start counting the time spent by a request, returns a token to restore the previous timings"""
+    return _request_timings.set({})
+
+def reset_request_timings(token):
+    _request_timings.reset(token)
+
+def add_request_timing(name, seconds):
+    """Add time spent in `name` (e.g. 'db') to the current request, and count one more call"""
+    timings = _request_timings.get()
+    if timings is not None:
+        timings[name] = timings.get(name, 0.0) + seconds
+        timings[name + '_count'] = timings.get(name + '_count', 0) + 1
@@ -1,13 +1,21 @@
 
 import os
-import requests
 
 from urllib.parse import urlencode
 
+import requests
+
+from utils.http_client import get_session
+
 SPOTIFY_AUTH_ERROR = "Oops, something went wrong asking Spotify about you ..."
 SPOTIFY_CLIENT_ID = '1aaa5ce0611f42cea3b4eeff885b807d'
 SPOTIFY_CODE_EXCHANGE_URL = 'https://accounts.spotify.com/api/token' 
 SPOTIFY_AUTHORIZE_URL = 'https://accounts.spotify.com/authorize'
+SPOTIFY_RECENTLY_PLAYED_URL = 'https://api.spotify.com/v1/me/player/recently-played'
+SPOTIFY_AUDIO_FEATURES_URL = 'https://api.spotify.com/v1/audio-features'
+SPOTIFY_MAX_LIMIT = 50
+SPOTIFY_MAX_AUDIO_FEATURES_IDS = 100
+SPOTIFY_AUDIO_FEATURES = ('tempo', 'energy', 'danceability', 'valence')
 
 def spotify_oauth_code_request_url():
     parameters_dict = {
@@ -26,7 +34,14 @@ def request_spotify_oauth_code():
         'response_type': 'code',
         'scope': 'user-read-recently-played user-top-read'
     }
-    response = requests.post(SPOTIFY_AUTHORIZE_URL, parameters)
+    response = _spotify_post(SPOTIFY_AUTHORIZE_URL, parameters)
+
+def _spotify_post(url, data):
+    """POST to a Spotify url, returns None when no answer was received (timeout, connection error)"""
+    try:
+        return get_session().post(url, data = data)
+    except requests.RequestException:
+        return None
 
 def exchange_spotify_code(code):
     data = {
@@ -37,12 +52,115 @@ def exchange_spotify_code(code):
         'redirect_uri': os.environ['SPOTIFY_REDIRECT_URI'], 
     }
     
-    response = requests.post(SPOTIFY_CODE_EXCHANGE_URL, data = data) 
-   
-    if response.status_code != 200:
-        return (None, None)
+    response = _spotify_post(SPOTIFY_CODE_EXCHANGE_URL, data)
+
+    if response is None or response.status_code != 200:
+        return (None, None, None)
     else:
         data_received = response.json()
         token_received = data_received.get('access_token')
         refresh_token_received = data_received.get('refresh_token')
-        return (token_received, refresh_token_received)
+        expires_in_received = data_received.get('expires_in')
+        return (token_received, refresh_token_received, expires_in_received)
+
+def refresh_spotify_token(refresh_token):
+    """Ask Spotify for a new access token with a refresh token
+
+    Returns (access token, refresh token, seconds the access token lasts). Spotify only sends a
+    refresh token when the previous one must be replaced, None otherwise. Returns
+    (None, None, None) on error.
+    """
+    data = {
+        'client_id': SPOTIFY_CLIENT_ID,
+        'client_secret': os.environ['SPOTIFY_CLIENT_SECRET'],
+        'grant_type': 'refresh_token',
+        'refresh_token': refresh_token,
+    }
+    response = _spotify_post(SPOTIFY_CODE_EXCHANGE_URL, data)
+    if response is None or response.status_code != 200:
+        return (None, None, None)
+    data_received = response.json()
+    return (
+        data_received.get('access_token'),
+        data_received.get('refresh_token'),
+        data_received.get('expires_in'),
+    )
+
+class SpotifyRequestError(Exception):
+    """Raised when Spotify answers an API request with an error, or does not answer"""
+
+def _spotify_api_get(url, **kwargs):
+    """GET a Spotify API url, raises SpotifyRequestError on error or when no answer was received"""
+    try:
+        response = get_session().get(url, **kwargs)
+    except requests.RequestException as error:
+        raise SpotifyRequestError(type(error).__name__) from error
+    if response.status_code != 200:
+        raise SpotifyRequestError(response.status_code)
+    return response
+
+def _normalize_spotify_play(item):
+    track = item.get('track') or {}
+    play = {}
+    play['track_id'] = track.get('id')
+    play['played_at'] = item.get('played_at')
+    play['duration_ms'] = track.get('duration_ms')
+    return play
+
+def get_spotify_recently_played_page(token, after=None, before=None, limit=SPOTIFY_MAX_LIMIT):
+    """Return one page of the tracks recently played by the user and the cursors of the page
+
+    Plays are normalized dictionaries, newest first. `after` and `before` are cursors
+    (milliseconds since the epoch), the cursors returned are None when there is no page left.
+    """
+    headers = {'Authorization': 'Bearer ' + token}
+    parameters = {'limit': limit}
+    if after is not None:
+        parameters['after'] = after
+    if before is not None:
+        parameters['before'] = before
+    response = _spotify_api_get(SPOTIFY_RECENTLY_PLAYED_URL, headers=headers, params=parameters)
+    received = response.json()
+    plays = [_normalize_spotify_play(item) for item in received.get('items', [])]
+    return plays, received.get('cursors') or {}
+
+def iter_spotify_recently_played_pages(token, after=None, limit=SPOTIFY_MAX_LIMIT):
+    """Yield the tracks recently played by the user one page at a time, as lists of normalized plays
+
+    Without `after` pages go back in time with the `before` cursors. With `after` (a cursor,
+    milliseconds since the epoch) pages go forward from it with the `after` cursors.
+    """
+    cursor = after
+    while True:
+        if after is None:
+            plays, cursors = get_spotify_recently_played_page(token, before=cursor, limit=limit)
+        else:
+            plays, cursors = get_spotify_recently_played_page(token, after=cursor, limit=limit)
+        if not plays:
+            return
+        yield plays
+        cursor = cursors.get('before' if after is None else 'after')
+        if cursor is None or len(plays) < limit:
+            return
+
+def _normalize_spotify_audio_features(track_id, item):
+    item = item or {}
+    features = {'track_id': track_id}
+    for feature in SPOTIFY_AUDIO_FEATURES:
+        features[feature] = item.get(feature)
+    return features
+
+def get_spotify_audio_features_batch(token, track_ids):
+    """Return the audio features of up to SPOTIFY_MAX_AUDIO_FEATURES_IDS tracks, in one request
+
+    Features are normalized dictionaries in the order of `track_ids`, with None values for
+    the tracks Spotify has no features for.
+    """
+    if len(track_ids) > SPOTIFY_MAX_AUDIO_FEATURES_IDS:
+        raise ValueError(f'At most {SPOTIFY_MAX_AUDIO_FEATURES_IDS} tracks per request')
+    headers = {'Authorization': 'Bearer ' + token}
+    parameters = {'ids': ','.join(track_ids)}
+    response = _spotify_api_get(SPOTIFY_AUDIO_FEATURES_URL, headers=headers, params=parameters)
+    items = response.json().get('audio_features') or []
+    items = items + [None] * (len(track_ids) - len(items))
+    return [_normalize_spotify_audio_features(track_id, item) for track_id, item in zip(track_ids, items)]
@@ -0,0 +1,220 @@
+""" Budget of the calls to the Strava API, shared by the web and worker processes
+
+Strava allows a number of requests per 15 minutes and per day to the whole application. The
+usage of each window, and the calls waiting for budget, are counted in the cache named by
+settings.STRAVA_RATE_LIMIT_CACHE, so every process sharing that cache draws from the same
+budget. With a per process cache backend such as locmem, each process only sees its own calls.
+"""
+import time
+import threading
+
+from collections import Counter
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import caches
+
+STRAVA_INTERACTIVE = 0
+STRAVA_BACKGROUND = 1
+STRAVA_SHORT_WINDOW = 15 * 60
+STRAVA_DAILY_WINDOW = 24 * 60 * 60
+STRAVA_SHORT_LIMIT = 600
+STRAVA_DAILY_LIMIT = 30000
+# Share of each window that background calls leave to logged in users
+STRAVA_INTERACTIVE_RESERVE = 0.2
+# Seconds a call waits for budget before it is deferred
+STRAVA_MAX_WAIT = {
+    STRAVA_INTERACTIVE: 5,
+    STRAVA_BACKGROUND: 0,
+}
+# Seconds between two looks at the shared budget while waiting, other processes can not wake us up
+STRAVA_POLL_INTERVAL = 0.5
+# Seconds a waiting count is kept, so a process dying while it waits does not hold others back
+STRAVA_WAITING_TTL = 60
+
+class StravaRateLimited(Exception):
+    """Raised when there is no Strava budget left for a call before `retry_at` (seconds since the epoch)"""
+
+    def __init__(self, retry_at):
+        super().__init__(retry_at)
+        self.retry_at = retry_at
+
+def _parse_header_pair(value):
+    try:
+        short, daily = (int(part) for part in value.split(','))
+    except (AttributeError, ValueError):
+        return None
+    return short, daily
+
+class StravaRateLimiter:
+    """Keeps track of the Strava request budget and hands it out by priority
+
+    Strava counts requests per 15 minutes and per day, both windows starting at round UTC times,
+    and reports the limits and the usage in the headers of each response. Usage is counted in
+    the cache between responses, one entry per window, so concurrent calls of every process can
+    not overrun the budget. Background calls stop short of the limits to keep a reserve for
+    interactive calls, and wait while an interactive call of any process is waiting.
+    """
+
+    def __init__(self, short_limit=STRAVA_SHORT_LIMIT, daily_limit=STRAVA_DAILY_LIMIT,
+                 reserve=STRAVA_INTERACTIVE_RESERVE, clock=time.time, cache=None):
+        self.short_limit = short_limit
+        self.daily_limit = daily_limit
+        self.reserve = reserve
+        self.clock = clock
+        self._cache = cache
+        self._waiting = Counter()
+        self._condition = threading.Condition()
+
+    @property
+    def cache(self):
+        if self._cache is None:
+            return caches[settings.STRAVA_RATE_LIMIT_CACHE]
+        return self._cache
+
+    @property
+    def short_usage(self):
+        return self.cache.get(self._usage_keys(self.clock())[0], 0)
+
+    @property
+    def daily_usage(self):
+        return self.cache.get(self._usage_keys(self.clock())[1], 0)
+
+    def _usage_keys(self, now):
+        return (
+            'strava-rate-limit:short:%d' % (now // STRAVA_SHORT_WINDOW),
+            'strava-rate-limit:daily:%d' % (now // STRAVA_DAILY_WINDOW),
+        )
+
+    def _set_usage(self, now, short_usage, daily_usage):
+        short_key, daily_key = self._usage_keys(now)
+        self.cache.set(short_key, short_usage, STRAVA_SHORT_WINDOW)
+        self.cache.set(daily_key, daily_usage, STRAVA_DAILY_WINDOW)
+
+    def _incr(self, key, delta, timeout):
+        self.cache.add(key, 0, timeout)
+        try:
+            return self.cache.incr(key, delta)
+        except ValueError:
+            # The entry expired in between, start counting again
+            self.cache.set(key, max(delta, 0), timeout)
+            return max(delta, 0)
+
+    def _caps(self, priority):
+        if priority == STRAVA_INTERACTIVE:
+            return self.short_limit, self.daily_limit
+        share = 1 - self.reserve
+        return int(self.short_limit * share), int(self.daily_limit * share)
+
+    def _retry_at(self, now, priority, short_usage, daily_usage):
+        """Return when budget frees up for a priority, None if there is budget at this usage"""
+        short_cap, daily_cap = self._caps(priority)
+        if daily_usage > daily_cap:
+            return (now // STRAVA_DAILY_WINDOW + 1) * STRAVA_DAILY_WINDOW
+        if short_usage > short_cap:
+            return (now // STRAVA_SHORT_WINDOW + 1) * STRAVA_SHORT_WINDOW
+        return None
+
+    def _take(self, now, priority):
+        """Take one request from the budget, return when to retry if there was none left"""
+        short_key, daily_key = self._usage_keys(now)
+        short_usage = self._incr(short_key, 1, STRAVA_SHORT_WINDOW)
+        daily_usage = self._incr(daily_key, 1, STRAVA_DAILY_WINDOW)
+        retry_at = self._retry_at(now, priority, short_usage, daily_usage)
+        if retry_at is not None:
+            self._incr(short_key, -1, STRAVA_SHORT_WINDOW)
+            self._incr(daily_key, -1, STRAVA_DAILY_WINDOW)
+        return retry_at
+
+    def _waiting_key(self, priority):
+        return 'strava-rate-limit:waiting:%d' % priority
+
+    def _outranked(self, priority):
+        if any(count for waiting, count in self._waiting.items() if waiting < priority):
+            return True
+        return any(self.cache.get(self._waiting_key(waiting), 0) > 0 for waiting in range(priority))
+
+    def blocked_until(self, priority=None):
+        """Return when calls of a priority can be made again, None if they can be made now"""
+        priority = current_priority() if priority is None else priority
+        now = self.clock()
+        short_key, daily_key = self._usage_keys(now)
+        usage = self.cache.get_many([short_key, daily_key])
+        return self._retry_at(now, priority, usage.get(short_key, 0) + 1, usage.get(daily_key, 0) + 1)
+
+    def acquire(self, priority=None, max_wait=None):
+        """Take one request from the budget, waiting up to `max_wait` seconds for it
+
+        Raises StravaRateLimited when the budget can not be granted in time.
+        """
+        priority = current_priority() if priority is None else priority
+        max_wait = STRAVA_MAX_WAIT[priority] if max_wait is None else max_wait
+        waiting_key = self._waiting_key(priority)
+        with self._condition:
+            deadline = self.clock() + max_wait
+            self._waiting[priority] += 1
+            shared_waiting = False
+            try:
+                while True:
+                    now = self.clock()
+                    retry_at = None
+                    if not self._outranked(priority):
+                        retry_at = self._take(now, priority)
+                        if retry_at is None:
+                            return
+                    if now >= deadline:
+                        raise StravaRateLimited(retry_at or now)
+                    if not shared_waiting:
+                        # Let the other processes know before waiting, their lower priority calls hold back
+                        shared_waiting = True
+                        self._incr(waiting_key, 1, STRAVA_WAITING_TTL)
+                    self._condition.wait(min(deadline, retry_at or deadline, now + STRAVA_POLL_INTERVAL) - now)
+            finally:
+                self._waiting[priority] -= 1
+                if shared_waiting:
+                    self._incr(waiting_key, -1, STRAVA_WAITING_TTL)
+                self._condition.notify_all()
+
+    def update(self, status_code, headers):
+        """Record the limits and usage reported by Strava in a response"""
+        limits = _parse_header_pair(headers.get('X-RateLimit-Limit'))
+        usage = _parse_header_pair(headers.get('X-RateLimit-Usage'))
+        with self._condition:
+            now = self.clock()
+            if limits is not None:
+                self.short_limit, self.daily_limit = limits
+            if usage is not None:
+                self._set_usage(now, *usage)
+            if status_code == 429 and usage is None:
+                self._set_usage(now, max(self.short_usage, self.short_limit), self.daily_usage)
+            self._condition.notify_all()
+
+rate_limiter = StravaRateLimiter()
+
+_default_priority = STRAVA_INTERACTIVE
+_local = threading.local()
+
+def set_default_priority(priority):
+    """Set the priority of Strava calls made by this process, returns the previous one
+
+    Each process has its own default: the worker sets STRAVA_BACKGROUND for all of its calls.
+    """
+    global _default_priority
+    previous, _default_priority = _default_priority, priority
+    return previous
+
+def current_priority():
+    return getattr(_local, 'priority', _default_priority)
+
+@contextmanager
+def strava_priority(priority):
+    """Make the Strava calls of the current thread with a priority"""
+    previous = getattr(_local, 'priority', None)
+    _local.priority = priority
+    try:
+        yield
+    finally:
+        if previous is None:
+            del _local.priority
+        else:
+            _local.priority = previous
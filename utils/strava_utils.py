@@ -1,15 +1,25 @@
 import os
-import requests
 import json
 
 from urllib.parse import urlencode
 from operator import itemgetter
 
+import requests
+
+from utils.http_client import get_session
+from utils.strava_rate_limit import rate_limiter, StravaRateLimited
+
 STRAVA_AUTH_ERROR = "Oops, something went wrong asking Strava about you ..."
+STRAVA_SYNC_IN_PROGRESS = "We are getting your activities from Strava, come back in a minute ..."
+STRAVA_NO_ACTIVITIES = "Strava has no activities for you yet ..."
 STRAVA_CLIENT_ID = '15873'
 STRAVA_CODE_EXCHANGE_URL = 'https://www.strava.com/oauth/token' 
 STRAVA_AUTHORIZE_URL = 'https://www.strava.com/oauth/authorize'
 STRAVA_GET_ACTIVITIES_URL = 'https://www.strava.com/api/v3/athlete/activities'
+STRAVA_ATHLETE_STATS_URL = 'https://www.strava.com/api/v3/athletes/{athlete_id}/stats'
+STRAVA_ACTIVITY_STREAMS_URL = 'https://www.strava.com/api/v3/activities/{activity_id}/streams'
+STRAVA_MAX_PER_PAGE = 200
+STRAVA_STREAM_TYPES = ('time', 'heartrate', 'velocity_smooth', 'cadence', 'altitude')
 
 def strava_oauth_code_request_url():
     parameters_dict = {
@@ -29,7 +39,14 @@ def request_strava_oauth_code():
         'response_type': 'code',
         'scope': 'view_private'
     }
-    response = requests.post(STRAVA_AUTHORIZE_URL, parameters)
+    response = _strava_post(STRAVA_AUTHORIZE_URL, parameters)
+
+def _strava_post(url, data):
+    """POST to a Strava url, returns None when no answer was received (timeout, connection error)"""
+    try:
+        return get_session().post(url, data)
+    except requests.RequestException:
+        return None
 
 def exchange_strava_code(code):
     parameters = {
@@ -38,8 +55,10 @@ def exchange_strava_code(code):
         'code': code
     }
 
-    response = requests.post(STRAVA_CODE_EXCHANGE_URL, parameters)
-    
+    response = _strava_post(STRAVA_CODE_EXCHANGE_URL, parameters)
+    if response is None:
+        return (None, None)
+
     data_received = response.json()
 
     if 'errors' in data_received:
@@ -49,24 +68,112 @@ def exchange_strava_code(code):
         id_received = data_received.get('athlete').get('id')
         return (token_received, id_received)
 
-def get_strava_activities(token):
+class StravaRequestError(Exception):
+    """Raised when Strava answers an API request with an error, or does not answer"""
+
+def _strava_api_get(url, **kwargs):
+    """GET a Strava API url once the rate limiter grants budget for it
+
+    Raises StravaRequestError when the budget is spent (429) or no answer was received.
+    """
+    try:
+        rate_limiter.acquire()
+    except StravaRateLimited as limited:
+        raise StravaRequestError(429) from limited
+    try:
+        response = get_session().get(url, **kwargs)
+    except requests.RequestException as error:
+        raise StravaRequestError(type(error).__name__) from error
+    rate_limiter.update(response.status_code, response.headers)
+    return response
+
+def _normalize_strava_activity(item):
+    activity = {}
+    activity['platform'] = 'Strava'
+    activity['distance'] = item.get('distance')
+    activity['moving_time'] = item.get('moving_time')
+    activity['elevation_gain'] = item.get('total_elevation_gain')
+    activity['type'] = item.get('type')
+    activity['strava_id'] = item.get('id')
+    activity['start_date'] = item.get('start_date')
+    activity['start_date_local'] = item.get('start_date_local')
+    activity['average_heartrate'] = item.get('average_heartrate')
+    activity['average_cadence'] = item.get('average_cadence')
+    return activity
+
+def get_strava_activity_page(token, page, per_page=STRAVA_MAX_PER_PAGE, after=None):
+    """Return one page of the athlete activities as a list of normalized activities"""
     headers = {'Authorization': 'Bearer ' + token}
-    response = requests.get(STRAVA_GET_ACTIVITIES_URL, headers=headers)
+    parameters = {'page': page, 'per_page': per_page}
+    if after is not None:
+        parameters['after'] = after
+    response = _strava_api_get(STRAVA_GET_ACTIVITIES_URL, headers=headers, params=parameters)
     if response.status_code != 200:
-        return None 
-    else:
-        received = json.loads(response.text)
-        activities = []
-        for item in received:
-            activity = {}
-            activity['platform'] = 'Strava'
-            activity['distance'] = item.get('distance')
-            activity['moving_time'] = item.get('moving_time')
-            activity['elevation_gain'] = item.get('total_elevation_gain')
-            activity['type'] = item.get('type')
-            activity['strava_id'] = item.get('id')
-            activity['start_date_local'] = item.get('start_date_local')
-            activity['average_heartrate'] = item.get('average_heartrate')
-            activity['average_cadence'] = item.get('average_cadence')
-            activities.append(activity)
-        return sorted(activities,key=itemgetter('start_date_local'))
+        raise StravaRequestError(response.status_code)
+    return [_normalize_strava_activity(item) for item in json.loads(response.text)]
+
+def iter_strava_activity_pages(token, per_page=STRAVA_MAX_PER_PAGE, after=None):
+    """Yield the athlete activities one page at a time, as lists of normalized activities
+
+    If `after` (seconds since the epoch) is given only activities that started later are received
+    """
+    page = 1
+    while True:
+        activities = get_strava_activity_page(token, page, per_page=per_page, after=after)
+        if not activities:
+            return
+        yield activities
+        if len(activities) < per_page:
+            return
+        page += 1
+
+def get_strava_activity_count(token, athlete_id):
+    """Return the number of runs, rides and swims recorded by the athlete"""
+    headers = {'Authorization': 'Bearer ' + token}
+    url = STRAVA_ATHLETE_STATS_URL.format(athlete_id=athlete_id)
+    response = _strava_api_get(url, headers=headers)
+    if response.status_code != 200:
+        raise StravaRequestError(response.status_code)
+    stats = response.json()
+    return sum(
+        (stats.get(totals) or {}).get('count', 0)
+        for totals in ('all_run_totals', 'all_ride_totals', 'all_swim_totals')
+    )
+
+def get_strava_activities(token, after=None, raise_errors=False):
+    """Return the athlete activities started after `after` sorted by date
+
+    Returns None if Strava answered with an error, or raises StravaRequestError with `raise_errors`.
+    """
+    try:
+        activities = [
+            activity
+            for page in iter_strava_activity_pages(token, after=after)
+            for activity in page
+        ]
+    except StravaRequestError:
+        if raise_errors:
+            raise
+        return None
+    return sorted(activities,key=itemgetter('start_date_local'))
+
+def get_strava_activity_streams(token, activity_id, types=STRAVA_STREAM_TYPES):
+    """Return the streams of an activity as a dictionary of lists of samples keyed by stream type
+
+    Types the activity was not recorded with are left out. Returns None on error.
+    """
+    headers = {'Authorization': 'Bearer ' + token}
+    url = STRAVA_ACTIVITY_STREAMS_URL.format(activity_id=activity_id)
+    parameters = {'keys': ','.join(types), 'key_by_type': 'true'}
+    try:
+        response = _strava_api_get(url, headers=headers, params=parameters)
+    except StravaRequestError:
+        return None
+    if response.status_code != 200:
+        return None
+    received = response.json()
+    return {
+        stream_type: received[stream_type].get('data', [])
+        for stream_type in types
+        if stream_type in received
+    }
@@ -0,0 +1,67 @@
+"""Unit tests for the asyncio variant of the Spotify Utils module"""
+import httpretty
+
+from django.test import TestCase
+
+from utils.http_client import run_coroutine
+from utils.async_spotify_utils import (
+    exchange_spotify_code,
+    get_spotify_audio_features,
+    get_spotify_audio_features_concurrently,
+)
+from utils.spotify_utils import SPOTIFY_AUDIO_FEATURES_URL, SPOTIFY_CODE_EXCHANGE_URL
+
+class ExchangeSpotifyCode(TestCase):
+
+    """Unit tests for the asyncio helper function that exchanges Spotify code for Token"""
+
+    @httpretty.activate
+    def test_sends_code_and_returns_tokens(self):
+        """Test that the async exchange spotify code helper sends the code and returns the tokens received"""
+        httpretty.register_uri(
+            httpretty.POST,
+            SPOTIFY_CODE_EXCHANGE_URL,
+            body = '{"access_token": "NgCXRKMxYjw", "expires_in": 3600, "refresh_token": "NgAagAUm_SHo"}'
+        )
+        tokens = run_coroutine(exchange_spotify_code("AQDQd9k6p7v"))
+        self.assertEqual(httpretty.last_request().parsed_body["code"], ["AQDQd9k6p7v"])
+        self.assertEqual(tokens, ("NgCXRKMxYjw", "NgAagAUm_SHo", 3600))
+
+    @httpretty.activate
+    def test_returns_none_on_error(self):
+        """Test that the async exchange spotify code helper returns no tokens when Spotify answers with an error"""
+        httpretty.register_uri(httpretty.POST, SPOTIFY_CODE_EXCHANGE_URL, body = '{}', status = 400)
+        self.assertEqual(run_coroutine(exchange_spotify_code("AQDQd9k6p7v")), (None, None, None))
+
+class GetSpotifyAudioFeaturesConcurrently(TestCase):
+
+    """Unit tests for helper function that requests batches of audio features at the same time"""
+
+    def register_audio_features_url_in_httpretty(self, status=200):
+        def audio_features(request, uri, response_headers):
+            items = ','.join(
+                f'{{"id": "{track_id}", "tempo": {track_id}}}'
+                for track_id in request.querystring['ids'][0].split(',')
+            )
+            return [status, response_headers, f'{{"audio_features": [{items}]}}']
+        httpretty.register_uri(httpretty.GET, SPOTIFY_AUDIO_FEATURES_URL, body = audio_features)
+
+    def requested_batches(self):
+        return sorted(
+            request.querystring['ids'][0]
+            for request in httpretty.HTTPretty.latest_requests
+        )
+
+    @httpretty.activate
+    def test_requests_tracks_in_batches(self):
+        """Test that GetSpotifyAudioFeatures splits the tracks in batches of the size received"""
+        self.register_audio_features_url_in_httpretty()
+        features = run_coroutine(get_spotify_audio_features("token", ["1", "2", "3", "4", "5"], batch_size=2))
+        self.assertEqual(self.requested_batches(), ["1,2", "3,4", "5"])
+        self.assertEqual([track["tempo"] for track in features], [1, 2, 3, 4, 5])
+
+    @httpretty.activate
+    def test_returns_none_on_error(self):
+        """Test that GetSpotifyAudioFeaturesConcurrently returns None when Spotify answers with an error"""
+        self.register_audio_features_url_in_httpretty(status=401)
+        self.assertIsNone(get_spotify_audio_features_concurrently("token", ["1", "2"]))
@@ -0,0 +1,150 @@
+"""Unit tests for the asyncio variant of the Strava Utils module"""
+import asyncio
+import httpretty
+from unittest.mock import patch
+
+from django.test import TestCase
+
+from utils.http_client import run_coroutine
+from utils.async_strava_utils import (
+    get_strava_activities,
+    get_strava_activities_concurrently,
+)
+from utils.strava_utils import (
+    STRAVA_ATHLETE_STATS_URL,
+    STRAVA_GET_ACTIVITIES_URL,
+)
+
+class GetStravaActivitiesConcurrently(TestCase):
+
+    """Unit tests for helper function that requests pages of Strava activities at the same time"""
+
+    def activities_body(self, first_id, count):
+        activities = ','.join(
+            '{'
+                f'"id":{first_id + i},'
+                '"distance":1000,'
+                '"type":"Run",'
+                f'"start_date_local":"2018-05-01T19:12:{(first_id + i) % 60:02d}Z"'
+            '}'
+            for i in range(count)
+        )
+        return f'[{activities}]'
+
+    def register_stats_url_in_httpretty(self, runs, rides=0, status=200):
+        httpretty.register_uri(
+            httpretty.GET,
+            STRAVA_ATHLETE_STATS_URL.format(athlete_id=1234567),
+            body = (
+                '{'
+                    f'"all_run_totals":{{"count":{runs}}},'
+                    f'"all_ride_totals":{{"count":{rides}}},'
+                    '"all_swim_totals":{"count":0}'
+                '}'
+            ),
+            status = status
+        )
+
+    def register_get_activities_url_in_httpretty(self, total, per_page):
+        def activities_page(request, uri, response_headers):
+            page = int(request.querystring['page'][0])
+            first_id = (page - 1) * per_page
+            count = max(0, min(per_page, total - first_id))
+            return [200, response_headers, self.activities_body(first_id, count)]
+        httpretty.register_uri(
+            httpretty.GET,
+            STRAVA_GET_ACTIVITIES_URL,
+            body = activities_page
+        )
+
+    def requested_pages(self):
+        return sorted(
+            int(request.querystring['page'][0])
+            for request in httpretty.HTTPretty.latest_requests
+            if 'page' in request.querystring
+        )
+
+    @httpretty.activate
+    def test_requests_every_page_counted_in_stats(self):
+        """Test that GetStravaActivities requests all the pages the athlete stats count"""
+        self.register_stats_url_in_httpretty(runs=4, rides=1)
+        self.register_get_activities_url_in_httpretty(total=5, per_page=2)
+        activities = run_coroutine(get_strava_activities("token", 1234567, per_page=2))
+        self.assertEqual(len(activities), 5)
+        self.assertEqual(self.requested_pages(), [1, 2, 3])
+
+    @httpretty.activate
+    def test_keeps_requesting_pages_while_last_page_is_full(self):
+        """Test that GetStravaActivities gets activities that are not counted in the athlete stats"""
+        self.register_stats_url_in_httpretty(runs=2)
+        self.register_get_activities_url_in_httpretty(total=5, per_page=2)
+        activities = run_coroutine(get_strava_activities("token", 1234567, per_page=2))
+        self.assertEqual(len(activities), 5)
+
+    @httpretty.activate
+    def test_returns_activities_sorted_by_date(self):
+        """Test that GetStravaActivities returns activities in ascending order by date"""
+        self.register_stats_url_in_httpretty(runs=6)
+        self.register_get_activities_url_in_httpretty(total=6, per_page=2)
+        activities = get_strava_activities_concurrently("token", 1234567)
+        dates = [activity.get('start_date_local') for activity in activities]
+        self.assertEqual(dates, sorted(dates))
+
+    @httpretty.activate
+    def test_returns_none_on_error(self):
+        """Test that GetStravaActivities returns None when Strava answers with an error"""
+        self.register_stats_url_in_httpretty(runs=6, status=401)
+        self.assertIsNone(get_strava_activities_concurrently("token", 1234567))
+
+    def test_limits_pages_requested_at_the_same_time(self):
+        """Test that GetStravaActivities never has more pages in flight than allowed"""
+        in_flight = []
+        max_in_flight = []
+
+        async def fake_page(token, page, per_page):
+            in_flight.append(page)
+            max_in_flight.append(len(in_flight))
+            await asyncio.sleep(0.01)
+            in_flight.remove(page)
+            if page > 10:
+                return []
+            return [{'start_date_local': f'2018-05-{page:02d}'}]
+
+        async def fake_count(token, athlete_id):
+            return 10
+
+        with patch("utils.async_strava_utils.get_strava_activity_page", fake_page), \
+                patch("utils.async_strava_utils.get_strava_activity_count", fake_count):
+            activities = run_coroutine(
+                get_strava_activities("token", 1234567, per_page=1, max_concurrent_pages=3)
+            )
+        self.assertEqual(len(activities), 10)
+        self.assertEqual(max(max_in_flight), 3)
+
+    def test_requests_pages_past_stats_count_at_the_same_time(self):
+        """Test that GetStravaActivities requests windows of pages at the same time past the athlete stats count"""
+        requested = []
+        in_flight = []
+        max_in_flight = []
+
+        async def fake_page(token, page, per_page):
+            requested.append(page)
+            in_flight.append(page)
+            max_in_flight.append(len(in_flight))
+            await asyncio.sleep(0.01)
+            in_flight.remove(page)
+            if page > 6:
+                return []
+            return [{'start_date_local': f'2018-05-{page:02d}'}]
+
+        async def fake_count(token, athlete_id):
+            return 1
+
+        with patch("utils.async_strava_utils.get_strava_activity_page", fake_page), \
+                patch("utils.async_strava_utils.get_strava_activity_count", fake_count):
+            activities = run_coroutine(
+                get_strava_activities("token", 1234567, per_page=1, max_concurrent_pages=3)
+            )
+        self.assertEqual(len(activities), 6)
+        self.assertEqual(sorted(requested), [1, 2, 3, 4, 5, 6, 7])
+        self.assertEqual(max(max_in_flight), 3)
@@ -0,0 +1,66 @@
+"""Unit tests for the shared HTTP client"""
+import requests
+from unittest.mock import patch
+
+from django.test import TestCase
+
+from utils.http_client import (
+    get_session,
+    build_session,
+    TimeoutHTTPAdapter,
+    CONNECT_TIMEOUT,
+    READ_TIMEOUT,
+    DEFAULT_POOL_SIZE,
+    HOST_POOL_SIZES,
+)
+from utils.strava_utils import STRAVA_GET_ACTIVITIES_URL
+from utils.spotify_utils import SPOTIFY_CODE_EXCHANGE_URL
+
+class GetSession(TestCase):
+
+    """Unit tests for helper function that returns the shared Session"""
+
+    def test_returns_same_session_every_time(self):
+        """Test that GetSession reuses the Session (and its connection pools)"""
+        self.assertIs(get_session(), get_session())
+
+    def test_uses_host_pool_size_for_strava(self):
+        """Test that the Session uses the Strava pool size for Strava calls"""
+        adapter = build_session().get_adapter(STRAVA_GET_ACTIVITIES_URL)
+        self.assertIsInstance(adapter, TimeoutHTTPAdapter)
+        self.assertEqual(adapter._pool_maxsize, HOST_POOL_SIZES['https://www.strava.com'])
+
+    def test_uses_host_pool_size_for_spotify(self):
+        """Test that the Session uses the Spotify accounts pool size for Spotify token calls"""
+        adapter = build_session().get_adapter(SPOTIFY_CODE_EXCHANGE_URL)
+        self.assertEqual(adapter._pool_maxsize, HOST_POOL_SIZES['https://accounts.spotify.com'])
+
+    def test_uses_default_pool_size_for_other_hosts(self):
+        """Test that the Session uses the default pool size for any other host"""
+        adapter = build_session().get_adapter('https://example.com/')
+        self.assertEqual(adapter._pool_maxsize, DEFAULT_POOL_SIZE)
+
+    def test_retries_server_errors(self):
+        """Test that the Session retries requests that fail with a server error"""
+        adapter = build_session().get_adapter(STRAVA_GET_ACTIVITIES_URL)
+        self.assertIn(503, adapter.max_retries.status_forcelist)
+
+
+class TimeoutHTTPAdapterTest(TestCase):
+
+    """Unit tests for the HTTP adapter that sets default timeouts"""
+
+    def prepared_request(self):
+        return requests.Request('GET', 'https://example.com/').prepare()
+
+    @patch("utils.http_client.HTTPAdapter.send")
+    def test_sends_default_timeout(self, mock_send):
+        """Test that TimeoutHTTPAdapter sends connect and read timeouts when none received"""
+        TimeoutHTTPAdapter().send(self.prepared_request(), timeout=None)
+        self.assertEqual(mock_send.call_args[1]['timeout'], (CONNECT_TIMEOUT, READ_TIMEOUT))
+
+    @patch("utils.http_client.HTTPAdapter.send")
+    def test_keeps_timeout_received(self, mock_send):
+        """Test that TimeoutHTTPAdapter does not override an explicit timeout"""
+        TimeoutHTTPAdapter().send(self.prepared_request(), timeout=1)
+        self.assertEqual(mock_send.call_args[1]['timeout'], 1)
@@ -0,0 +1,91 @@
+"""Unit tests for the production log pipeline"""
+import io
+import json
+import queue
+import logging
+from unittest.mock import patch
+
+from django.test import TestCase
+
+from utils.log_pipeline import BoundedQueueHandler, compact_dumps, queue_handler
+
+class CompactDumps(TestCase):
+
+    """Unit tests for the serializer of the production log profile"""
+
+    def test_writes_single_line_json(self):
+        """Test that CompactDumps renders events on one line without spaces"""
+        rendered = compact_dumps({"event": "Logout", "user": "edith@mailinator.com"})
+        self.assertEqual(rendered, '{"event":"Logout","user":"edith@mailinator.com"}')
+
+    def test_uses_default_for_unknown_types(self):
+        """Test that CompactDumps falls back to the default function received"""
+        rendered = compact_dumps({"user": object()}, default=lambda obj: "fallback")
+        self.assertEqual(json.loads(rendered), {"user": "fallback"})
+
+class BoundedQueueHandlerTest(TestCase):
+
+    """Unit tests for utils.log_pipeline.BoundedQueueHandler"""
+
+    def record(self, message):
+        return logging.LogRecord("test", logging.INFO, __file__, 1, message, None, None)
+
+    def test_counts_records_dropped_when_queue_is_full(self):
+        """Test BoundedQueueHandler drops records instead of blocking when the queue is full"""
+        handler = BoundedQueueHandler(queue.Queue(2))
+        for i in range(5):
+            handler.handle(self.record(f"message {i}"))
+        self.assertEqual(handler.queue.qsize(), 2)
+        self.assertEqual(handler.dropped, 3)
+
+    def test_queues_warning_once_queue_has_room(self):
+        """Test BoundedQueueHandler queues a warning counting the records dropped after the next record queued"""
+        handler = BoundedQueueHandler(queue.Queue(2))
+        for i in range(4):
+            handler.handle(self.record(f"message {i}"))
+        handler.queue.get_nowait()
+        handler.queue.get_nowait()
+        handler.handle(self.record("message 4"))
+        self.assertEqual(handler.queue.get_nowait().getMessage(), "message 4")
+        self.assertEqual(handler.queue.get_nowait().getMessage(), "Log queue full, 2 records dropped")
+
+    def test_writes_warning_when_listener_stops(self):
+        """Test BoundedQueueHandler.stop_listener writes a warning for the records dropped and not reported"""
+        stream = io.StringIO()
+        handler = queue_handler(maxsize=10, stream=stream)
+        handler.handle(self.record("Login"))
+        handler.dropped += 3
+        with patch.object(handler.queue, "put_nowait", side_effect=queue.Full):
+            handler.handle(self.record("Logout"))
+        handler.stop_listener()
+        self.assertEqual(stream.getvalue(), "Login\nLog queue full, 4 records dropped\n")
+
+    def test_listener_writes_records_to_stream(self):
+        """Test that QueueHandler writes the records queued from its listener thread"""
+        stream = io.StringIO()
+        handler = queue_handler(maxsize=10, stream=stream)
+        handler.handle(self.record('{"event":"Logout"}'))
+        handler.stop_listener()
+        self.assertEqual(stream.getvalue(), '{"event":"Logout"}\n')
+
+    def test_starts_listener_on_first_record(self):
+        """Test that queue_handler leaves the listener thread to the first record handed over"""
+        handler = queue_handler(maxsize=10, stream=io.StringIO())
+        self.assertIsNone(handler.listener)
+        handler.handle(self.record("Login"))
+        self.assertTrue(handler.listener_running)
+        handler.stop_listener()
+        self.assertFalse(handler.listener_running)
+
+    def test_starts_new_listener_after_fork(self):
+        """Test that BoundedQueueHandler starts a listener on a new queue in a forked process"""
+        stream = io.StringIO()
+        handler = queue_handler(maxsize=10, stream=stream)
+        handler.handle(self.record("Before fork"))
+        handler.stop_listener()
+        parent_queue = handler.queue
+        with patch("utils.log_pipeline.os.getpid", return_value=-1):
+            handler.handle(self.record("After fork"))
+            handler.stop_listener()
+        self.assertIsNot(handler.queue, parent_queue)
+        self.assertEqual(stream.getvalue(), "Before fork\nAfter fork\n")
@@ -0,0 +1,90 @@
+"""Unit tests for the log context of requests"""
+import threading
+
+from django.test import TestCase, RequestFactory
+from django.contrib.auth.models import AnonymousUser
+from django.http import HttpResponse
+
+from utils.middleware import RequestLogContextMiddleware
+from utils.request_context import (
+    bind_log_context,
+    get_log_context,
+    new_log_context,
+    reset_log_context,
+    merge_log_context,
+)
+
+class LogContext(TestCase):
+
+    """Unit tests for helper functions that manage the log context"""
+
+    def setUp(self):
+        """Start each test with an empty log context"""
+        self.token = new_log_context()
+
+    def tearDown(self):
+        reset_log_context(self.token)
+
+    def test_bind_adds_values_to_context(self):
+        """Test that BindLogContext adds values to the values already bound"""
+        bind_log_context(request_id="1")
+        bind_log_context(user="edith@mailinator.com")
+        self.assertEqual(get_log_context(), {"request_id": "1", "user": "edith@mailinator.com"})
+
+    def test_merge_adds_context_to_event(self):
+        """Test that MergeLogContext adds the log context to the event, keeping the event values"""
+        bind_log_context(user="edith@mailinator.com", path="/")
+        event_dict = merge_log_context(None, "info", {"event": "Logout", "path": "/accounts/logout"})
+        self.assertEqual(
+            event_dict,
+            {"event": "Logout", "path": "/accounts/logout", "user": "edith@mailinator.com"}
+        )
+
+    def test_context_is_not_shared_between_threads(self):
+        """Test that values bound in a thread are not seen by other threads"""
+        bind_log_context(user="edith@mailinator.com")
+        seen = []
+        thread = threading.Thread(target=lambda: seen.append(get_log_context()))
+        thread.start()
+        thread.join()
+        self.assertEqual(seen, [{}])
+
+class RequestLogContextMiddlewareTest(TestCase):
+
+    """Unit tests for utils.middleware.RequestLogContextMiddleware"""
+
+    def setUp(self):
+        """Create a request for an anonymous user before each test"""
+        self.request = RequestFactory().get("/keys/")
+        self.request.user = AnonymousUser()
+
+    def test_binds_request_to_context_while_handling_request(self):
+        """Test RequestLogContextMiddleware binds an id, the method and the path of the request"""
+        contexts = []
+        def view(request):
+            contexts.append(get_log_context())
+            return HttpResponse()
+        RequestLogContextMiddleware(view)(self.request)
+        self.assertEqual(contexts[0]["method"], "GET")
+        self.assertEqual(contexts[0]["path"], "/keys/")
+        self.assertEqual(len(contexts[0]["request_id"]), 32)
+        self.assertNotIn("user", contexts[0])
+
+    def test_drops_context_after_request(self):
+        """Test RequestLogContextMiddleware drops the values bound by the view once the response is ready"""
+        def view(request):
+            bind_log_context(user="edith@mailinator.com")
+            return HttpResponse()
+        RequestLogContextMiddleware(view)(self.request)
+        self.assertEqual(get_log_context(), {})
+
+    def test_gives_each_request_its_own_id(self):
+        """Test RequestLogContextMiddleware does not reuse request ids"""
+        ids = []
+        def view(request):
+            ids.append(get_log_context()["request_id"])
+            return HttpResponse()
+        middleware = RequestLogContextMiddleware(view)
+        middleware(self.request)
+        middleware(self.request)
+        self.assertNotEqual(ids[0], ids[1])
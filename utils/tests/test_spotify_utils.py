@@ -1,6 +1,7 @@
 """Unit tests for Spotify Utils module"""
 
 import os
+import socket
 import httpretty
 
 from urllib.parse import parse_qsl, urlparse, parse_qs
@@ -10,13 +11,56 @@ from utils.spotify_utils import (
     spotify_oauth_code_request_url,
     request_spotify_oauth_code,
     exchange_spotify_code,
+    get_spotify_recently_played_page,
+    iter_spotify_recently_played_pages,
+    get_spotify_audio_features_batch,
+    refresh_spotify_token,
+    SpotifyRequestError,
 )
 from utils.spotify_utils import (
     SPOTIFY_AUTHORIZE_URL, 
     SPOTIFY_CLIENT_ID,
     SPOTIFY_CODE_EXCHANGE_URL,
+    SPOTIFY_RECENTLY_PLAYED_URL,
+    SPOTIFY_MAX_LIMIT,
+    SPOTIFY_AUDIO_FEATURES_URL,
 )
 
+def time_out(request, uri, response_headers):
+    """httpretty callback of a server that never answers"""
+    raise socket.timeout("timed out")
+
+class RefreshSpotifyToken(TestCase):
+
+    """Unit tests for helper function that renews a Spotify access token"""
+
+    @httpretty.activate
+    def test_sends_refresh_token_and_returns_new_token(self):
+        """Test that refresh spotify token helper function exchanges the refresh token for a new access token"""
+        httpretty.register_uri(
+            httpretty.POST,
+            SPOTIFY_CODE_EXCHANGE_URL,
+            body = '{"access_token": "NgA6ZcYIixn8bU", "token_type": "Bearer", "expires_in": 3600}'
+        )
+        renewed = refresh_spotify_token("NgAagAUm_SHo")
+        sent_parameters = dict(parse_qsl(httpretty.last_request().body.decode()))
+        self.assertEqual(sent_parameters["grant_type"], "refresh_token")
+        self.assertEqual(sent_parameters["refresh_token"], "NgAagAUm_SHo")
+        self.assertEqual(sent_parameters["client_id"], SPOTIFY_CLIENT_ID)
+        self.assertEqual(renewed, ("NgA6ZcYIixn8bU", None, 3600))
+
+    @httpretty.activate
+    def test_returns_none_when_error(self):
+        """Test that refresh spotify token helper function returns None values when Spotify refuses"""
+        httpretty.register_uri(httpretty.POST, SPOTIFY_CODE_EXCHANGE_URL, body = '{"error": "invalid_grant"}', status = 400)
+        self.assertEqual(refresh_spotify_token("NgAagAUm_SHo"), (None, None, None))
+
+    @httpretty.activate
+    def test_returns_none_on_timeout(self):
+        """Test that refresh spotify token helper function returns None values when Spotify does not answer"""
+        httpretty.register_uri(httpretty.POST, SPOTIFY_CODE_EXCHANGE_URL, body = time_out)
+        self.assertEqual(refresh_spotify_token("NgAagAUm_SHo"), (None, None, None))
+
 class RequestSpotifyOAuthCodeTest(TestCase):
     
     """Unit Tests for helper function that requests oAuth Code from Spotify"""
@@ -126,7 +170,7 @@ class ExchangeSpotifyCode(TestCase):
     def test_returns_token_and_refresh_token(self):
         self.register_token_exchange_url_in_httpretty()
         
-        token_received,refresh_token_received = exchange_spotify_code(code='abc123')
+        token_received,refresh_token_received,expires_in_received = exchange_spotify_code(code='abc123')
 
         self.assertEqual(
             token_received,
@@ -136,13 +180,21 @@ class ExchangeSpotifyCode(TestCase):
             refresh_token_received,
             "NgAagAUm_SHo"
         )
+        self.assertEqual(expires_in_received, 3600)
     
     @httpretty.activate
     def test_returns_none_and_none_when_error(self):
         self.register_token_exchange_url_in_httpretty_return_error()
-        token_received,refresh_token_received = exchange_spotify_code(code='abc123')
+        token_received,refresh_token_received,expires_in_received = exchange_spotify_code(code='abc123')
         self.assertIsNone(token_received)
         self.assertIsNone(refresh_token_received)
+        self.assertIsNone(expires_in_received)
+
+    @httpretty.activate
+    def test_returns_none_on_timeout(self):
+        """Test that exchange spotify code helper function returns None values when Spotify does not answer"""
+        httpretty.register_uri(httpretty.POST, SPOTIFY_CODE_EXCHANGE_URL, body = time_out)
+        self.assertEqual(exchange_spotify_code(code='abc123'), (None, None, None))
 
 class SpotifyOAuthCodeRequestUrl(TestCase):
     
@@ -188,4 +240,120 @@ class SpotifyOAuthCodeRequestUrl(TestCase):
             parameters['scope'][0]
         )
 
+class IterSpotifyRecentlyPlayedPages(TestCase):
+
+    """Unit tests for helper functions that page through the tracks recently played"""
+
+    def played_body(self, first_second, count, cursors=True):
+        items = ','.join(
+            '{'
+                '"track": {"id": "4iV5W9uYEdYUVa79Axb7Rh", "duration_ms": 108546},'
+                f'"played_at": "2018-05-15T19:{(first_second - i) // 60:02d}:{(first_second - i) % 60:02d}Z"'
+            '}'
+            for i in range(count)
+        )
+        cursors = '{"after": "1526411762500", "before": "1526411539000"}' if cursors else 'null'
+        return f'{{"items": [{items}], "cursors": {cursors}}}'
+
+    def register_recently_played_pages_in_httpretty(self, *bodies):
+        httpretty.register_uri(
+            httpretty.GET,
+            SPOTIFY_RECENTLY_PLAYED_URL,
+            responses = [httpretty.Response(body = body) for body in bodies]
+        )
+
+    @httpretty.activate
+    def test_returns_normalized_plays_and_cursors(self):
+        """Test that GetSpotifyRecentlyPlayedPage returns track, time and duration of each play"""
+        self.register_recently_played_pages_in_httpretty(self.played_body(600, 1))
+        plays, cursors = get_spotify_recently_played_page(token="BQDbTCFt4Df", before=1526411539000)
+        self.assertEqual(
+            plays,
+            [{"track_id": "4iV5W9uYEdYUVa79Axb7Rh", "played_at": "2018-05-15T19:10:00Z", "duration_ms": 108546}]
+        )
+        self.assertEqual(cursors, {"after": "1526411762500", "before": "1526411539000"})
+        self.assertEqual(httpretty.last_request().headers.get("Authorization"), "Bearer BQDbTCFt4Df")
+        self.assertEqual(httpretty.last_request().querystring["before"], ["1526411539000"])
+
+    @httpretty.activate
+    def test_pages_back_with_before_cursors(self):
+        """Test that IterSpotifyRecentlyPlayedPages follows before cursors without a cursor to start from"""
+        self.register_recently_played_pages_in_httpretty(
+            self.played_body(600, 2), self.played_body(598, 1, cursors=False)
+        )
+        pages = list(iter_spotify_recently_played_pages(token="BQDbTCFt4Df", limit=2))
+        self.assertEqual([len(page) for page in pages], [2, 1])
+        sent_parameters = httpretty.last_request().querystring
+        self.assertEqual(sent_parameters["before"], ["1526411539000"])
+        self.assertNotIn("after", sent_parameters)
+
+    @httpretty.activate
+    def test_pages_forward_with_after_cursors(self):
+        """Test that IterSpotifyRecentlyPlayedPages follows after cursors from the cursor received"""
+        self.register_recently_played_pages_in_httpretty(self.played_body(600, 2), '{"items": [], "cursors": null}')
+        pages = list(iter_spotify_recently_played_pages(token="BQDbTCFt4Df", after=1526411000000, limit=2))
+        self.assertEqual([len(page) for page in pages], [2])
+        requests = httpretty.HTTPretty.latest_requests
+        self.assertEqual(requests[0].querystring["after"], ["1526411000000"])
+        self.assertEqual(requests[-1].querystring["after"], ["1526411762500"])
+
+    @httpretty.activate
+    def test_asks_for_largest_page_by_default(self):
+        """Test that IterSpotifyRecentlyPlayedPages asks Spotify for the largest page allowed"""
+        self.register_recently_played_pages_in_httpretty('{"items": [], "cursors": null}')
+        self.assertEqual(list(iter_spotify_recently_played_pages(token="BQDbTCFt4Df")), [])
+        self.assertEqual(httpretty.last_request().querystring["limit"], [str(SPOTIFY_MAX_LIMIT)])
+
+    @httpretty.activate
+    def test_raises_on_error(self):
+        """Test that GetSpotifyRecentlyPlayedPage raises SpotifyRequestError when Spotify answers with an error"""
+        httpretty.register_uri(httpretty.GET, SPOTIFY_RECENTLY_PLAYED_URL, status=401, body='{"error": {}}')
+        with self.assertRaises(SpotifyRequestError):
+            get_spotify_recently_played_page(token="BQDbTCFt4Df")
+
+    @httpretty.activate
+    def test_raises_on_timeout(self):
+        """Test that GetSpotifyRecentlyPlayedPage raises SpotifyRequestError when Spotify does not answer"""
+        httpretty.register_uri(httpretty.GET, SPOTIFY_RECENTLY_PLAYED_URL, body=time_out)
+        with self.assertRaises(SpotifyRequestError):
+            get_spotify_recently_played_page(token="BQDbTCFt4Df")
 
+class GetSpotifyAudioFeaturesBatch(TestCase):
+
+    """Unit tests for helper function that requests audio features of several tracks at once"""
+
+    @httpretty.activate
+    def test_requests_features_of_every_track_at_once(self):
+        """Test that GetSpotifyAudioFeaturesBatch sends all the track ids in one request"""
+        httpretty.register_uri(
+            httpretty.GET,
+            SPOTIFY_AUDIO_FEATURES_URL,
+            body = (
+                '{"audio_features": ['
+                    '{"id": "4iV5W9uYEdYUVa79Axb7Rh", "tempo": 170.1, "energy": 0.8, "danceability": 0.5, "valence": 0.3},'
+                    'null'
+                ']}'
+            )
+        )
+        features = get_spotify_audio_features_batch(
+            token="BQDbTCFt4Df", track_ids=["4iV5W9uYEdYUVa79Axb7Rh", "1301WleyT98MSxVHPZCA6M"]
+        )
+        self.assertEqual(
+            httpretty.last_request().querystring["ids"], ["4iV5W9uYEdYUVa79Axb7Rh,1301WleyT98MSxVHPZCA6M"]
+        )
+        self.assertEqual(features, [
+            {"track_id": "4iV5W9uYEdYUVa79Axb7Rh", "tempo": 170.1, "energy": 0.8, "danceability": 0.5, "valence": 0.3},
+            {"track_id": "1301WleyT98MSxVHPZCA6M", "tempo": None, "energy": None, "danceability": None, "valence": None},
+        ])
+
+    def test_refuses_more_tracks_than_spotify_accepts(self):
+        """Test that GetSpotifyAudioFeaturesBatch raises ValueError for more than 100 tracks"""
+        with self.assertRaises(ValueError):
+            get_spotify_audio_features_batch(token="BQDbTCFt4Df", track_ids=[str(i) for i in range(101)])
+
+    @httpretty.activate
+    def test_raises_on_error(self):
+        """Test that GetSpotifyAudioFeaturesBatch raises SpotifyRequestError when Spotify answers with an error"""
+        httpretty.register_uri(httpretty.GET, SPOTIFY_AUDIO_FEATURES_URL, status=429, body='{"error": {}}')
+        with self.assertRaises(SpotifyRequestError):
+            get_spotify_audio_features_batch(token="BQDbTCFt4Df", track_ids=["4iV5W9uYEdYUVa79Axb7Rh"])
@@ -0,0 +1,131 @@
+"""Unit tests for the Strava rate limiter"""
+import threading
+
+from django.test import TestCase
+from django.core.cache.backends.locmem import LocMemCache
+
+from utils.strava_rate_limit import (
+    StravaRateLimiter,
+    StravaRateLimited,
+    strava_priority,
+    current_priority,
+    STRAVA_INTERACTIVE,
+    STRAVA_BACKGROUND,
+)
+
+# 2018-05-15 19:00:00 UTC, start of a 15 minute window
+NOW = 1526410800
+
+class FakeClock:
+
+    def __init__(self, now=NOW):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+class StravaRateLimiterTest(TestCase):
+
+    """Unit tests for utils.strava_rate_limit.StravaRateLimiter"""
+
+    def setUp(self):
+        """Create a limiter with small limits and a fake clock before each test"""
+        self.clock = FakeClock()
+        self.cache = LocMemCache('strava-rate-limit-test', {})
+        self.cache.clear()
+        self.limiter = self.process_limiter()
+
+    def process_limiter(self):
+        """Helper function to build the limiter of another process sharing the cache"""
+        return StravaRateLimiter(short_limit=10, daily_limit=100, reserve=0.2, clock=self.clock, cache=self.cache)
+
+    def test_counts_calls_granted(self):
+        """Test StravaRateLimiter.acquire takes each call from both windows"""
+        self.limiter.acquire(STRAVA_INTERACTIVE)
+        self.limiter.acquire(STRAVA_INTERACTIVE)
+        self.assertEqual((self.limiter.short_usage, self.limiter.daily_usage), (2, 2))
+
+    def test_reads_limits_and_usage_from_headers(self):
+        """Test StravaRateLimiter.update uses X-RateLimit headers sent by Strava"""
+        self.limiter.update(200, {'X-RateLimit-Limit': '600,30000', 'X-RateLimit-Usage': '314,27536'})
+        self.assertEqual((self.limiter.short_limit, self.limiter.daily_limit), (600, 30000))
+        self.assertEqual((self.limiter.short_usage, self.limiter.daily_usage), (314, 27536))
+
+    def test_ignores_missing_headers(self):
+        """Test StravaRateLimiter.update keeps counting locally when headers are missing"""
+        self.limiter.acquire(STRAVA_INTERACTIVE)
+        self.limiter.update(200, {})
+        self.assertEqual(self.limiter.short_usage, 1)
+
+    def test_background_calls_leave_reserve_to_interactive_calls(self):
+        """Test StravaRateLimiter defers background calls once only the reserve is left"""
+        self.limiter.update(200, {'X-RateLimit-Usage': '8,8'})
+        with self.assertRaises(StravaRateLimited):
+            self.limiter.acquire(STRAVA_BACKGROUND, max_wait=0)
+        self.limiter.acquire(STRAVA_INTERACTIVE, max_wait=0)
+
+    def test_deferred_until_next_window(self):
+        """Test StravaRateLimited tells when the 15 minute window starts again"""
+        self.limiter.update(200, {'X-RateLimit-Usage': '10,10'})
+        with self.assertRaises(StravaRateLimited) as raised:
+            self.limiter.acquire(STRAVA_INTERACTIVE, max_wait=0)
+        self.assertEqual(raised.exception.retry_at, NOW + 15 * 60)
+
+    def test_deferred_until_next_day_when_daily_limit_reached(self):
+        """Test StravaRateLimiter.blocked_until returns the start of the next day when the daily budget is spent"""
+        self.limiter.update(200, {'X-RateLimit-Usage': '0,100'})
+        self.assertEqual(self.limiter.blocked_until(STRAVA_INTERACTIVE), 1526428800)
+
+    def test_budget_comes_back_in_next_window(self):
+        """Test StravaRateLimiter resets the 15 minute usage when the window changes"""
+        self.limiter.update(200, {'X-RateLimit-Usage': '10,10'})
+        self.clock.now += 15 * 60
+        self.assertIsNone(self.limiter.blocked_until(STRAVA_INTERACTIVE))
+        self.assertEqual(self.limiter.daily_usage, 10)
+
+    def test_too_many_requests_spends_budget(self):
+        """Test StravaRateLimiter stops calls after a 429 answer without headers"""
+        self.limiter.update(429, {})
+        self.assertIsNotNone(self.limiter.blocked_until(STRAVA_INTERACTIVE))
+
+    def test_background_calls_wait_for_interactive_calls(self):
+        """Test StravaRateLimiter does not grant background calls while an interactive call is waiting"""
+        self.limiter._waiting[STRAVA_INTERACTIVE] += 1
+        with self.assertRaises(StravaRateLimited):
+            self.limiter.acquire(STRAVA_BACKGROUND, max_wait=0)
+
+    def test_shares_usage_between_processes(self):
+        """Test StravaRateLimiter counts the calls granted by every process sharing the cache"""
+        other_limiter = self.process_limiter()
+        for _ in range(5):
+            self.limiter.acquire(STRAVA_INTERACTIVE, max_wait=0)
+            other_limiter.acquire(STRAVA_INTERACTIVE, max_wait=0)
+        with self.assertRaises(StravaRateLimited):
+            self.process_limiter().acquire(STRAVA_INTERACTIVE, max_wait=0)
+        self.assertEqual(other_limiter.short_usage, 10)
+
+    def test_background_calls_wait_for_interactive_calls_of_other_processes(self):
+        """Test StravaRateLimiter does not grant background calls while another process waits for an interactive call"""
+        self.cache.set('strava-rate-limit:waiting:%d' % STRAVA_INTERACTIVE, 1)
+        with self.assertRaises(StravaRateLimited):
+            self.limiter.acquire(STRAVA_BACKGROUND, max_wait=0)
+
+    def test_waiting_call_is_granted_when_budget_is_reported(self):
+        """Test StravaRateLimiter.acquire waits for usage to go down rather than failing"""
+        limiter = StravaRateLimiter(short_limit=10, daily_limit=100, cache=self.cache)
+        limiter.update(200, {'X-RateLimit-Usage': '10,10'})
+        timer = threading.Timer(0.05, limiter.update, (200, {'X-RateLimit-Usage': '0,10'}))
+        timer.start()
+        limiter.acquire(STRAVA_INTERACTIVE, max_wait=5)
+        timer.join()
+        self.assertEqual(limiter.short_usage, 1)
+
+class StravaPriority(TestCase):
+
+    """Unit tests for utils.strava_rate_limit.strava_priority"""
+
+    def test_sets_priority_of_current_thread(self):
+        """Test strava_priority changes the priority inside the block only"""
+        with strava_priority(STRAVA_BACKGROUND):
+            self.assertEqual(current_priority(), STRAVA_BACKGROUND)
+        self.assertEqual(current_priority(), STRAVA_INTERACTIVE)
@@ -1,22 +1,35 @@
 """Unit tests for Strava Utils module"""
 import httpretty
 import os
+import socket
 from urllib.parse import parse_qsl, urlparse, parse_qs
+from unittest.mock import patch
 
 from django.test import TestCase
+from django.core.cache.backends.locmem import LocMemCache
     
 from utils.strava_utils import (
     request_strava_oauth_code,
     exchange_strava_code,
     strava_oauth_code_request_url,
-    get_strava_activities
+    get_strava_activities,
+    iter_strava_activity_pages,
+    get_strava_activity_streams,
+    StravaRequestError,
 )
 from utils.strava_utils import (
     STRAVA_AUTHORIZE_URL, 
     STRAVA_CLIENT_ID,
     STRAVA_CODE_EXCHANGE_URL,
-    STRAVA_GET_ACTIVITIES_URL
+    STRAVA_GET_ACTIVITIES_URL,
+    STRAVA_MAX_PER_PAGE,
+    STRAVA_ACTIVITY_STREAMS_URL,
 )
+from utils.strava_rate_limit import StravaRateLimiter, STRAVA_INTERACTIVE
+
+def time_out(request, uri, response_headers):
+    """httpretty callback of a server that never answers"""
+    raise socket.timeout("timed out")
 
 class StravaOAuthCodeRequestUrl(TestCase):
     
@@ -204,6 +217,12 @@ class ExchangeStravaCode(TestCase):
         self.assertIsNone(token_received)
         self.assertIsNone(strava_id_received)
 
+    @httpretty.activate
+    def test_returns_none_and_none_on_timeout(self):
+        """Test that exchange strava code helper function returns None values when Strava does not answer"""
+        httpretty.register_uri(httpretty.POST, STRAVA_CODE_EXCHANGE_URL, body=time_out)
+        self.assertEqual(exchange_strava_code(code='abc123'), (None, None))
+
 class GetStravaActivities(TestCase):
     
     def register_get_activities_url_in_httpretty_success_return_one(self):
@@ -514,7 +533,7 @@ class GetStravaActivities(TestCase):
         )
         requested_url = 'https://'+\
             httpretty.last_request().headers.get('Host') +\
-            httpretty.last_request().path
+            urlparse(httpretty.last_request().path).path
         self.assertEqual(requested_url,STRAVA_GET_ACTIVITIES_URL)
 
     @httpretty.activate
@@ -625,3 +644,160 @@ class GetStravaActivities(TestCase):
         self.register_get_activities_url_in_httpretty_fault()
         activities = get_strava_activities(token="87a407fc475a61ef97265b4bf8867f3ecfc102af")
         self.assertEqual(activities,None)
+
+    @httpretty.activate
+    def test_returns_none_on_timeout(self):
+        """Test that GetAthleteActivities returns None when Strava does not answer"""
+        httpretty.register_uri(httpretty.GET, STRAVA_GET_ACTIVITIES_URL, body=time_out)
+        activities = get_strava_activities(token="87a407fc475a61ef97265b4bf8867f3ecfc102af")
+        self.assertEqual(activities,None)
+
+    @httpretty.activate
+    def test_raises_on_timeout_when_asked(self):
+        """Test that GetAthleteActivities raises StravaRequestError when Strava does not answer with raise_errors"""
+        httpretty.register_uri(httpretty.GET, STRAVA_GET_ACTIVITIES_URL, body=time_out)
+        with self.assertRaises(StravaRequestError):
+            get_strava_activities(token="87a407fc475a61ef97265b4bf8867f3ecfc102af", raise_errors=True)
+
+class IterStravaActivityPages(TestCase):
+
+    """Unit tests for helper function that pages through Strava activities"""
+
+    def activities_body(self, first_id, count):
+        activities = ','.join(
+            '{'
+                f'"id":{first_id + i},'
+                '"distance":1000,'
+                '"moving_time":1000,'
+                '"type":"Run",'
+                f'"start_date_local":"2018-05-{1 + i % 28:02d}T19:12:19Z"'
+            '}'
+            for i in range(count)
+        )
+        return f'[{activities}]'
+
+    def register_get_activities_pages_in_httpretty(self, *page_sizes):
+        first_ids = [sum(page_sizes[:i]) for i in range(len(page_sizes))]
+        httpretty.register_uri(
+            httpretty.GET,
+            STRAVA_GET_ACTIVITIES_URL,
+            responses = [
+                httpretty.Response(body = self.activities_body(first_id, size))
+                for first_id, size in zip(first_ids, page_sizes)
+            ]
+        )
+
+    @httpretty.activate
+    def test_asks_for_largest_page_size_by_default(self):
+        """Test that IterStravaActivityPages asks Strava for the largest page allowed"""
+        self.register_get_activities_pages_in_httpretty(1)
+        list(iter_strava_activity_pages(token="87a407fc475a61ef97265b4bf8867f3ecfc102af"))
+        sent_parameters = httpretty.last_request().querystring
+        self.assertEqual(sent_parameters['page'], ['1'])
+        self.assertEqual(sent_parameters['per_page'], [str(STRAVA_MAX_PER_PAGE)])
+
+    @httpretty.activate
+    def test_yields_one_list_per_page(self):
+        """Test that IterStravaActivityPages yields the activities of each page separately"""
+        self.register_get_activities_pages_in_httpretty(2, 2, 1)
+        pages = list(iter_strava_activity_pages(token="87a407fc475a61ef97265b4bf8867f3ecfc102af", per_page=2))
+        self.assertEqual([len(page) for page in pages], [2, 2, 1])
+        self.assertEqual(
+            [activity.get('strava_id') for page in pages for activity in page],
+            [0, 1, 2, 3, 4]
+        )
+        self.assertEqual(httpretty.last_request().querystring['page'], ['3'])
+
+    @httpretty.activate
+    def test_stops_when_receives_empty_page(self):
+        """Test that IterStravaActivityPages stops asking for pages after an empty page"""
+        self.register_get_activities_pages_in_httpretty(2, 0)
+        pages = list(iter_strava_activity_pages(token="87a407fc475a61ef97265b4bf8867f3ecfc102af", per_page=2))
+        self.assertEqual([len(page) for page in pages], [2])
+        self.assertEqual(httpretty.last_request().querystring['page'], ['2'])
+
+    @httpretty.activate
+    def test_get_strava_activities_joins_all_pages(self):
+        """Test that GetAthleteActivities returns the activities of every page"""
+        self.register_get_activities_pages_in_httpretty(STRAVA_MAX_PER_PAGE, 3)
+        activities = get_strava_activities(token="87a407fc475a61ef97265b4bf8867f3ecfc102af")
+        self.assertEqual(len(activities), STRAVA_MAX_PER_PAGE + 3)
+
+    @httpretty.activate
+    def test_sends_after_parameter_when_received(self):
+        """Test that IterStravaActivityPages only asks for activities after the time received"""
+        self.register_get_activities_pages_in_httpretty(1)
+        list(iter_strava_activity_pages(token="87a407fc475a61ef97265b4bf8867f3ecfc102af", after=1526411539))
+        sent_parameters = httpretty.last_request().querystring
+        self.assertEqual(sent_parameters['after'], ['1526411539'])
+
+class GetStravaActivityStreams(TestCase):
+
+    """Unit tests for helper function that gets the streams of an activity"""
+
+    streams_url = STRAVA_ACTIVITY_STREAMS_URL.format(activity_id=1543287625)
+
+    @httpretty.activate
+    def test_asks_for_streams_keyed_by_type(self):
+        """Test that GetStravaActivityStreams asks Strava for time, heart rate, velocity, cadence and altitude"""
+        httpretty.register_uri(httpretty.GET, self.streams_url, body='{}')
+        get_strava_activity_streams(token="87a407fc475a61ef97265b4bf8867f3ecfc102af", activity_id=1543287625)
+        sent_parameters = httpretty.last_request().querystring
+        self.assertEqual(sent_parameters['keys'], ['time,heartrate,velocity_smooth,cadence,altitude'])
+        self.assertEqual(sent_parameters['key_by_type'], ['true'])
+
+    @httpretty.activate
+    def test_returns_samples_of_each_stream_received(self):
+        """Test that GetStravaActivityStreams returns the samples of the streams recorded"""
+        httpretty.register_uri(
+            httpretty.GET,
+            self.streams_url,
+            body = (
+                '{"time": {"data": [0, 1, 3], "series_type": "distance"},'
+                '"heartrate": {"data": [120, 122, 125], "series_type": "distance"},'
+                '"distance": {"data": [0, 3.1, 9.4], "series_type": "distance"}}'
+            )
+        )
+        streams = get_strava_activity_streams(token="87a407fc475a61ef97265b4bf8867f3ecfc102af", activity_id=1543287625)
+        self.assertEqual(streams, {'time': [0, 1, 3], 'heartrate': [120, 122, 125]})
+
+    @httpretty.activate
+    def test_returns_none_on_error(self):
+        """Test that GetStravaActivityStreams returns None when Strava answers with an error"""
+        httpretty.register_uri(httpretty.GET, self.streams_url, status=404, body='{"message": "Record Not Found"}')
+        self.assertIsNone(
+            get_strava_activity_streams(token="87a407fc475a61ef97265b4bf8867f3ecfc102af", activity_id=1543287625)
+        )
+
+class StravaRateLimit(TestCase):
+
+    """Unit tests for the use of the rate limiter by Strava Utils helpers"""
+
+    def setUp(self):
+        """Use a fresh rate limiter in each test"""
+        patcher = patch('utils.strava_utils.rate_limiter', StravaRateLimiter(cache=LocMemCache('strava-rate-limit-test', {})))
+        self.rate_limiter = patcher.start()
+        self.rate_limiter.cache.clear()
+        self.addCleanup(patcher.stop)
+
+    @httpretty.activate
+    def test_records_usage_sent_by_strava(self):
+        """Test that GetAthleteActivities passes rate limit headers received to the rate limiter"""
+        httpretty.register_uri(
+            httpretty.GET,
+            STRAVA_GET_ACTIVITIES_URL,
+            body = '[]',
+            adding_headers = {'X-RateLimit-Limit': '600,30000', 'X-RateLimit-Usage': '12,340'},
+        )
+        get_strava_activities(token="87a407fc475a61ef97265b4bf8867f3ecfc102af")
+        self.assertEqual((self.rate_limiter.short_usage, self.rate_limiter.daily_usage), (12, 340))
+
+    @httpretty.activate
+    def test_returns_none_without_calling_strava_when_budget_is_spent(self):
+        """Test that GetAthleteActivities does not call Strava when there is no budget left"""
+        httpretty.register_uri(httpretty.GET, STRAVA_GET_ACTIVITIES_URL, body = '[]')
+        self.rate_limiter.update(200, {'X-RateLimit-Usage': '600,600'})
+        with patch.dict('utils.strava_rate_limit.STRAVA_MAX_WAIT', {STRAVA_INTERACTIVE: 0}):
+            activities = get_strava_activities(token="87a407fc475a61ef97265b4bf8867f3ecfc102af")
+        self.assertIsNone(activities)
+        self.assertFalse(httpretty.has_request())
@@ -0,0 +1,95 @@
+"""Unit tests for the timing of requests"""
+import httpretty
+from unittest.mock import patch
+
+from django.test import TestCase, RequestFactory
+from django.template import engines
+from django.http import HttpResponse
+from django.contrib import auth
+
+from utils.http_client import build_session
+from utils.middleware import RequestTimingMiddleware, server_timing_header
+from utils.request_context import (
+    add_request_timing,
+    get_request_timings,
+    new_request_timings,
+    reset_request_timings,
+)
+
+class RequestTimings(TestCase):
+
+    """Unit tests for helper functions that add up the time spent by a request"""
+
+    def test_adds_time_and_counts_calls(self):
+        """Test that AddRequestTiming adds up the time and the number of calls of each part"""
+        token = new_request_timings()
+        try:
+            add_request_timing("db", 0.25)
+            add_request_timing("db", 0.5)
+            self.assertEqual(get_request_timings(), {"db": 0.75, "db_count": 2})
+        finally:
+            reset_request_timings(token)
+
+    def test_ignores_time_outside_requests(self):
+        """Test that AddRequestTiming does nothing when no request is timed"""
+        add_request_timing("db", 0.25)
+        self.assertIsNone(get_request_timings())
+
+    @httpretty.activate
+    def test_counts_outbound_http_calls(self):
+        """Test that calls through the shared Session add their time to the request"""
+        httpretty.register_uri(httpretty.GET, "https://www.strava.com/api/v3/athlete", body="{}")
+        token = new_request_timings()
+        try:
+            build_session().get("https://www.strava.com/api/v3/athlete")
+            self.assertEqual(get_request_timings()["http_count"], 1)
+        finally:
+            reset_request_timings(token)
+
+    def test_server_timing_header_reports_parts_used(self):
+        """Test that ServerTimingHeader reports total time and the parts with calls, in milliseconds"""
+        header = server_timing_header(0.0123, {"db": 0.004, "db_count": 3})
+        self.assertEqual(header, 'total;dur=12.3, db;dur=4.0;desc="3"')
+
+class RequestTimingMiddlewareTest(TestCase):
+
+    """Unit tests for utils.middleware.RequestTimingMiddleware"""
+
+    def setUp(self):
+        """Create a request before each test"""
+        self.request = RequestFactory().get("/keys/")
+        self.request.request_id = "1a2b"
+
+    def view(self, request):
+        """View running two queries and rendering a template"""
+        user_model = auth.get_user_model()
+        user_model.objects.count()
+        user_model.objects.exists()
+        template = engines["django"].from_string("<p>{{ name }}</p>")
+        return HttpResponse(template.render({"name": "Edith"}))
+
+    def test_sets_server_timing_header(self):
+        """Test utils.middleware.RequestTimingMiddleware reports total, queries and templates"""
+        response = RequestTimingMiddleware(self.view)(self.request)
+        metrics = [metric.split(";") for metric in response["Server-Timing"].split(", ")]
+        self.assertEqual([metric[0] for metric in metrics], ["total", "db", "template"])
+        self.assertEqual(metrics[1][2], 'desc="2"')
+        self.assertEqual(metrics[2][2], 'desc="1"')
+
+    @patch("utils.middleware.logger")
+    def test_logs_one_line_per_request(self, mock_logger):
+        """Test utils.middleware.RequestTimingMiddleware logs the timings of the request once"""
+        RequestTimingMiddleware(self.view)(self.request)
+        mock_logger.info.assert_called_once()
+        fields = mock_logger.info.call_args[1]
+        self.assertEqual(fields["request_id"], "1a2b")
+        self.assertEqual((fields["method"], fields["path"], fields["status"]), ("GET", "/keys/", 200))
+        self.assertEqual((fields["db_count"], fields["template_count"], fields["http_count"]), (2, 1, 0))
+        self.assertGreaterEqual(fields["duration_ms"], fields["db_ms"])
+
+    def test_stops_timing_after_request(self):
+        """Test utils.middleware.RequestTimingMiddleware drops the timings once the response is ready"""
+        RequestTimingMiddleware(self.view)(self.request)
+        self.assertIsNone(get_request_timings())
+        auth.get_user_model().objects.count()
+        self.assertIsNone(get_request_timings())
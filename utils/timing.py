@@ -0,0 +1,44 @@
+""" Time spent by requests in database queries, outbound HTTP calls and template rendering
+
+Each measure is added to the timings of the current request (see utils.request_context),
+and read by utils.middleware.RequestTimingMiddleware.
+"""
+import time
+
+from django.template import TemplateDoesNotExist
+from django.template.backends.django import DjangoTemplates, Template, reraise
+
+from utils.request_context import add_request_timing
+
+
+def time_query(execute, sql, params, many, context):
+    """Connection execute wrapper timing each database query"""
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        add_request_timing('db', time.perf_counter() - start)
+
+
+class TimedTemplate(Template):
+    """Django template counting the time spent rendering it"""
+
+    def render(self, context=None, request=None):
+        start = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            add_request_timing('template', time.perf_counter() - start)
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """DjangoTemplates backend whose templates count the time spent rendering them"""
+
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return TimedTemplate(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            reraise(exc, self)